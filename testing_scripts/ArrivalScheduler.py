@@ -0,0 +1,76 @@
+import asyncio
+import bisect
+import random
+import time
+from array import array
+
+"""	Deadline based arrival scheduler for the open loop load generators.
+    Send times are computed as absolute deadlines from the start of the test instead of sleeping a fixed interval after
+    each submission, so sleep overshoot and submission cost do not pile up and lower the achieved rate. After a stall the
+    scheduler sends the overdue operations right away until it is back on schedule.
+    Every send records its schedule lag (actual send time minus intended send time), which tells when the generator
+    itself could not keep up with the target rate.
+"""
+CONSTANT = "constant"
+POISSON = "poisson"
+
+
+class ArrivalScheduler:
+
+    def __init__(self, throughput: float, arrival_process: str = CONSTANT, start_time: float = None, seed: int = None):
+        if arrival_process not in (CONSTANT, POISSON):
+            raise ValueError("Unknown arrival process: " + str(arrival_process))
+        self.throughput = throughput
+        self.arrival_process = arrival_process
+        self.random = random.Random(seed)
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.scheduled = 0
+        # Intended send time of the next operation, in time.perf_counter() seconds
+        self.next_deadline = self.start_time
+        # Schedule lag of every send, in nanoseconds
+        self.lags = array('q')
+
+    def _advance(self) -> float:
+        # Return the current deadline and compute the following one
+        deadline = self.next_deadline
+        self.scheduled += 1
+        if self.arrival_process == POISSON:
+            self.next_deadline += self.random.expovariate(self.throughput)
+        else:
+            # Computed from the start time rather than accumulated, so rounding errors do not drift the rate
+            self.next_deadline = self.start_time + self.scheduled / self.throughput
+        return deadline
+
+    def _record_lag(self, deadline: float) -> float:
+        self.lags.append(int((time.perf_counter() - deadline) * 1000000000))
+        return deadline
+
+    def wait(self) -> float:
+        """ Sleep until the next send deadline and return it (the intended send time). """
+        deadline = self._advance()
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return self._record_lag(deadline)
+
+    async def wait_async(self) -> float:
+        """ Same as wait(), for an asyncio event loop. """
+        deadline = self._advance()
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._record_lag(deadline)
+
+
+def log_schedule_lag(logger, lags: array, late_threshold_ns: int = 1000000):
+    # Log the schedule lag statistics of a step. Sends later than late_threshold_ns count as late
+    if len(lags) == 0:
+        logger.info("Schedule lag: no operations were sent")
+        return
+    sorted_lags = sorted(lags)
+    average_lag = sum(sorted_lags) / len(sorted_lags)
+    p99_lag = sorted_lags[min(len(sorted_lags) - 1, int(len(sorted_lags) * 0.99))]
+    max_lag = sorted_lags[-1]
+    late_sends = len(sorted_lags) - bisect.bisect_right(sorted_lags, late_threshold_ns)
+    logger.info("Schedule lag: avg " + str(average_lag / 1000000) + " ms, p99 " + str(p99_lag / 1000000) + " ms, max " + str(max_lag / 1000000) + " ms")
+    logger.info("Late sends: " + str(late_sends) + "/" + str(len(sorted_lags)) + " (" + str(late_sends / len(sorted_lags) * 100) + "%)")
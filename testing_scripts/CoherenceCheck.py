@@ -0,0 +1,94 @@
+import datetime
+import random
+import time
+
+"""	Price/discount coherence check of the read operations, done once when the basket is read.
+    A read is coherent when the discount is 10% of the price. Each worker (thread or event loop) counts its coherent
+    reads and anomalies in its own CoherenceCounter, which also keeps a bounded reservoir of sample anomalies with
+    their timestamps (Algorithm R), so a step with millions of anomalies still keeps a fixed number of examples.
+    The counters of the workers are merged at the end of the step, the merged reservoir staying a uniform sample of
+    all the anomalies of the step.
+"""
+reservoirSize = 32 # Sample anomalies kept per step
+
+
+def is_coherent(price: float, discount: float) -> bool:
+    # Same comparison as the former check of the step logs, so results stay comparable
+    return discount == price * 0.1
+
+
+class CoherenceCounter:
+
+    def __init__(self, reservoir_size: int = reservoirSize, seed: int = None):
+        self.ok = 0
+        self.anomalies = 0
+        self.reservoir_size = reservoir_size
+        # Sample anomalies: (time.time(), worker, basket, price, discount)
+        self.samples = []
+        self.random = random.Random(seed)
+
+    def check(self, price: float, discount: float, worker: str, basket: str, timestamp: float = None) -> bool:
+        """ Count a read of price and discount, and return whether it is coherent.
+            timestamp is the time.time() of the read, by default now.
+        """
+        if is_coherent(price, discount):
+            self.ok += 1
+            return True
+        self.anomalies += 1
+        sample = (time.time() if timestamp is None else timestamp, worker, basket, price, discount)
+        if len(self.samples) < self.reservoir_size:
+            self.samples.append(sample)
+        else:
+            # Keep the new anomaly with probability reservoir_size / anomalies, in place of a random sample
+            index = self.random.randrange(self.anomalies)
+            if index < self.reservoir_size:
+                self.samples[index] = sample
+        return False
+
+    def merge(self, other: "CoherenceCounter"):
+        """ Add the counts of other, and merge the reservoirs so they sample the anomalies of both uniformly. """
+        # Draw each kept sample from one side with probability proportional to the anomalies it has not given yet
+        left, right = list(self.samples), list(other.samples)
+        leftRemaining, rightRemaining = self.anomalies, other.anomalies
+        samples = []
+        while len(samples) < self.reservoir_size and (left or right):
+            if right and (not left or self.random.randrange(leftRemaining + rightRemaining) >= leftRemaining):
+                samples.append(right.pop(self.random.randrange(len(right))))
+                rightRemaining -= 1
+            else:
+                samples.append(left.pop(self.random.randrange(len(left))))
+                leftRemaining -= 1
+        self.samples = samples
+        self.ok += other.ok
+        self.anomalies += other.anomalies
+
+    def counts(self) -> dict:
+        return {'OK': self.ok, 'anomalies': self.anomalies}
+
+    def anomaly_lines(self) -> list[str]:
+        """ Text line of each sample anomaly, in time order. """
+        lines = []
+        for timestamp, worker, basket, price, discount in sorted(self.samples, key=lambda sample: sample[0]):
+            lines.append('Thread <' + str(worker) + '> ' + 'Read Basket <' + str(basket) + '>: Price {' + str(price) + '}, Discount: {' + str(discount) + '}, Timestamp: ' +
+                         datetime.datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f"))
+        return lines
+
+    def to_dict(self) -> dict:
+        # JSON serializable form, to send the counter between processes or hosts
+        return {"OK": self.ok, "anomalies": self.anomalies, "samples": [list(sample) for sample in self.samples]}
+
+    @classmethod
+    def from_dict(cls, message: dict) -> "CoherenceCounter":
+        counter = cls()
+        counter.ok = message["OK"]
+        counter.anomalies = message["anomalies"]
+        counter.samples = [tuple(sample) for sample in message["samples"]]
+        return counter
+
+
+def merge_counters(counters) -> CoherenceCounter:
+    merged = CoherenceCounter()
+    for counter in counters:
+        merged.merge(counter)
+    return merged
+
@@ -1,36 +1,33 @@
-import re
+import glob
+import os
+import sys
+import EventStream
 
-def check_discount_from_log_file(file_path):
-    pattern = r'Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
+def check_discount_from_event_file(file_path):
+    # The reads are recorded in the event stream of the test (see EventStream.py), the log no longer has a line per read
+    coherence = EventStream.check_discount_from_events(EventStream.step_event_files(file_path))
+    return coherence.counts(), coherence.anomaly_lines()
 
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
+def latest_event_file(logging_path):
+    # Event file of the latest UpdatePriceAndDiscount_ReadBasket.py test, the timestamp in the file names sorts by date
+    files = sorted(glob.glob(os.path.join(logging_path, "UpdatePriceAndDiscount_*" + EventStream.binaryExtension)) +
+                   glob.glob(os.path.join(logging_path, "UpdatePriceAndDiscount_*" + EventStream.ndjsonExtension)), key=os.path.basename)
+    return files[-1] if files else None
 
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-# Example usage
-log_file_path = "testing_scripts\\logs\\UpdatePriceAndDiscount_2023-05-20_16-38-06.log"
-results, anomaly_line_presence = check_discount_from_log_file(log_file_path)
+# Example usage: python testing_scripts/DetectAnomaliesFromUpdatePriceAndDiscount_ReadBasket.py [<event file>]
+event_file_path = sys.argv[1] if len(sys.argv) > 1 else latest_event_file(os.path.join(os.getcwd(), 'testing_scripts', 'logs'))
+if event_file_path is None or not os.path.exists(event_file_path):
+    sys.exit("No event file of UpdatePriceAndDiscount_ReadBasket.py found")
+results, anomaly_line_presence = check_discount_from_event_file(event_file_path)
 
 print(f"OK: {results['OK']}")
 print(f"Anomalies: {results['anomalies']}")
 if results['anomalies'] > 0:
     for line in anomaly_line_presence:
-        print(line, end='')
+        print(line)
 
 # Output ratio of Anomalies to total in percentage
-print(f"Anomalies ratio: {results['anomalies'] / (results['OK'] + results['anomalies']) * 100}%")
\ No newline at end of file
+if results['OK'] + results['anomalies'] > 0:
+    print(f"Anomalies ratio: {results['anomalies'] / (results['OK'] + results['anomalies']) * 100}%")
+else:
+    print("Anomalies ratio: no reads recorded")
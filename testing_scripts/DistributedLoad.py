@@ -0,0 +1,533 @@
+import argparse
+import base64
+import datetime
+import glob
+import http.server
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from array import array
+import numpy as np
+import ArrivalScheduler
+import CoherenceCheck
+import EventStream
+import KeyDistributions
+import LatencyHistogram
+import LiveMetrics
+import LoadEngine
+import TimeSeries
+import UpdatePriceDiscount_Inconsistencies_VS_Throughput as ThroughputTest
+
+"""	Distributed controller/agent mode for the UpdatePriceDiscount load generators.
+    Agents run the asyncio load engine on their own machine and wait for steps on a TCP port. The controller splits
+    each step of the test plan (target rate, read/write mix, contention rows, duration) over the agents, starts the
+    step on every agent at the same time, and merges the histograms and counters they send back into one report.
+    The messages are JSON objects, one per line. The clock offset of each agent is measured when the controller
+    connects, so the synchronized start does not depend on the machines having the same clock.
+
+    Each agent can serve its live metrics (see LiveMetrics.py) with --metrics-port, for the monitoring to scrape.
+
+    Agent:      python DistributedLoad.py agent --port 5300 --processes 2 --metrics-port 9464
+    Controller: python DistributedLoad.py controller 0 1 --agents host1:5300,host2:5300
+    Loopback:   python DistributedLoad.py controller 0 1 --local-agents 3
+    Check:      python DistributedLoad.py check --processes 2
+
+    The check runs a short step on two local agents against a stand-in frontend served by the check itself on the
+    frontend port (stop the services first), and verifies the protocol, the clock offsets, the merged counts and that
+    the send deadlines of the agents interleave into the schedule of a single generator.
+"""
+defaultAgentPort = 5300
+stepStartDelay = 2.0 # Seconds between sending a step to the agents and its synchronized start
+clockSyncRounds = 8 # Number of round trips used to measure the clock offset of an agent
+agentConnectTimeout = 30 # Seconds to wait for a local agent to accept connections
+checkClockTolerance = 0.05 # Largest clock offset (seconds) accepted by the check, the agents share the clock of the host
+checkPacingTolerance = 0.5 # Largest deviation of the gaps between two send deadlines accepted by the check, in intervals
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+
+
+def send_message(stream, message: dict):
+    stream.write((json.dumps(message) + "\n").encode())
+    stream.flush()
+
+
+def receive_message(stream) -> dict:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the other side")
+    return json.loads(line)
+
+
+def encode_step_results(results: dict) -> dict:
+    # JSON form of the results of a step, histograms and schedule lags are sent as base64 encoded bytes
+    return {
+        "serviceTime": base64.b64encode(results["serviceTime"].to_bytes()).decode(),
+        "responseTime": base64.b64encode(results["responseTime"].to_bytes()).decode(),
+        "successCount": results["successCount"],
+        "readOperationsCount": results["readOperationsCount"],
+        "writeOperationsCount": results["writeOperationsCount"],
+        "connections": results["connections"],
+        "scheduleLag": base64.b64encode(results["scheduleLag"].tobytes()).decode(),
+        "coherence": results["coherence"].to_dict(),
+    }
+
+
+def decode_step_results(message: dict) -> dict:
+    results = LoadEngine.new_step_results()
+    results["serviceTime"] = LatencyHistogram.LatencyHistogram.from_bytes(base64.b64decode(message["serviceTime"]))
+    results["responseTime"] = LatencyHistogram.LatencyHistogram.from_bytes(base64.b64decode(message["responseTime"]))
+    results["successCount"] = message["successCount"]
+    results["readOperationsCount"] = message["readOperationsCount"]
+    results["writeOperationsCount"] = message["writeOperationsCount"]
+    results["connections"] = message["connections"]
+    results["scheduleLag"] = array('q')
+    results["scheduleLag"].frombytes(base64.b64decode(message["scheduleLag"]))
+    results["coherence"] = CoherenceCheck.CoherenceCounter.from_dict(message["coherence"])
+    return results
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                message = receive_message(self.rfile)
+            except ConnectionError:
+                return
+            command = message["command"]
+            if command == "time":
+                # Clock synchronization round trip
+                send_message(self.wfile, {"time": time.time()})
+            elif command == "step":
+                send_message(self.wfile, encode_step_results(self.server.run_step(message)))
+            elif command == "stop":
+                send_message(self.wfile, {"stopped": True})
+                if message.get("shutdown"):
+                    # serve_forever runs this handler, so the agent is shut down from another thread
+                    threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class LoadAgent(socketserver.TCPServer):
+    """ Runs the steps received from a controller on the local load engine, and sends back the step results. """
+    allow_reuse_address = True
+
+    def __init__(self, host: str, port: int, numProcesses: int, metrics_port: int = 0):
+        super().__init__((host, port), AgentRequestHandler)
+        if metrics_port:
+            LiveMetrics.start_metrics_server(metrics_port)
+        self.engine = LoadEngine.ProcessPoolEngine(numProcesses, metrics_port=metrics_port)
+        timestamp = datetime.datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+        self.logging_path = os.path.join(current_directory, 'logs', f"Agent_{port}_" + timestamp)
+        os.makedirs(self.logging_path, exist_ok=True)
+
+    def configure_step_logger(self, step: int) -> tuple:
+        # Each step gets its own log file on the agent, with the event stream of its operations next to it
+        log_file_path = os.path.join(self.logging_path, f"Step{step}.log")
+        logger = logging.getLogger(f"Agent step <{step}>")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        file_handler = logging.FileHandler(log_file_path)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(file_handler)
+        return logger, file_handler, log_file_path
+
+    def run_step(self, message: dict) -> dict:
+        logger, file_handler, log_file = self.configure_step_logger(message["step"])
+        events_path = EventStream.event_stream_path(log_file)
+        LiveMetrics.set_step("Step " + str(message["step"]) + ": " + message["mode"] + " " + str(message["target"]))
+        try:
+            if message["mode"] == LoadEngine.VIRTUAL_USERS:
+                results = self.engine.run_virtual_users(message["target"], message["catalogItems"], message["discountItems"], message["read_write_list"], message["secondsToRun"], logger, message["start_at"], message["key_distribution"], events_path)
+            else:
+                results = self.engine.run_arrival_rate(message["target"], message["catalogItems"], message["discountItems"], message["read_write_list"], message["secondsToRun"], logger, message["arrival_process"], message["start_at"], message["phase"], message["key_distribution"], events_path)
+            # Save the per-second series of the step of this agent, from its event stream
+            TimeSeries.save_step_time_series(log_file, events_path)
+        finally:
+            logger.removeHandler(file_handler)
+            file_handler.close()
+        return results
+
+    def server_close(self):
+        super().server_close()
+        self.engine.close()
+
+
+class AgentConnection:
+    """ Controller side of the connection to one agent. """
+
+    def __init__(self, address: str):
+        host, port = address.rsplit(":", 1)
+        self.address = address
+        self.socket = socket.create_connection((host, int(port)))
+        self.stream = self.socket.makefile('rwb')
+        self.clock_offset = self.measure_clock_offset()
+
+    def measure_clock_offset(self) -> float:
+        # Offset of the agent clock from the controller clock, taken from the round trip with the lowest latency
+        best_round_trip = None
+        offset = 0
+        for _ in range(clockSyncRounds):
+            sent = time.time()
+            send_message(self.stream, {"command": "time"})
+            agent_time = receive_message(self.stream)["time"]
+            received = time.time()
+            if best_round_trip is None or received - sent < best_round_trip:
+                best_round_trip = received - sent
+                offset = agent_time - (sent + received) / 2
+        return offset
+
+    def close(self, shutdown: bool = False):
+        # Disconnect from the agent, and stop the agent itself if shutdown is set
+        try:
+            send_message(self.stream, {"command": "stop", "shutdown": shutdown})
+            receive_message(self.stream)
+        finally:
+            self.stream.close()
+            self.socket.close()
+
+
+class LoadController:
+    """ Splits each step of the test plan over the agents and merges their results. """
+
+    def __init__(self, agentAddresses: list):
+        self.agents = [AgentConnection(address) for address in agentAddresses]
+
+    def run_step(self, step: int, mode: str, target: float, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, arrival_process: str = ArrivalScheduler.CONSTANT, key_distribution: str = KeyDistributions.UNIFORM) -> dict:
+        """ Run a step on every agent and return their results merged. """
+        return LoadEngine.merge_step_results(self.run_agent_steps(step, mode, target, catalogItems, discountItems, read_write_list, secondsToRun, arrival_process, key_distribution))
+
+    def run_agent_steps(self, step: int, mode: str, target: float, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, arrival_process: str = ArrivalScheduler.CONSTANT, key_distribution: str = KeyDistributions.UNIFORM) -> list[dict]:
+        # Results of the step on each agent, in the order of the agents
+        numAgents = len(self.agents)
+        if mode == LoadEngine.VIRTUAL_USERS:
+            shares = [target // numAgents + (1 if index < target % numAgents else 0) for index in range(numAgents)]
+        else:
+            shares = [target / numAgents] * numAgents
+        start_at = time.time() + stepStartDelay
+        for index, agent in enumerate(self.agents):
+            send_message(agent.stream, {
+                "command": "step",
+                "step": step,
+                "mode": mode,
+                "target": shares[index],
+                # Interleave the send deadlines of the agents, so together they follow the schedule of a single generator
+                "phase": index / target if mode == LoadEngine.ARRIVAL_RATE else 0,
+                "catalogItems": catalogItems,
+                "discountItems": discountItems,
+                "read_write_list": read_write_list,
+                "secondsToRun": secondsToRun,
+                "arrival_process": arrival_process,
+                "key_distribution": key_distribution,
+                # Start time of the step on the agent clock
+                "start_at": start_at + agent.clock_offset,
+            })
+        return [decode_step_results(receive_message(agent.stream)) for agent in self.agents]
+
+    def close(self, shutdown: bool = False):
+        for agent in self.agents:
+            agent.close(shutdown)
+
+
+class CheckFrontendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, as the connection pools of the load engine expect
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path != "/api/v1/frontend/readbasket":
+            self.send_error(404)
+            return
+        basket = urllib.parse.parse_qs(query).get("basketId", [""])[0]
+        with self.server.lock:
+            self.server.counts["read"] += 1
+            price, discount = self.server.prices.get(basket, (100, 10))
+        self.reply({"items": [{"unitPrice": price, "discount": discount}]})
+
+    def do_PUT(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path != "/api/v1/frontend/updatepricediscount":
+            self.send_error(404)
+            return
+        # The catalog item of row index has the id index + 1, and the basket of that row is basket<index>
+        basket = "basket" + str(body["CatalogItem"]["id"] - 1)
+        with self.server.lock:
+            self.server.counts["write"] += 1
+            self.server.prices[basket] = (body["CatalogItem"]["price"], body["DiscountItem"]["discountValue"])
+        self.reply({})
+
+    def reply(self, message: dict):
+        encoded = json.dumps(message).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CheckFrontend(http.server.ThreadingHTTPServer):
+    """ Stand-in for the frontend in the loopback check: it counts the requests it serves, stores the price and
+        discount written on each row, and returns the last ones written when its basket is read.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int):
+        super().__init__(("127.0.0.1", port), CheckFrontendHandler)
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.counts = {"read": 0, "write": 0}
+
+
+def check_results(failures: list, label: str, passed: bool, detail: str):
+    # Log one check of the loopback check, and keep it if it failed
+    logging.info(("OK     " if passed else "FAILED ") + label + ": " + detail)
+    if not passed:
+        failures.append(label)
+
+
+def check_pacing(failures: list, agent_ports: list, started: float, step: int, throughput: float):
+    # The intended send times of the operations of every agent, merged, must be one deadline every 1 / throughput seconds
+    intendedStarts = []
+    for port in agent_ports:
+        directories = [directory for directory in glob.glob(os.path.join(current_directory, 'logs', "Agent_" + str(port) + "_*")) if os.path.getmtime(directory) >= started - 1]
+        if not directories:
+            check_results(failures, "Event files of agent " + str(port), False, "no log directory")
+            continue
+        events = TimeSeries.load_events(EventStream.step_event_files(os.path.join(max(directories, key=os.path.getmtime), "Step" + str(step) + EventStream.binaryExtension)))
+        intendedStarts.append(events["intendedStart"][events["status"] == 200])
+    gaps = np.diff(np.sort(np.concatenate(intendedStarts))) / 1000000000 * throughput if intendedStarts else np.zeros(0)
+    deviation = float(np.abs(gaps - 1).max()) if len(gaps) > 0 else float("inf")
+    check_results(failures, "Pacing split", deviation <= checkPacingTolerance, str(len(gaps) + 1) + " send deadlines, largest gap deviation " + str(round(deviation, 3)) + " intervals")
+
+
+def start_local_agents(numAgents: int, numProcesses: int, metrics_port: int = 0) -> tuple:
+    # Start numAgents agents on the loopback interface, and return their processes and addresses
+    processes = []
+    addresses = []
+    for index in range(numAgents):
+        port = defaultAgentPort + index
+        # Each agent serves its metrics and the ones of its load generator processes on its own range of ports
+        agentMetricsPort = metrics_port + index * (numProcesses + 1) if metrics_port else 0
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), "agent", "--host", "127.0.0.1", "--port", str(port), "--processes", str(numProcesses), "--metrics-port", str(agentMetricsPort)]))
+        addresses.append("127.0.0.1:" + str(port))
+
+    # Wait for the agents to accept connections
+    deadline = time.time() + agentConnectTimeout
+    for address in addresses:
+        host, port = address.rsplit(":", 1)
+        while True:
+            try:
+                socket.create_connection((host, int(port)), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+    return processes, addresses
+
+
+def run_agent(args):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    agent = LoadAgent(args.host, args.port, args.processes, args.metrics_port)
+    logging.info("Load agent listening on " + args.host + ":" + str(args.port))
+    try:
+        agent.serve_forever()
+    finally:
+        agent.server_close()
+
+
+def run_check(args):
+    """
+    Run one short arrival rate step on local agents against a CheckFrontend, and check:
+        - a raw JSON line round trip with each agent, and the JSON encoding of the step results
+        - the clock offsets measured by the controller (the agents share the clock of this host)
+        - the merged counts against the results of each agent and the requests the frontend served
+        - the send deadlines of the agents, which the phases index / target interleave into a single schedule
+    Exit with status 1 if a check failed.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    frontend = CheckFrontend(int(LoadEngine.thesisFrontendPort))
+    threading.Thread(target=frontend.serve_forever, daemon=True).start()
+    failures = []
+    started = time.time()
+    localAgents, addresses = start_local_agents(args.local_agents, args.processes)
+    try:
+        # JSON lines protocol: one request line, one reply line
+        for address in addresses:
+            host, port = address.rsplit(":", 1)
+            with socket.create_connection((host, int(port))) as connection, connection.makefile('rwb') as stream:
+                send_message(stream, {"command": "time"})
+                reply = receive_message(stream)
+                send_message(stream, {"command": "stop"})
+                receive_message(stream)
+            check_results(failures, "Protocol with " + address, isinstance(reply.get("time"), float) and abs(reply["time"] - time.time()) < 1, "time reply " + json.dumps(reply))
+
+        controller = LoadController(addresses)
+        for agent in controller.agents:
+            check_results(failures, "Clock offset of " + agent.address, abs(agent.clock_offset) <= checkClockTolerance, str(agent.clock_offset * 1000) + " ms")
+
+        catalogItems = [{"id": index + 1, "name": "Item " + str(index + 1), "price": 100, "catalogBrandId": 1, "catalogTypeId": 1} for index in range(args.rows)]
+        discountItems = [{"id": index + 1, "itemName": "Item " + str(index + 1), "itemBrand": "Brand", "itemType": "Type", "discountValue": 10} for index in range(args.rows)]
+        read_write_list = [1 for _ in range(args.read_write_ratio)] + [0 for _ in range(10 - args.read_write_ratio)]
+        agentResults = controller.run_agent_steps(1, LoadEngine.ARRIVAL_RATE, args.throughput, catalogItems, discountItems, read_write_list, args.seconds)
+        merged = LoadEngine.merge_step_results(agentResults)
+        controller.close(shutdown=True)
+
+        for address, results in zip(addresses, agentResults):
+            decoded = decode_step_results(json.loads(json.dumps(encode_step_results(results))))
+            sameResults = decoded["serviceTime"].to_bytes() == results["serviceTime"].to_bytes() and list(decoded["scheduleLag"]) == list(results["scheduleLag"]) and decoded["coherence"].counts() == results["coherence"].counts()
+            check_results(failures, "Step results encoding of " + address, sameResults, str(results["serviceTime"].total_count) + " operations")
+
+        reads = merged["readOperationsCount"]
+        writes = merged["writeOperationsCount"]
+        summed = [sum(results[count] for results in agentResults) for count in ["readOperationsCount", "writeOperationsCount", "successCount"]]
+        check_results(failures, "Merged counts", [reads, writes, merged["successCount"]] == summed and merged["serviceTime"].total_count == reads + writes,
+                      str(reads) + " reads, " + str(writes) + " writes, " + str(merged["successCount"]) + " successes")
+        check_results(failures, "Requests served", frontend.counts == {"read": reads, "write": writes}, "frontend served " + json.dumps(frontend.counts))
+        check_results(failures, "Coherence", merged["coherence"].counts() == {"OK": reads, "anomalies": 0}, json.dumps(merged["coherence"].counts()))
+        # Each event loop can send one operation more or less than its share of the step
+        expected = args.throughput * args.seconds
+        senders = args.local_agents * args.processes * LoadEngine.numEventLoops
+        check_results(failures, "Operations sent", abs(reads + writes - expected) <= senders, str(reads + writes) + " for " + str(expected) + " expected")
+        check_pacing(failures, [address.rsplit(":", 1)[1] for address in addresses], started, 1, args.throughput)
+    finally:
+        for process in localAgents:
+            try:
+                process.wait(timeout=agentConnectTimeout)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                process.wait()
+        frontend.shutdown()
+        frontend.server_close()
+    if failures:
+        logging.error("Loopback check failed: " + ", ".join(failures))
+        sys.exit(1)
+    logging.info("Loopback check passed")
+
+
+def run_controller(args):
+    test_logging_path = ThroughputTest.configureRootLogger(args.contention, args.wrappers)
+
+    # Start the local agents, or connect to the given ones
+    localAgents = []
+    addresses = args.agents.split(",") if args.agents else []
+    if args.local_agents > 0:
+        localAgents, addresses = start_local_agents(args.local_agents, args.processes, args.metrics_port)
+    if len(addresses) == 0:
+        raise ValueError("No agents given, use --agents or --local-agents")
+
+    try:
+        controller = LoadController(addresses)
+        for agent in controller.agents:
+            logging.info("Agent " + agent.address + " clock offset: " + str(agent.clock_offset * 1000) + " ms")
+
+        # Define the catalog items used in the test, one row for high contention and rows rows for low contention
+        catalogItemIDs = [i for i in range(1, args.rows + 1)] if args.contention == "0" else [1]
+        catalogItems = ThroughputTest.QueryCatalogItemById(catalogItemIDs)
+        discountItems = ThroughputTest.QueryDiscountItemById(catalogItems)
+        for index, (catalogItem, discountItem) in enumerate(zip(catalogItems, discountItems)):
+            ThroughputTest.AddCatalogItemToBasket(catalogItem, discountItem, "basket" + str(index))
+
+        read_ratio = (10 - args.read_write_ratio) * 10
+        write_ratio = 100 - read_ratio
+        read_write_list = [1 for _ in range(args.read_write_ratio)] + [0 for _ in range(10 - args.read_write_ratio)]
+
+        report = []
+        throughput = args.throughput
+        testNum = 0
+        while throughput <= args.max_throughput:
+            testNum += 1
+            logger, log_file = ThroughputTest.ConfigureLoggingSettings(testNum, throughput, test_logging_path)
+            stepResults = controller.run_step(testNum, LoadEngine.ARRIVAL_RATE, throughput, catalogItems, discountItems, read_write_list, args.seconds, args.arrival_process, args.key_distribution)
+
+            # Open RESULTS log tag
+            logger.info("-------------TEST RESULTS-------------")
+            logger.info("Throughput: " + str(throughput) + " req/sec.")
+            logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+            logger.info("Key distribution: " + args.key_distribution + " over " + str(len(catalogItems)) + " rows")
+            logger.info("Agents: " + str(len(controller.agents)))
+
+            # Log the totals, throughput, success rate and latency percentiles merged over the agents
+            LoadEngine.log_step_summary(logger, stepResults, args.seconds)
+            LoadEngine.save_step_histograms(stepResults, log_file)
+
+            # Coherence counted by the agents as the baskets were read, with the sample anomalies merged over the agents
+            coherence = stepResults["coherence"]
+            logger.info("Results: " + str(coherence.ok) + " OK Reads, " + str(coherence.anomalies) + " Anomalies")
+            for line in coherence.anomaly_lines():
+                logger.info(line)
+            logger.info("=========================================")
+            report.append((throughput, stepResults))
+
+            throughput += args.throughput_step
+
+        # Log the merged report of the whole test, one line per step
+        logging.info("-------------DISTRIBUTED TEST REPORT-------------")
+        for throughput, stepResults in report:
+            p95 = stepResults["responseTime"].value_at_percentile(95)
+            logging.info("Throughput: " + str(throughput) + " req/sec. Answered: " + str(stepResults["serviceTime"].total_count / args.seconds) + " req/sec. p(95) response time: " + str(p95 / 1000000) + " ms. Anomalies: " + str(stepResults["coherence"].anomalies) + "/" + str(stepResults["readOperationsCount"]))
+        controller.close(shutdown=len(localAgents) > 0)
+    finally:
+        for process in localAgents:
+            try:
+                process.wait(timeout=agentConnectTimeout)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed load generation for the UpdatePriceDiscount tests")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    agent_parser = subparsers.add_parser("agent", help="Run a load agent")
+    agent_parser.add_argument("--host", default="0.0.0.0")
+    agent_parser.add_argument("--port", type=int, default=defaultAgentPort)
+    agent_parser.add_argument("--processes", type=int, default=1, help="Load generator processes of the agent")
+    agent_parser.add_argument("--metrics-port", type=int, default=0, help="Port of the live /metrics endpoint, its load generator processes use the next ports. 0 to disable")
+
+    controller_parser = subparsers.add_parser("controller", help="Run a test plan over the agents")
+    controller_parser.add_argument("contention", help="0 for low contention, 1 for high contention")
+    controller_parser.add_argument("wrappers", help="0 for no wrappers, 1 for wrappers")
+    controller_parser.add_argument("--agents", default="", help="Comma separated host:port of the agents")
+    controller_parser.add_argument("--local-agents", type=int, default=0, help="Start this many agents on the loopback interface")
+    controller_parser.add_argument("--processes", type=int, default=1, help="Load generator processes of each local agent")
+    controller_parser.add_argument("--metrics-port", type=int, default=0, help="First live /metrics port of the local agents. 0 to disable")
+    controller_parser.add_argument("--throughput", type=int, default=ThroughputTest.throughput)
+    controller_parser.add_argument("--max-throughput", type=int, default=ThroughputTest.max_throughput)
+    controller_parser.add_argument("--throughput-step", type=int, default=ThroughputTest.throughput_step)
+    controller_parser.add_argument("--seconds", type=int, default=ThroughputTest.secondsToRun)
+    controller_parser.add_argument("--read-write-ratio", type=int, default=ThroughputTest.read_write_ratio)
+    controller_parser.add_argument("--rows", type=int, default=ThroughputTest.contention_rows, help="Contention rows used with low contention")
+    controller_parser.add_argument("--arrival-process", default=ThroughputTest.arrival_process)
+    controller_parser.add_argument("--key-distribution", default=ThroughputTest.key_distribution, help="Rows picked by the operations, see KeyDistributions.py")
+
+    check_parser = subparsers.add_parser("check", help="Check the agents and the controller on the loopback interface, against a stand-in frontend")
+    check_parser.add_argument("--local-agents", type=int, default=2)
+    check_parser.add_argument("--processes", type=int, default=1, help="Load generator processes of each local agent")
+    check_parser.add_argument("--throughput", type=int, default=40)
+    check_parser.add_argument("--seconds", type=int, default=3)
+    check_parser.add_argument("--read-write-ratio", type=int, default=ThroughputTest.read_write_ratio)
+    check_parser.add_argument("--rows", type=int, default=ThroughputTest.contention_rows)
+
+    args = parser.parse_args()
+    if args.role == "agent":
+        run_agent(args)
+    elif args.role == "check":
+        run_check(args)
+    else:
+        run_controller(args)
+
+
+if __name__ == "__main__":
+    # Call main function
+    main()
@@ -0,0 +1,173 @@
+import collections
+import CoherenceCheck
+import glob
+import json
+import os
+import struct
+import threading
+import time
+
+"""	Structured per-operation event stream of the load generators.
+    Instead of formatting a logger.info line for every operation and recovering the prices and discounts from the text
+    with a regex afterwards, the generators hand each operation to an EventWriter as a tuple (operation, worker, row,
+    intended start, actual start, duration, HTTP status, price, discount). Appending the tuple is all the hot path
+    does: a background thread encodes the buffered events and writes them to the step event file in batches.
+    A generator that retries an operation also emits an event for every failed attempt, with the status of that attempt
+    (NO_RESPONSE when it got no HTTP response) and its own start and duration, before the event of the operation.
+    Only the events with status 200 are completed operations.
+    The stream is either binary (fixed size records, the default) or NDJSON (one JSON object per line, for other
+    tools). Both start with a header holding a time.time_ns() / time.perf_counter_ns() pair taken together, so the
+    reader converts the perf counter times of any process to wall clock times.
+    Files ending in .ndjson are NDJSON, any other file is binary.
+"""
+READ = 0
+WRITE = 1
+operationNames = ["read", "write"]
+NO_RESPONSE = 0 # Status of a failed attempt that got no HTTP response (connection error or timeout)
+
+BINARY = "binary"
+NDJSON = "ndjson"
+binaryExtension = ".events"
+ndjsonExtension = ".ndjson"
+
+flushInterval = 0.2 # Seconds between two writes of the buffered events to the file
+
+streamMagic = b"EVTS"
+streamVersion = 1
+headerRecord = struct.Struct("<4sBqq") # magic, version, wall clock ns, perf counter ns
+# operation, HTTP status, intended start ns, actual start ns, duration ns, price, discount, row, worker name
+eventRecord = struct.Struct("<BHqqqddi16s")
+readChunkRecords = 65536 # Records decoded per read of a binary stream
+
+
+class EventWriter:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = NDJSON if path.endswith(ndjsonExtension) else BINARY
+        self.file = open(path, 'wb')
+        # Clock anchor of the stream: the perf counter times of the events are relative to this process
+        wallClock = time.time_ns()
+        perfCounter = time.perf_counter_ns()
+        if self.format == NDJSON:
+            self.file.write(json.dumps({"stream": "events", "version": streamVersion, "wallClockNs": wallClock, "perfCounterNs": perfCounter}).encode() + b"\n")
+        else:
+            self.file.write(headerRecord.pack(streamMagic, streamVersion, wallClock, perfCounter))
+        # deque append and popleft are thread safe, so the event loops and client threads emit without a lock
+        self.buffer = collections.deque()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def emit(self, operation: int, worker: str, key: int, intendedStart: int, start: int, duration: int, status: int, price: float, discount: float):
+        """ Buffer the event of one operation. Times are time.perf_counter_ns() values and durations nanoseconds. """
+        self.buffer.append((operation, worker, key, intendedStart, start, duration, status, price, discount))
+
+    def _encode(self, event: tuple) -> bytes:
+        operation, worker, key, intendedStart, start, duration, status, price, discount = event
+        if self.format == NDJSON:
+            return json.dumps({"op": operationNames[operation], "worker": worker, "key": key, "intendedStart": intendedStart, "start": start,
+                               "duration": duration, "status": status, "price": price, "discount": discount}, separators=(",", ":")).encode() + b"\n"
+        return eventRecord.pack(operation, status, intendedStart, start, duration, price, discount, key, worker.encode()[:16])
+
+    def _flush(self):
+        encoded = []
+        while self.buffer:
+            encoded.append(self._encode(self.buffer.popleft()))
+        if encoded:
+            self.file.write(b"".join(encoded))
+
+    def _write_loop(self):
+        while not self.closed.wait(flushInterval):
+            self._flush()
+
+    def close(self):
+        """ Write the remaining events and close the file. Call it once every operation of the step finished. """
+        self.closed.set()
+        self.thread.join()
+        self._flush()
+        self.file.close()
+
+
+class NullEventWriter:
+    """ Discards the events, for load that is not measured (warm-up). """
+
+    def emit(self, *event):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_event_writer(path: str):
+    return NullEventWriter() if path is None else EventWriter(path)
+
+
+def event_stream_path(log_file: str, event_format: str = BINARY) -> str:
+    # Event file of a step, next to its log file
+    return os.path.splitext(log_file)[0] + (ndjsonExtension if event_format == NDJSON else binaryExtension)
+
+
+def worker_event_stream_path(path: str, index: int) -> str:
+    # Event file of one worker process of a step: "Step.events" becomes "Step.<index>.events"
+    base, extension = os.path.splitext(path)
+    return base + "." + str(index) + extension
+
+
+def step_event_files(path: str) -> list:
+    """ Return the event files of a step: the file itself and the files of its worker processes. """
+    base, extension = os.path.splitext(path)
+    files = [path] if os.path.exists(path) else []
+    return files + sorted(glob.glob(glob.escape(base) + ".*" + extension))
+
+
+def _read_binary_events(file) -> iter:
+    magic, version, wallClock, perfCounter = headerRecord.unpack(file.read(headerRecord.size))
+    if magic != streamMagic or version != streamVersion:
+        raise ValueError("Not an event stream: " + file.name)
+    while True:
+        chunk = file.read(eventRecord.size * readChunkRecords)
+        if not chunk:
+            return
+        # A stream cut short (killed generator) can end in a partial record, which is dropped
+        chunk = chunk[:len(chunk) - len(chunk) % eventRecord.size]
+        for operation, status, intendedStart, start, duration, price, discount, key, worker in eventRecord.iter_unpack(chunk):
+            yield {"op": operationNames[operation], "worker": worker.rstrip(b"\x00").decode(), "key": key,
+                   "intendedStart": wallClock + intendedStart - perfCounter, "start": wallClock + start - perfCounter,
+                   "duration": duration, "status": status, "price": price, "discount": discount}
+
+
+def _read_ndjson_events(file) -> iter:
+    header = json.loads(file.readline())
+    wallClock = header["wallClockNs"]
+    perfCounter = header["perfCounterNs"]
+    for line in file:
+        if not line.endswith(b"\n"):
+            # Partial last line of a stream cut short
+            return
+        event = json.loads(line)
+        event["intendedStart"] = wallClock + event["intendedStart"] - perfCounter
+        event["start"] = wallClock + event["start"] - perfCounter
+        yield event
+
+
+def read_events(path: str) -> iter:
+    """ Yield the events of a stream as dicts, with intendedStart and start converted to time.time_ns() values. """
+    with open(path, 'rb') as file:
+        if path.endswith(ndjsonExtension):
+            yield from _read_ndjson_events(file)
+        else:
+            yield from _read_binary_events(file)
+
+
+def check_discount_from_events(files: list) -> CoherenceCheck.CoherenceCounter:
+    """ Count the coherent reads and the anomalies of recorded event files, for analysis after the test.
+        The generators count them as the baskets are read, this recomputes the same counts from the stream.
+    """
+    coherence = CoherenceCheck.CoherenceCounter()
+    for path in files:
+        for event in read_events(path):
+            # Failed attempts of a read did not read a basket
+            if event["op"] == "read" and event["status"] == 200:
+                coherence.check(event["price"], event["discount"], event["worker"], "basket" + str(event["key"]), event["start"] / 1000000000)
+    return coherence
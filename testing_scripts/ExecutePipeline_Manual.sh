@@ -44,13 +44,15 @@ restart_system() {
     cd ..;
 }
 
+# The runs are recorded as k6 metric points (--out json, gzip compressed) and end of test summaries (--summary-export),
+# see testing_scripts/logs/K6_tests/k6_output.py. Pass -e LOG_OPERATIONS=true and --console-output to k6 to record console logs instead.
 event_test() {
     for test_vu in "${test_VUs[@]}"
     do
         for i in {1..1}
         do  
             restart_system
-            k6 run testing_scripts/k6_scripts/${K6_script}_${contention}Contention.js --vus ${test_vu} --stage 20s:${test_vu} --stage 50s:${test_vu} --console-output "testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/${test_vu}_${i}.txt"
+            k6 run testing_scripts/k6_scripts/${K6_script}_${contention}Contention.js --vus ${test_vu} --stage 20s:${test_vu} --stage 50s:${test_vu} --out json="testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/${test_vu}_${i}.json.gz" --summary-export "testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/${test_vu}_${i}_summary.json"
         done
     done
 }
@@ -70,7 +72,7 @@ memory_test() {
             basket_container_id=$(sudo docker ps -f "name=basket*" -q)
             echo "Container ID for Basket-api: $basket_container_id"
 
-            k6 run testing_scripts/k6_scripts/${K6_script}_${contention}Contention.js --vus ${test_vu} --stage 20s:${test_vu} --stage 50s:${test_vu} --console-output "testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/tmp_memory/${test_vu}_${i}.txt" &
+            k6 run testing_scripts/k6_scripts/${K6_script}_${contention}Contention.js --vus ${test_vu} --stage 20s:${test_vu} --stage 50s:${test_vu} --out json="testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/tmp_memory/${test_vu}_${i}.json.gz" --summary-export "testing_scripts/logs/K6_tests/Thesis_results/${system}/${contention}_${functionality}_${withOrwithoutEvents}Events/${versions}_versions/tmp_memory/${test_vu}_${i}_summary.json" &
             k6_pid=$!  # Get the process ID of the k6 run command
             
             # Run docker stats command concurrently with k6
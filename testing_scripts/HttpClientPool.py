@@ -0,0 +1,140 @@
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+"""	Shared HTTP client layer for the testing_scripts load generators.
+    Every worker (thread or event loop) gets its own keep-alive sessions, so requests reuse pooled TCP connections
+    instead of opening a new connection per request. The pool size is configured per target port, and the number
+    of new and reused connections is counted per port.
+"""
+thesisFrontendPort = "5142"
+catalogServicePort = "5101"
+discountServicePort = "5140"
+basketServicePort = "5103"
+
+# Maximum number of pooled connections per target port, for each worker
+poolSizes = {
+    thesisFrontendPort: 1024,
+    catalogServicePort: 32,
+    discountServicePort: 32,
+    basketServicePort: 32,
+}
+defaultPoolSize = 32 # Pool size used for ports not listed above
+
+# Each thread gets its own requests.Session, registered here so that the connection counters can be collected
+_thread_sessions = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+
+def configure_pool_sizes(sizes: dict):
+    # Override the pool size of some target ports. Only affects the sessions created afterwards
+    for port, size in sizes.items():
+        poolSizes[str(port)] = size
+
+
+def session() -> requests.Session:
+    """ Return the keep-alive requests.Session of the calling thread, creating it on first use. """
+    http = getattr(_thread_sessions, "session", None)
+    if http is None:
+        http = requests.Session()
+        for port, size in poolSizes.items():
+            # Mount a dedicated adapter per target port, so each port has its own pool size
+            http.mount("http://localhost:" + port + "/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+        http.mount("http://", HTTPAdapter(pool_maxsize=defaultPoolSize))
+        _thread_sessions.session = http
+        with _sessions_lock:
+            _sessions.append(http)
+    return http
+
+
+def connection_counters() -> dict:
+    """ Return the number of new and reused connections of every thread session, per target port.
+        The counters are cumulative, take the difference of two calls to get the counters of a test step.
+    """
+    counters = {}
+    with _sessions_lock:
+        sessions = list(_sessions)
+    for http in sessions:
+        for adapter in set(http.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                port = str(pool.port)
+                if port not in counters:
+                    counters[port] = {"new": 0, "reused": 0}
+                # urllib3 counts every connection it opens and every request sent through the pool
+                counters[port]["new"] += pool.num_connections
+                counters[port]["reused"] += pool.num_requests - pool.num_connections
+    return counters
+
+
+def subtract_counters(after: dict, before: dict) -> dict:
+    # Connection counters of the interval between two connection_counters() calls
+    counters = {}
+    for port in after:
+        counters[port] = {
+            "new": after[port]["new"] - before.get(port, {}).get("new", 0),
+            "reused": after[port]["reused"] - before.get(port, {}).get("reused", 0),
+        }
+    return counters
+
+
+def merge_counters(counters: dict, other: dict):
+    # Add the counters in other to counters, in place
+    for port in other:
+        if port not in counters:
+            counters[port] = {"new": 0, "reused": 0}
+        counters[port]["new"] += other[port]["new"]
+        counters[port]["reused"] += other[port]["reused"]
+
+
+def log_connection_counters(logger, counters: dict):
+    # Log the number of new and reused connections for each target port
+    for port in sorted(counters):
+        new = counters[port]["new"]
+        reused = counters[port]["reused"]
+        total = new + reused
+        reuse_ratio = reused / total * 100 if total > 0 else 0
+        logger.info("Connections to port " + port + ": " + str(new) + " new, " + str(reused) + " reused (" + str(reuse_ratio) + "% reuse)")
+
+
+class AsyncClientPool:
+    """ Keep-alive aiohttp sessions of one event loop, one session per target port.
+        Must only be used from the event loop that created it, which keeps the counters free of locks.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.counters = {}
+
+    def session(self, port: str) -> aiohttp.ClientSession:
+        http = self.sessions.get(port)
+        if http is None:
+            self.counters[port] = {"new": 0, "reused": 0}
+            connector = aiohttp.TCPConnector(limit=poolSizes.get(port, defaultPoolSize))
+            http = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config(port)])
+            self.sessions[port] = http
+        return http
+
+    def _trace_config(self, port: str) -> aiohttp.TraceConfig:
+        counters = self.counters[port]
+
+        async def on_connection_create_end(session, context, params):
+            counters["new"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            counters["reused"] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def close(self):
+        for http in self.sessions.values():
+            await http.close()
+        self.sessions = {}
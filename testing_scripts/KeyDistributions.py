@@ -0,0 +1,113 @@
+import itertools
+import random
+from array import array
+
+"""	Key selection for the load generators: which catalog row (and its basket) each operation touches.
+    Contention used to be either one hot row or a uniform choice over a handful of rows. A KeySelector draws the row
+    index from one of several access distributions over any number of rows:
+      - "uniform": every row equally likely
+      - "zipfian[:s]": the row of rank k is picked with probability proportional to 1 / k^s (default s = 0.99)
+      - "hotspot[:ops:rows]": a fraction ops of the operations go to the first fraction rows of the rows (default 0.8:0.2)
+      - "sequential": the rows in turn, wrapping around
+    Weighted distributions are sampled with a precomputed alias table (Vose's method), so drawing a row costs the same
+    constant time whatever the number of rows and the skew. The hot rows are always the lowest indexes (catalog IDs).
+"""
+UNIFORM = "uniform"
+ZIPFIAN = "zipfian"
+HOTSPOT = "hotspot"
+SEQUENTIAL = "sequential"
+
+defaultZipfExponent = 0.99 # Skew of the zipfian distribution, as in YCSB
+defaultHotOpFraction = 0.8 # Fraction of the operations that go to the hot rows of the hotspot distribution
+defaultHotRowFraction = 0.2 # Fraction of the rows that are hot in the hotspot distribution
+
+
+class AliasTable:
+    """ Vose's alias method: sample an index with probability proportional to its weight in O(1). """
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("An alias table needs at least one weight")
+        total = float(sum(weights))
+        # Scale the probabilities so their average is 1, then pair each under-full slot with an over-full one
+        scaled = [weight * n / total for weight in weights]
+        self.probability = array('d', [1.0] * n)
+        self.alias = array('l', range(n))
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is full up to rounding errors, and keeps probability 1
+
+    def sample(self, rand: random.Random) -> int:
+        # One uniform draw picks the slot with its integer part and the slot side with its fractional part
+        u = rand.random() * len(self.probability)
+        index = int(u)
+        return index if u - index < self.probability[index] else self.alias[index]
+
+
+def parse_distribution(spec: str) -> tuple:
+    # Split a distribution spec such as "zipfian:1.2" or "hotspot:0.9:0.1" in its name and parameters
+    name, *params = spec.split(":")
+    return name, [float(param) for param in params]
+
+
+def zipfian_weights(numKeys: int, exponent: float = defaultZipfExponent) -> list[float]:
+    return [1.0 / (rank ** exponent) for rank in range(1, numKeys + 1)]
+
+
+def hotspot_weights(numKeys: int, hot_op_fraction: float = defaultHotOpFraction, hot_row_fraction: float = defaultHotRowFraction) -> list[float]:
+    # At least one hot row, and at least one cold row when there is more than one row
+    hotRows = min(max(1, int(round(numKeys * hot_row_fraction))), max(1, numKeys - 1))
+    coldRows = numKeys - hotRows
+    if coldRows == 0:
+        return [1.0]
+    return [hot_op_fraction / hotRows] * hotRows + [(1.0 - hot_op_fraction) / coldRows] * coldRows
+
+
+class KeySelector:
+
+    def __init__(self, numKeys: int, distribution: str = UNIFORM, seed: int = None):
+        name, params = parse_distribution(distribution)
+        if name not in (UNIFORM, ZIPFIAN, HOTSPOT, SEQUENTIAL):
+            raise ValueError("Unknown key distribution: " + str(distribution))
+        if numKeys < 1:
+            raise ValueError("A key distribution needs at least one key")
+        self.numKeys = numKeys
+        self.distribution = distribution
+        self.name = name
+        self.random = random.Random(seed)
+        self.table = None
+        if name == ZIPFIAN:
+            self.table = AliasTable(zipfian_weights(numKeys, *params))
+        elif name == HOTSPOT:
+            self.table = AliasTable(hotspot_weights(numKeys, *params))
+        # next() on itertools.count is atomic, so the sequential order holds across threads and event loops
+        self.counter = itertools.count()
+
+    def next_key(self) -> int:
+        """ Return the index of the row the next operation touches, in [0, numKeys). """
+        if self.table is not None:
+            return self.table.sample(self.random)
+        if self.name == SEQUENTIAL:
+            return next(self.counter) % self.numKeys
+        return int(self.random.random() * self.numKeys)
+
+    def probabilities(self) -> list[float]:
+        """ Probability of each row being picked, to log or plot the skew of a test. """
+        if self.table is None:
+            return [1.0 / self.numKeys] * self.numKeys
+        n = self.numKeys
+        probabilities = [probability / n for probability in self.table.probability]
+        for index, alias in enumerate(self.table.alias):
+            probabilities[alias] += (1.0 - self.table.probability[index]) / n
+        return probabilities
@@ -0,0 +1,205 @@
+import struct
+import zlib
+from array import array
+
+"""	Fixed memory latency histogram for the load generators, following the HdrHistogram bucket layout.
+    Values (nanoseconds) are counted in log-linear buckets: every power of two range is split into the same number of
+    linear sub-buckets, so any recorded value is kept with a bounded relative error (significant_figures decimal
+    digits) while the memory used does not depend on the number of samples.
+    Each worker (thread or event loop) records into its own histogram, and the histograms are merged at the end of a
+    test step. The merged histograms of a step are saved in a compact binary file, so they can be merged across runs.
+"""
+defaultHighestTrackableValue = 3600 * 1000000000 # One hour in nanoseconds, larger values are clamped
+defaultSignificantFigures = 2
+
+reportedPercentiles = [50, 90, 95, 99, 99.9]
+
+_header = struct.Struct('<4sBqqqqq')
+_magic = b'HIST'
+
+
+class LatencyHistogram:
+
+    def __init__(self, highest_trackable_value: int = defaultHighestTrackableValue, significant_figures: int = defaultSignificantFigures):
+        if significant_figures < 1 or significant_figures > 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+        self.highest_trackable_value = highest_trackable_value
+        self.significant_figures = significant_figures
+
+        # Number of linear sub-buckets needed to keep significant_figures digits, rounded up to a power of two
+        largest_value_with_single_unit_resolution = 2 * 10 ** significant_figures
+        self.sub_bucket_count_magnitude = (largest_value_with_single_unit_resolution - 1).bit_length()
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+
+        # Number of power of two buckets needed to cover highest_trackable_value
+        smallest_untrackable_value = self.sub_bucket_count
+        self.bucket_count = 1
+        while smallest_untrackable_value <= highest_trackable_value:
+            smallest_untrackable_value <<= 1
+            self.bucket_count += 1
+
+        self.counts = array('q', bytes(8 * (self.bucket_count + 1) * self.sub_bucket_half_count))
+        self.total_count = 0
+        self.total = 0 # Exact sum of the recorded values
+        self.min = 0
+        self.max = 0
+
+    def _counts_index(self, value: int) -> int:
+        bucket_index = (value | self.sub_bucket_mask).bit_length() - self.sub_bucket_count_magnitude
+        sub_bucket_index = value >> bucket_index
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + (sub_bucket_index - self.sub_bucket_half_count)
+
+    def _value_from_index(self, index: int) -> int:
+        # Lowest value counted at index
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        return sub_bucket_index << bucket_index
+
+    def _highest_equivalent_value(self, index: int) -> int:
+        # Highest value counted at index
+        bucket_index = max(0, (index >> self.sub_bucket_half_count_magnitude) - 1)
+        return self._value_from_index(index) + (1 << bucket_index) - 1
+
+    def record(self, value: int):
+        """ Record a single value, in nanoseconds. """
+        value = min(max(int(value), 0), self.highest_trackable_value)
+        self.counts[self._counts_index(value)] += 1
+        if self.total_count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.total_count += 1
+        self.total += value
+
+    def merge(self, other: "LatencyHistogram"):
+        """ Add the counts of other to this histogram, which must have the same layout. """
+        if other.highest_trackable_value != self.highest_trackable_value or other.significant_figures != self.significant_figures:
+            raise ValueError("Cannot merge histograms with a different layout")
+        if other.total_count == 0:
+            return
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        if self.total_count == 0 or other.min < self.min:
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        self.total_count += other.total_count
+        self.total += other.total
+
+    def bucket_index(self, value: int) -> int:
+        """ Index of the count a value (nanoseconds) is recorded at, once clamped to the trackable range as record() does. """
+        return self._counts_index(min(max(int(value), 0), self.highest_trackable_value))
+
+    def add_counts(self, counts: dict, total: int, sign: int = 1):
+        """ Add (sign 1) or remove (sign -1) counts given by index (see bucket_index) and the sum of their values.
+            Only the indices given are touched. min and max are left for the caller to set.
+        """
+        histogram_counts = self.counts
+        total_count = 0
+        for index, count in counts.items():
+            histogram_counts[index] += sign * count
+            total_count += count
+        self.total_count += sign * total_count
+        self.total += sign * total
+
+    def mean(self) -> float:
+        return self.total / self.total_count if self.total_count > 0 else 0
+
+    def values_at_percentiles(self, percentiles: list) -> list:
+        """ Return the value at each percentile (0-100), computed in a single pass over the counts. """
+        if self.total_count == 0:
+            return [0] * len(percentiles)
+        order = sorted(range(len(percentiles)), key=lambda i: percentiles[i])
+        values = [self.max] * len(percentiles)
+        position = 0
+        # Number of values at or below each requested percentile, at least 1
+        target = max(1, int(percentiles[order[0]] / 100 * self.total_count + 0.5))
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            cumulative += count
+            while cumulative >= target:
+                values[order[position]] = min(self._highest_equivalent_value(index), self.max)
+                position += 1
+                if position == len(order):
+                    return values
+                target = max(1, int(percentiles[order[position]] / 100 * self.total_count + 0.5))
+        return values
+
+    def value_at_percentile(self, percentile: float) -> int:
+        return self.values_at_percentiles([percentile])[0]
+
+    def to_bytes(self) -> bytes:
+        """ Compact serialized form: a fixed header followed by the zlib compressed non-zero (index, count) pairs. """
+        pairs = array('q')
+        for index, count in enumerate(self.counts):
+            if count:
+                pairs.append(index)
+                pairs.append(count)
+        header = _header.pack(_magic, self.significant_figures, self.highest_trackable_value, self.total_count, self.total, self.min, self.max)
+        return header + zlib.compress(pairs.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencyHistogram":
+        magic, significant_figures, highest_trackable_value, total_count, total, minimum, maximum = _header.unpack_from(data)
+        if magic != _magic:
+            raise ValueError("Not a serialized LatencyHistogram")
+        histogram = cls(highest_trackable_value, significant_figures)
+        pairs = array('q')
+        pairs.frombytes(zlib.decompress(data[_header.size:]))
+        for i in range(0, len(pairs), 2):
+            histogram.counts[pairs[i]] = pairs[i + 1]
+        histogram.total_count = total_count
+        histogram.total = total
+        histogram.min = minimum
+        histogram.max = maximum
+        return histogram
+
+
+def merge_histograms(histograms) -> LatencyHistogram:
+    # Merge the histograms of every worker into a new histogram
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
+
+
+def save_histograms(file_path: str, histograms: dict):
+    """ Save named histograms (e.g. the service and response times of a step) to a single file. """
+    with open(file_path, 'wb') as file:
+        for name, histogram in histograms.items():
+            encoded_name = name.encode()
+            data = histogram.to_bytes()
+            file.write(struct.pack('<H', len(encoded_name)) + encoded_name)
+            file.write(struct.pack('<I', len(data)) + data)
+
+
+def load_histograms(file_path: str) -> dict:
+    # Read back the histograms written by save_histograms
+    histograms = {}
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    offset = 0
+    while offset < len(data):
+        name_length, = struct.unpack_from('<H', data, offset)
+        name = data[offset + 2:offset + 2 + name_length].decode()
+        offset += 2 + name_length
+        data_length, = struct.unpack_from('<I', data, offset)
+        histograms[name] = LatencyHistogram.from_bytes(data[offset + 4:offset + 4 + data_length])
+        offset += 4 + data_length
+    return histograms
+
+
+def log_percentiles(logger, label: str, histogram: LatencyHistogram):
+    # Log the reported percentiles and the maximum of a histogram, in milliseconds
+    values = histogram.values_at_percentiles(reportedPercentiles)
+    line = ", ".join(["p(" + str(percentile) + ") " + str(value / 1000000) + " ms" for percentile, value in zip(reportedPercentiles, values)])
+    logger.info(label + " percentiles: " + line + ", max " + str(histogram.max / 1000000) + " ms")
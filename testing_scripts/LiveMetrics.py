@@ -0,0 +1,292 @@
+import collections
+import http.server
+import threading
+import time
+import LatencyHistogram
+
+"""	Live metrics of the load generator, served in the Prometheus text format on http://<host>:<port>/metrics.
+    The step results are only known once a step ends. These metrics are updated as the operations complete, so a bad
+    run can be aborted early and the client side can be correlated with the container metrics while the test runs:
+    rolling throughput, in-flight operations, p50/p95/p99 response time per operation type, anomaly ratio and
+    schedule lag, over the last windowSeconds complete seconds.
+    Each worker (event loop or client thread) only writes to its own WorkerMetrics, in per-second buckets, so nothing
+    is locked on the request path. A bucket only counts the histogram indices its response times and lags fall in (a
+    few dict entries), not a full histogram. When scraped, the endpoint thread adds the buckets of the seconds completed
+    since the last scrape to a RollingWindow, once per worker and second, and removes the seconds that left the window,
+    touching only the indices each bucket holds: a scrape walks the window histograms, whatever the number of workers.
+    The endpoint is off unless a port is given (metrics_port of the scripts).
+    Metrics are only collected in a process that started the endpoint (start_metrics_server), other processes get a
+    worker that discards them. With several load generator processes, each one serves its own port.
+"""
+READ = "read"
+WRITE = "write"
+operations = [READ, WRITE]
+
+windowSeconds = 10 # Complete seconds the rolling metrics are computed over
+reportedQuantiles = [50, 95, 99]
+_layout = LatencyHistogram.LatencyHistogram() # Layout of the window histograms, the per-second counts use its indices
+
+
+class SecondCounts:
+    """ Values recorded during one second, as the counts at the indices of the LatencyHistogram layout that were hit.
+        A second only holds the few indices its values fall in, instead of a full histogram.
+    """
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        index = _layout.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        value = min(max(int(value), 0), _layout.highest_trackable_value)
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+
+class MetricsBucket:
+    """ What a worker recorded during one second. """
+
+    def __init__(self, second: int):
+        self.second = second
+        self.completed = {operation: 0 for operation in operations}
+        self.responseTime = {operation: SecondCounts() for operation in operations}
+        self.reads = 0
+        self.anomalies = 0
+        self.scheduleLag = SecondCounts()
+
+
+class RollingWindow:
+    """ What every worker recorded over the last windowSeconds complete seconds. Each worker bucket is added to the
+        window histograms once its second is complete, and removed when the second leaves the window, touching only
+        the indices the bucket holds.
+    """
+
+    def __init__(self):
+        self.seconds = {} # Worker buckets added to the window, by second
+        self.merged = {} # Last second merged from each worker
+        self.completed = {operation: 0 for operation in operations}
+        self.responseTime = {operation: LatencyHistogram.LatencyHistogram() for operation in operations}
+        self.scheduleLag = LatencyHistogram.LatencyHistogram()
+        self.reads = 0
+        self.anomalies = 0
+
+    def _pairs(self, bucket: MetricsBucket) -> list:
+        # Window histogram and second counts of a bucket, for each of its histograms
+        return [(self.responseTime[operation], bucket.responseTime[operation]) for operation in operations] + [(self.scheduleLag, bucket.scheduleLag)]
+
+    def _add(self, bucket: MetricsBucket, sign: int):
+        for operation in operations:
+            self.completed[operation] += sign * bucket.completed[operation]
+        for histogram, counts in self._pairs(bucket):
+            histogram.add_counts(counts.counts, counts.total, sign)
+            if sign > 0:
+                histogram.max = max(histogram.max, counts.max)
+        self.reads += sign * bucket.reads
+        self.anomalies += sign * bucket.anomalies
+
+    def update(self, workers: dict, now: int):
+        """ Add the worker buckets of the seconds completed before now, and remove the seconds out of the window. """
+        start = now - windowSeconds
+        expired = [second for second in self.seconds if second < start]
+        for second in expired:
+            for bucket in self.seconds.pop(second):
+                self._add(bucket, -1)
+        for name, metrics in list(workers.items()):
+            merged = max(self.merged.get(name, start - 1), start - 1)
+            # Buckets are appended in time order, the current second is still being recorded
+            for bucket in list(metrics.buckets):
+                if merged < bucket.second < now:
+                    self.seconds.setdefault(bucket.second, []).append(bucket)
+                    self._add(bucket, 1)
+                    merged = bucket.second
+            self.merged[name] = merged
+        if expired:
+            # The maximum of the window is the one of the seconds left in it
+            buckets = [bucket for secondBuckets in self.seconds.values() for bucket in secondBuckets]
+            for operation in operations:
+                self.responseTime[operation].max = max([bucket.responseTime[operation].max for bucket in buckets], default=0)
+            self.scheduleLag.max = max([bucket.scheduleLag.max for bucket in buckets], default=0)
+
+
+class WorkerMetrics:
+
+    def __init__(self):
+        # Only the owning worker appends buckets, readers take a copy of the deque
+        self.buckets = collections.deque(maxlen=windowSeconds + 2)
+        self.started = 0
+        self.completed = {operation: 0 for operation in operations}
+
+    def _bucket(self) -> MetricsBucket:
+        second = int(time.time())
+        if not self.buckets or self.buckets[-1].second != second:
+            self.buckets.append(MetricsBucket(second))
+        return self.buckets[-1]
+
+    def operation_started(self):
+        self.started += 1
+
+    def operation_completed(self, operation: str, responseTime: int):
+        # responseTime in nanoseconds, measured from the intended start of the operation
+        bucket = self._bucket()
+        bucket.completed[operation] += 1
+        bucket.responseTime[operation].record(responseTime)
+        self.completed[operation] += 1
+
+    def read_checked(self, coherent: bool):
+        bucket = self._bucket()
+        bucket.reads += 1
+        if not coherent:
+            bucket.anomalies += 1
+
+    def schedule_lag(self, lag: int):
+        # Sends ahead of schedule count as no lag
+        self._bucket().scheduleLag.record(max(lag, 0))
+
+
+class NullWorkerMetrics:
+    """ Discards the metrics, when no endpoint is running in the process. """
+
+    def operation_started(self):
+        pass
+
+    def operation_completed(self, operation: str, responseTime: int):
+        pass
+
+    def read_checked(self, coherent: bool):
+        pass
+
+    def schedule_lag(self, lag: int):
+        pass
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.workers = {}
+        self.lock = threading.Lock() # Only taken when a worker is first seen
+        self.step = ""
+        self.window = RollingWindow()
+        self.renderLock = threading.Lock() # Scrapes update the window one at a time
+
+    def worker(self, name) -> WorkerMetrics:
+        metrics = self.workers.get(name)
+        if metrics is None:
+            with self.lock:
+                metrics = self.workers.setdefault(name, WorkerMetrics())
+        return metrics
+
+    def render(self) -> str:
+        """ Prometheus text exposition of the rolling metrics of every worker. """
+        with self.renderLock:
+            return self._render(int(time.time()))
+
+    def _render(self, now: int) -> str:
+        # Complete seconds only: the current second is still being recorded
+        self.window.update(self.workers, now)
+        completed = self.window.completed
+        responseTimes = self.window.responseTime
+        scheduleLag = self.window.scheduleLag
+        reads = self.window.reads
+        anomalies = self.window.anomalies
+        totals = {operation: 0 for operation in operations}
+        inFlight = 0
+        for metrics in list(self.workers.values()):
+            workerCompleted = dict(metrics.completed)
+            inFlight += metrics.started - sum(workerCompleted.values())
+            for operation in operations:
+                totals[operation] += workerCompleted[operation]
+
+        lines = []
+        if self.step:
+            lines += [
+                "# HELP loadgen_step Test step currently running",
+                "# TYPE loadgen_step gauge",
+                'loadgen_step{step="' + self.step + '"} 1',
+            ]
+        lines += [
+            "# HELP loadgen_operations_total Completed operations",
+            "# TYPE loadgen_operations_total counter",
+        ]
+        lines += ['loadgen_operations_total{operation="' + operation + '"} ' + str(totals[operation]) for operation in operations]
+        lines += [
+            "# HELP loadgen_throughput Completed operations per second over the last " + str(windowSeconds) + " seconds",
+            "# TYPE loadgen_throughput gauge",
+        ]
+        lines += ['loadgen_throughput{operation="' + operation + '"} ' + str(completed[operation] / windowSeconds) for operation in operations]
+        lines += [
+            "# HELP loadgen_in_flight Operations started and not completed yet",
+            "# TYPE loadgen_in_flight gauge",
+            "loadgen_in_flight " + str(max(inFlight, 0)),
+            "# HELP loadgen_response_time_seconds Response time from the intended start over the last " + str(windowSeconds) + " seconds",
+            "# TYPE loadgen_response_time_seconds summary",
+        ]
+        for operation in operations:
+            histogram = responseTimes[operation]
+            values = histogram.values_at_percentiles(reportedQuantiles)
+            for quantile, value in zip(reportedQuantiles, values):
+                lines.append('loadgen_response_time_seconds{operation="' + operation + '",quantile="' + str(quantile / 100) + '"} ' + str(value / 1000000000))
+            lines.append('loadgen_response_time_seconds_sum{operation="' + operation + '"} ' + str(histogram.total / 1000000000))
+            lines.append('loadgen_response_time_seconds_count{operation="' + operation + '"} ' + str(histogram.total_count))
+        lines += [
+            "# HELP loadgen_anomaly_ratio Anomalous reads over checked reads in the last " + str(windowSeconds) + " seconds",
+            "# TYPE loadgen_anomaly_ratio gauge",
+            "loadgen_anomaly_ratio " + str(anomalies / reads if reads > 0 else 0),
+            "# HELP loadgen_schedule_lag_seconds Send time minus intended send time over the last " + str(windowSeconds) + " seconds",
+            "# TYPE loadgen_schedule_lag_seconds summary",
+        ]
+        lagValues = scheduleLag.values_at_percentiles(reportedQuantiles)
+        for quantile, value in zip(reportedQuantiles, lagValues):
+            lines.append('loadgen_schedule_lag_seconds{quantile="' + str(quantile / 100) + '"} ' + str(value / 1000000000))
+        lines.append("loadgen_schedule_lag_seconds_max " + str(scheduleLag.max / 1000000000))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not logged
+        pass
+
+
+_registry = None
+_nullWorker = NullWorkerMetrics()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> http.server.ThreadingHTTPServer:
+    """ Start collecting the metrics of this process and serve them on port, from a daemon thread. """
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+    server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = _registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def worker_metrics(worker):
+    """ Metrics of a worker of this process, to record into from that worker only. """
+    if _registry is None:
+        return _nullWorker
+    return _registry.worker(worker)
+
+
+def set_step(step: str):
+    # Label of the step currently running, to line the metrics up with the step logs
+    if _registry is not None:
+        _registry.step = step
@@ -0,0 +1,522 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import aiohttp
+from array import array
+import HttpClientPool
+import ArrivalScheduler
+import CoherenceCheck
+import EventStream
+import KeyDistributions
+import LatencyHistogram
+import LiveMetrics
+import PayloadTemplates
+
+"""	Asyncio load engine for the UpdatePriceDiscount_* scripts.
+    Each simulated client is a coroutine instead of an OS thread, so a single process can keep thousands of
+    concurrent clients against the ThesisFrontend service without the generator becoming the bottleneck.
+    The clients are split across a small number of event loops, each one running on its own thread.
+    To go beyond what one interpreter can generate, ProcessPoolEngine spreads the event loops over several processes
+    and merges their results at the end of each step.
+"""
+thesisFrontendPort = HttpClientPool.thesisFrontendPort
+numEventLoops = 4 # Number of event loops (threads) sharing the simulated clients
+processStartDelay = 0.5 # Seconds given to the worker processes to receive a step before it starts
+logPollSeconds = 1 # Seconds between two checks that the worker processes are still alive, while waiting for their logs
+
+VIRTUAL_USERS = "virtual_users"
+ARRIVAL_RATE = "arrival_rate"
+# Prices written by the update operations
+RANDOM_PRICES = "random" # A random price for every write
+PRICE_SEQUENCES = "sequences" # An increasing price sequence per event loop, as each thread of the Throughput script writes
+workerLoggerName = "LoadEngine.worker"
+
+
+def new_step_results() -> dict:
+    # Results of one test step, each worker (event loop) records into its own results and they are merged at the end.
+    # serviceTime holds the service times, measured from the actual send. responseTime holds the response times,
+    # measured from the intended start of each operation so that the queueing delay hidden by stalls is not lost.
+    # coherence counts the coherent reads and anomalies as the baskets are read
+    return {
+        "serviceTime": LatencyHistogram.LatencyHistogram(),
+        "responseTime": LatencyHistogram.LatencyHistogram(),
+        "successCount": 0,
+        "readOperationsCount": 0,
+        "writeOperationsCount": 0,
+        "connections": {},
+        "scheduleLag": array('q'),
+        "coherence": CoherenceCheck.CoherenceCounter(),
+    }
+
+
+def merge_step_results(resultsList: list[dict]) -> dict:
+    # Merge the results of every event loop into a single step result
+    merged = new_step_results()
+    for results in resultsList:
+        merged["serviceTime"].merge(results["serviceTime"])
+        merged["responseTime"].merge(results["responseTime"])
+        merged["successCount"] += results["successCount"]
+        merged["readOperationsCount"] += results["readOperationsCount"]
+        merged["writeOperationsCount"] += results["writeOperationsCount"]
+        HttpClientPool.merge_counters(merged["connections"], results["connections"])
+        merged["scheduleLag"].extend(results["scheduleLag"])
+        merged["coherence"].merge(results["coherence"])
+    return merged
+
+
+class PriceSequence:
+    """ Prices and discounts written by one worker: its first write sets the price 10000000 * (index + 1), and each
+        next write raises the price by 10 and the discount by 1, so every price written in a test is unique.
+    """
+
+    def __init__(self, index: int):
+        self.price = 10000000 * (index + 1)
+        self.discount = self.price // 10
+        self.started = False
+
+    def next(self) -> tuple:
+        if self.started:
+            self.price += 10
+            self.discount += 1
+        self.started = True
+        return self.price, self.discount
+
+
+def price_sequence(write_prices: str, index: int) -> PriceSequence:
+    # Price sequence of the worker index, or None to write random prices
+    if write_prices == PRICE_SEQUENCES:
+        return PriceSequence(index)
+    if write_prices != RANDOM_PRICES:
+        raise ValueError("Unknown write prices: " + write_prices)
+    return None
+
+
+def record_operation(results: dict, worker: str, operation: str, timeTaken: int, responseTime: int, success: bool):
+    # Each worker only touches its own results and live metrics, so no locking is needed
+    results["serviceTime"].record(timeTaken)
+    results["responseTime"].record(responseTime)
+    LiveMetrics.worker_metrics(worker).operation_completed(operation, responseTime)
+
+    if success:
+        results["successCount"] += 1
+
+
+async def readBasket(session: aiohttp.ClientSession, results: dict, worker: str, logger: logging.Logger, events: EventStream.EventWriter, key: int, intendedStart: int):
+    basketID = "basket" + str(key)
+    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basketID
+
+    # Measure time taken to send request with nano seconds precision
+    start = time.perf_counter_ns()
+
+    success = False
+    while not success:
+        attemptStart = time.perf_counter_ns()
+        try:
+            # Send request
+            async with session.get(address) as response:
+                status = response.status
+                if status == 200:
+                    basket = await response.json(content_type=None)
+                    success = True
+                else:
+                    # Record the failed attempt, the operation is retried
+                    events.emit(EventStream.READ, worker, key, intendedStart, attemptStart, time.perf_counter_ns() - attemptStart, status, 0, 0)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            events.emit(EventStream.READ, worker, key, intendedStart, attemptStart, time.perf_counter_ns() - attemptStart, EventStream.NO_RESPONSE, 0, 0)
+            # Sleep for 10ms
+            logger.info("Error reading basket. Retrying in 10ms")
+            await asyncio.sleep(0.01)
+
+    # Stop timer and calculate the service time (from the actual send) and response time (from the intended start)
+    end = time.perf_counter_ns()
+    timeTaken = end - start
+    responseTime = end - intendedStart
+
+    record_operation(results, worker, LiveMetrics.READ, timeTaken, responseTime, success)
+
+    # Extract the basket item price and discount from the basket items
+    basketItems = basket["items"]
+    basketItemPrice = basketItems[0]["unitPrice"]
+    basketItemDiscount = basketItems[0]["discount"]
+
+    # Check the coherence of the price and discount read, and record the operation in the event stream
+    coherent = results["coherence"].check(basketItemPrice, basketItemDiscount, worker, basketID)
+    LiveMetrics.worker_metrics(worker).read_checked(coherent)
+    events.emit(EventStream.READ, worker, key, intendedStart, start, timeTaken, status, basketItemPrice, basketItemDiscount)
+
+
+async def updatePriceAndDiscount(session: aiohttp.ClientSession, results: dict, worker: str, logger: logging.Logger, events: EventStream.EventWriter, key: int, template: PayloadTemplates.PayloadTemplate, price: int, discount: int, intendedStart: int):
+    # Fill the new price and discount in the pre-encoded payload of the catalog row
+    payload = template.render(price=price, discount=discount)
+
+    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/updatepricediscount'
+
+    # Measure time taken to send request with nano seconds precision
+    start = time.perf_counter_ns()
+
+    success = False
+    while not success:
+        attemptStart = time.perf_counter_ns()
+        try:
+            # Send request
+            async with session.put(address, data=payload, headers=PayloadTemplates.jsonHeaders) as response:
+                status = response.status
+                await response.read()
+                if status == 200:
+                    success = True
+                else:
+                    # Record the failed attempt, the operation is retried
+                    events.emit(EventStream.WRITE, worker, key, intendedStart, attemptStart, time.perf_counter_ns() - attemptStart, status, price, discount)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            events.emit(EventStream.WRITE, worker, key, intendedStart, attemptStart, time.perf_counter_ns() - attemptStart, EventStream.NO_RESPONSE, price, discount)
+            # Sleep for 10ms
+            logger.info("Error updating price and discount. Retrying in 10ms")
+            await asyncio.sleep(0.01)
+
+    # Stop timer and calculate the service time (from the actual send) and response time (from the intended start)
+    end = time.perf_counter_ns()
+    timeTaken = end - start
+    responseTime = end - intendedStart
+
+    record_operation(results, worker, LiveMetrics.WRITE, timeTaken, responseTime, success)
+    events.emit(EventStream.WRITE, worker, key, intendedStart, start, timeTaken, status, price, discount)
+
+
+async def writeOperations(session: aiohttp.ClientSession, results: dict, worker: str, logger: logging.Logger, events: EventStream.EventWriter, key: int, template: PayloadTemplates.PayloadTemplate, prices: PriceSequence, intendedStart: int):
+    if prices is not None:
+        # Next price of the sequence of this worker
+        price, discount = prices.next()
+    else:
+        # Get a random price between 1000 and 1000000, divisible by 10, and the matching 10% discount
+        price = random.randint(100, 100000) * 10
+        discount = price // 10
+    await updatePriceAndDiscount(session, results, worker, logger, events, key, template, price, discount, intendedStart)
+
+
+async def execute_operation(session: aiohttp.ClientSession, results: dict, worker: str, logger: logging.Logger, events: EventStream.EventWriter, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, prices: PriceSequence, intendedStart: int):
+    # intendedStart is the time.perf_counter_ns() at which the operation should have started
+    # Pick the catalog row from the key distribution, each row with the payload template of its catalog and discount items
+    index = keys.next_key()
+    LiveMetrics.worker_metrics(worker).operation_started()
+    # Pick a read or write operation based on the read/write ratio
+    if random.choice(read_write_list) == 0:
+        results["readOperationsCount"] += 1
+        await readBasket(session, results, worker, logger, events, index, intendedStart)
+    else:
+        results["writeOperationsCount"] += 1
+        await writeOperations(session, results, worker, logger, events, index, templates[index], prices, intendedStart)
+
+
+async def virtual_user(session: aiohttp.ClientSession, results: dict, worker: str, logger: logging.Logger, events: EventStream.EventWriter, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, prices: PriceSequence, end_test_time: float):
+    # Closed loop client: issue the next operation as soon as the previous one is answered, so it is never late
+    while time.time() < end_test_time:
+        await execute_operation(session, results, worker, logger, events, templates, keys, read_write_list, prices, time.perf_counter_ns())
+
+
+async def run_virtual_users_loop(numClients: int, worker: str, logger: logging.Logger, events: EventStream.EventWriter, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, prices: PriceSequence, end_test_time: float) -> dict:
+    results = new_step_results()
+    pool = HttpClientPool.AsyncClientPool()
+    session = pool.session(thesisFrontendPort)
+    try:
+        clients = [virtual_user(session, results, worker, logger, events, templates, keys, read_write_list, prices, end_test_time) for _ in range(numClients)]
+        await asyncio.gather(*clients)
+    finally:
+        await pool.close()
+    results["connections"] = pool.counters
+    return results
+
+
+async def run_arrival_rate_loop(scheduler: ArrivalScheduler.ArrivalScheduler, worker: str, logger: logging.Logger, events: EventStream.EventWriter, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, prices: PriceSequence, end_deadline: float) -> dict:
+    # Open loop client: start a new operation at every scheduler deadline, whether or not the previous ones finished
+    results = new_step_results()
+    metrics = LiveMetrics.worker_metrics(worker)
+    pool = HttpClientPool.AsyncClientPool()
+    session = pool.session(thesisFrontendPort)
+    try:
+        operations = set()
+        while scheduler.next_deadline < end_deadline:
+            intendedStart = await scheduler.wait_async()
+            metrics.schedule_lag(scheduler.lags[-1])
+            operation = asyncio.create_task(execute_operation(session, results, worker, logger, events, templates, keys, read_write_list, prices, int(intendedStart * 1000000000)))
+            operations.add(operation)
+            operation.add_done_callback(operations.discard)
+        await asyncio.gather(*operations)
+    finally:
+        await pool.close()
+    results["connections"] = pool.counters
+    results["scheduleLag"] = scheduler.lags
+    return results
+
+
+def run_on_event_loops(coroutine_factories: list) -> dict:
+    # Run each coroutine on its own event loop thread and merge the results once all of them finish
+    resultsList = [None] * len(coroutine_factories)
+
+    def run_loop(index: int):
+        resultsList[index] = asyncio.run(coroutine_factories[index]())
+
+    threads = [threading.Thread(target=run_loop, args=(index,)) for index in range(len(coroutine_factories))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return merge_step_results(resultsList)
+
+
+def run_virtual_users(numClients: int, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, logger: logging.Logger, numLoops: int = numEventLoops, key_distribution: str = KeyDistributions.UNIFORM, events_path: str = None, write_prices: str = RANDOM_PRICES, sequence_offset: int = 0) -> dict:
+    """ Simulate numClients closed loop clients for secondsToRun seconds, spread over numLoops event loops.
+        key_distribution is the KeyDistributions spec of the catalog rows the operations touch.
+        Every operation is recorded in the event stream events_path (see EventStream.py), if given.
+        write_prices is RANDOM_PRICES or PRICE_SEQUENCES, the event loops then use the price sequences sequence_offset,
+        sequence_offset + 1, ...
+    """
+    templates = PayloadTemplates.update_price_discount_templates(catalogItems, discountItems)
+    keys = KeyDistributions.KeySelector(len(templates), key_distribution)
+    events = EventStream.open_event_writer(events_path)
+    end_test_time = time.time() + secondsToRun
+    numLoops = max(1, min(numLoops, numClients))
+    factories = []
+    for loop_index in range(numLoops):
+        # Give each loop an even share of the clients
+        loopClients = numClients // numLoops + (1 if loop_index < numClients % numLoops else 0)
+        prices = price_sequence(write_prices, sequence_offset + loop_index)
+        factories.append(lambda loopClients=loopClients, worker=f"loop{loop_index}", prices=prices: run_virtual_users_loop(loopClients, worker, logger, events, templates, keys, read_write_list, prices, end_test_time))
+    try:
+        return run_on_event_loops(factories)
+    finally:
+        # Write the events still buffered once every operation of the step finished
+        events.close()
+
+
+def run_arrival_rate(throughput: float, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, logger: logging.Logger, numLoops: int = numEventLoops, arrival_process: str = ArrivalScheduler.CONSTANT, phase: float = 0, key_distribution: str = KeyDistributions.UNIFORM, events_path: str = None, write_prices: str = RANDOM_PRICES, sequence_offset: int = 0) -> dict:
+    """ Start throughput operations per second for secondsToRun seconds, spread over numLoops event loops.
+        phase delays the first send by that many seconds, used to interleave several generators.
+        write_prices and sequence_offset are the same as for run_virtual_users().
+    """
+    templates = PayloadTemplates.update_price_discount_templates(catalogItems, discountItems)
+    keys = KeyDistributions.KeySelector(len(templates), key_distribution)
+    events = EventStream.open_event_writer(events_path)
+    start_time = time.perf_counter()
+    end_deadline = start_time + secondsToRun
+    factories = []
+    for loop_index in range(numLoops):
+        # Every loop schedules its share of the throughput, offset so the deadlines of the loops interleave evenly
+        scheduler = ArrivalScheduler.ArrivalScheduler(throughput / numLoops, arrival_process, start_time + phase + loop_index / throughput)
+        prices = price_sequence(write_prices, sequence_offset + loop_index)
+        factories.append(lambda scheduler=scheduler, worker=f"loop{loop_index}", prices=prices: run_arrival_rate_loop(scheduler, worker, logger, events, templates, keys, read_write_list, prices, end_deadline))
+    try:
+        return run_on_event_loops(factories)
+    finally:
+        # Write the events still buffered once every operation of the step finished
+        events.close()
+
+
+def log_step_summary(logger: logging.Logger, results: dict, secondsToRun: int, functionalities_from_successes: bool = False):
+    # Log the per-test summary of a step, in the same format used by the UpdatePriceDiscount_* scripts.
+    # The functionalities per second are the reads and writes per second, or the successful operations per second
+    # with functionalities_from_successes, as the Throughput script computes them
+    serviceTime = results["serviceTime"]
+    responseTime = results["responseTime"]
+    readOperationsCount = results["readOperationsCount"]
+    writeOperationsCount = results["writeOperationsCount"]
+
+    # Calculate total time taken
+    total_active_time_taken = serviceTime.total
+
+    # Log total times
+    logger.info("Total test time: " + str(secondsToRun) + " seconds")
+    logger.info("Total active time taken: " + str(total_active_time_taken / 1000000000) + " seconds")
+
+    # Calculate average time taken by each request
+    total_requests = serviceTime.total_count
+    averageTimeTaken = serviceTime.mean()
+
+    # Log average time taken by each request
+    logger.info("Average time/req: " + str(averageTimeTaken / 1000000) + " milliseconds")
+
+    # Log the average response time, measured from the intended start of each request (corrected for coordinated omission)
+    logger.info("Average response time/req (from intended start): " + str(responseTime.mean() / 1000000) + " milliseconds")
+
+    # Log the latency percentiles
+    LatencyHistogram.log_percentiles(logger, "Service time", serviceTime)
+    LatencyHistogram.log_percentiles(logger, "Response time", responseTime)
+    logger.info("Total number of requests: " + str(total_requests))
+
+    # Log the calculated throughput
+    answered_requests_throughput = total_requests / (secondsToRun)
+    logger.info("Answered Requests throughput: " + str(answered_requests_throughput) + " req/sec.")
+
+    # Log the number of each type of request
+    logger.info("Number of read operations: " + str(readOperationsCount) + ", Number of write operations: " + str(writeOperationsCount))
+
+    # Calculate success rate and total number of operations
+    total_success_count = results["successCount"]
+    successRate = total_success_count / total_requests if total_requests > 0 else 0
+
+    # Log success rate and total number of operations
+    logger.info("Success rate: " + str(successRate * 100) + "% - (" + str(total_success_count) + "/" + str(total_requests) + ")")
+
+    # Log the average functionalities per seconds
+    functionalities = total_success_count if functionalities_from_successes else readOperationsCount + writeOperationsCount
+    logger.info("Functionalities per second: " + str(functionalities / (secondsToRun)))
+
+    # Log how many connections were opened and reused during the step
+    HttpClientPool.log_connection_counters(logger, results["connections"])
+
+    # Log how far behind schedule the operations were sent, for open loop steps
+    if len(results["scheduleLag"]) > 0:
+        ArrivalScheduler.log_schedule_lag(logger, results["scheduleLag"])
+
+
+def save_step_histograms(results: dict, log_file: str):
+    # Save the latency histograms of a step next to its log file, so they can be merged across runs later
+    LatencyHistogram.save_histograms(os.path.splitext(log_file)[0] + ".hist", {"serviceTime": results["serviceTime"], "responseTime": results["responseTime"]})
+
+
+_workerLogQueue = None
+
+
+def raise_open_files_limit():
+    # Each simulated client keeps a connection (a file descriptor) open, and the default soft limit of Linux (1024)
+    # would fail the steps of more than about a thousand clients: raise it to the hard limit. No limit on Windows
+    if os.name != "posix":
+        return
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and (hard == resource.RLIM_INFINITY or soft < hard):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _init_worker_process(log_queue, metrics_port: int, worker_count):
+    # Send the log records of the worker process to the controlling process, which writes them to the step log
+    global _workerLogQueue
+    _workerLogQueue = log_queue
+    logger = logging.getLogger(workerLoggerName)
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    # Serve the live metrics of this worker process on the port after the ones of the processes started before it
+    if metrics_port:
+        with worker_count.get_lock():
+            worker_count.value += 1
+            index = worker_count.value
+        LiveMetrics.start_metrics_server(metrics_port + index)
+
+
+def wait_until(start_at: float):
+    # Sleep until the time.time() start_at, if it is in the future
+    if start_at is not None:
+        delay = start_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _warm_up_worker_process(seconds: float):
+    # Keep the worker busy for a moment, so every worker of the pool gets started
+    time.sleep(seconds)
+
+
+def _run_worker_process(mode: str, target: float, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, start_at: float, numLoops: int, arrival_process: str, phase: float, key_distribution: str, events_path: str, write_prices: str, sequence_offset: int) -> dict:
+    logger = logging.getLogger(workerLoggerName)
+    try:
+        # Wait for the common start time of the step, so all processes load the service together
+        wait_until(start_at)
+        if mode == VIRTUAL_USERS:
+            return run_virtual_users(target, catalogItems, discountItems, read_write_list, secondsToRun, logger, numLoops, key_distribution, events_path, write_prices, sequence_offset)
+        return run_arrival_rate(target, catalogItems, discountItems, read_write_list, secondsToRun, logger, numLoops, arrival_process, phase, key_distribution, events_path, write_prices, sequence_offset)
+    finally:
+        # Mark the end of the step in the log queue, after every record of this worker
+        _workerLogQueue.put(None)
+
+
+class ProcessPoolEngine:
+    """ Runs the load engine on numProcesses worker processes, each with its own event loops and its share of the load.
+        The worker processes are kept for the whole test, and their log records are written to the step logger by the
+        controlling process, so the step log is the same as with one process. Each worker process writes its own event
+        file, EventStream.step_event_files() lists them for the analysis.
+        With metrics_port set, worker process i serves its live metrics (see LiveMetrics.py) on metrics_port + i, i
+        from 1 to numProcesses, the controlling process keeping metrics_port.
+        With numProcesses = 1 the steps run in the calling process.
+        A worker process that dies during a step (crashed or killed) fails the step, the pool can not be used anymore.
+    """
+
+    def __init__(self, numProcesses: int = 1, numLoops: int = numEventLoops, metrics_port: int = None):
+        self.numProcesses = numProcesses
+        self.numLoops = numLoops
+        self.executor = None
+        # Before starting the worker processes, which inherit the limit
+        raise_open_files_limit()
+        if numProcesses > 1:
+            # spawn behaves the same on Linux and Windows, and does not fork the threads of the controlling process
+            context = multiprocessing.get_context("spawn")
+            self.log_queue = context.Queue()
+            worker_count = context.Value('i', 0)
+            self.executor = ProcessPoolExecutor(max_workers=numProcesses, mp_context=context, initializer=_init_worker_process, initargs=(self.log_queue, metrics_port, worker_count))
+            list(self.executor.map(_warm_up_worker_process, [0.2] * numProcesses))
+
+    def _forward_step_logs(self, logger: logging.Logger, futures: list):
+        # Write the records of the worker processes to the step logger, until every worker marked the end of the step.
+        # A worker killed during the step never marks its end: its future then fails (the pool is broken), stop waiting
+        finished = 0
+        while finished < len(futures):
+            try:
+                record = self.log_queue.get(timeout=logPollSeconds)
+            except queue.Empty:
+                if any(future.done() and future.exception() is not None for future in futures):
+                    return
+                continue
+            if record is None:
+                finished += 1
+            else:
+                logger.handle(record)
+
+    def _run_step(self, mode: str, shares: list, phases: list, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, logger: logging.Logger, arrival_process: str, start_at: float, key_distribution: str, events_path: str, write_prices: str) -> dict:
+        if start_at is None:
+            start_at = time.time() + processStartDelay
+        # Each worker process writes its own event file, next to the step event file
+        eventPaths = [None if events_path is None else EventStream.worker_event_stream_path(events_path, index) for index in range(len(shares))]
+        # Each event loop of each worker process writes its own price sequence
+        futures = [self.executor.submit(_run_worker_process, mode, share, catalogItems, discountItems, read_write_list, secondsToRun, start_at, self.numLoops, arrival_process, phase, key_distribution, eventPath, write_prices, index * self.numLoops)
+                   for index, (share, phase, eventPath) in enumerate(zip(shares, phases, eventPaths))]
+        self._forward_step_logs(logger, futures)
+        resultsList = []
+        for future in futures:
+            try:
+                resultsList.append(future.result())
+            except BrokenProcessPool as error:
+                raise RuntimeError("A load generator process died during the step") from error
+        return merge_step_results(resultsList)
+
+    def run_virtual_users(self, numClients: int, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, logger: logging.Logger, start_at: float = None, key_distribution: str = KeyDistributions.UNIFORM, events_path: str = None, write_prices: str = RANDOM_PRICES) -> dict:
+        """ Same as run_virtual_users(), with the clients split evenly over the worker processes.
+            start_at is the time.time() at which the step starts, by default shortly after the call.
+        """
+        if self.executor is None:
+            wait_until(start_at)
+            return run_virtual_users(numClients, catalogItems, discountItems, read_write_list, secondsToRun, logger, self.numLoops, key_distribution, events_path, write_prices)
+        shares = [numClients // self.numProcesses + (1 if index < numClients % self.numProcesses else 0) for index in range(self.numProcesses)]
+        shares = [share for share in shares if share > 0]
+        return self._run_step(VIRTUAL_USERS, shares, [0] * len(shares), catalogItems, discountItems, read_write_list, secondsToRun, logger, ArrivalScheduler.CONSTANT, start_at, key_distribution, events_path, write_prices)
+
+    def run_arrival_rate(self, throughput: float, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, secondsToRun: int, logger: logging.Logger, arrival_process: str = ArrivalScheduler.CONSTANT, start_at: float = None, phase: float = 0, key_distribution: str = KeyDistributions.UNIFORM, events_path: str = None, write_prices: str = RANDOM_PRICES) -> dict:
+        """ Same as run_arrival_rate(), with each worker process pacing an equal share of the throughput. """
+        if self.executor is None:
+            wait_until(start_at)
+            return run_arrival_rate(throughput, catalogItems, discountItems, read_write_list, secondsToRun, logger, self.numLoops, arrival_process, phase, key_distribution, events_path, write_prices)
+        shares = [throughput / self.numProcesses] * self.numProcesses
+        # Interleave the send deadlines of the processes, so together they follow the schedule of a single generator
+        phases = [phase + index / throughput for index in range(self.numProcesses)]
+        return self._run_step(ARRIVAL_RATE, shares, phases, catalogItems, discountItems, read_write_list, secondsToRun, logger, arrival_process, start_at, key_distribution, events_path, write_prices)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
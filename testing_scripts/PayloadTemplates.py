@@ -0,0 +1,47 @@
+import json
+import re
+
+"""	Pre-encoded JSON payloads for the write operations of the load generators.
+    A payload is encoded once per catalog row with placeholders for the fields that change on every request, and split
+    into byte chunks at the placeholders. Rendering a request body only joins the chunks with the new values, instead
+    of deep copying the catalog and discount items and encoding the whole payload to JSON again.
+"""
+jsonHeaders = {"Content-Type": "application/json"}
+
+_placeholderPattern = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+
+def placeholder(name: str) -> str:
+    # Value to put in a payload where a field is filled in on every request
+    return "\x00" + name + "\x00"
+
+
+class PayloadTemplate:
+
+    def __init__(self, payload: dict):
+        encoded = json.dumps(payload, separators=(",", ":"))
+        pieces = _placeholderPattern.split(encoded)
+        # pieces alternates the constant chunks and the placeholder names: chunk, name, chunk, ..., name, chunk
+        self.chunks = [piece.encode() for piece in pieces[0::2]]
+        self.fields = pieces[1::2]
+
+    def render(self, **values) -> bytes:
+        """ Return the encoded payload with each placeholder replaced by the (numeric) value of the same name. """
+        body = [self.chunks[0]]
+        for field, chunk in zip(self.fields, self.chunks[1:]):
+            body.append(str(values[field]).encode())
+            body.append(chunk)
+        return b"".join(body)
+
+
+def update_price_discount_template(catalogItem: dict, discountItem: dict) -> PayloadTemplate:
+    # Payload of /api/v1/frontend/updatepricediscount, with the price and discount filled in per request
+    return PayloadTemplate({
+        "CatalogItem": {**catalogItem, "price": placeholder("price")},
+        "DiscountItem": {**discountItem, "discountValue": placeholder("discount")},
+    })
+
+
+def update_price_discount_templates(catalogItems: list[dict], discountItems: list[dict]) -> list[PayloadTemplate]:
+    # One template per catalog row, in the same order as the items
+    return [update_price_discount_template(catalogItem, discountItem) for catalogItem, discountItem in zip(catalogItems, discountItems)]
@@ -4,7 +4,7 @@ import random
 import re
 import string
 import time
-import requests
+import HttpClientPool
 import threading
 import logging
 import os
@@ -48,7 +48,7 @@ def readBasket(basketID: str, clientID: str):
     iterations = 0
     while not success and iterations < 10:
         # Send request
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
         if(response.status_code == 200):
             # Extract the basket items from the response
             basketItems = response.json()["items"]
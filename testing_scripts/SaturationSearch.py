@@ -0,0 +1,119 @@
+import math
+
+"""	Saturation point search for the load generators.
+    Instead of stepping the load linearly up to a maximum, the search grows the load geometrically until a probe
+    breaks the service level objective (coarse phase), then bisects between the last passing and the first failing
+    load (fine phase). A probe passes when its p(95) response time is within the SLO, its anomaly rate is under the
+    ceiling and, for open loop probes, the service answered (nearly) the whole target rate.
+    Probes with fewer steady-state samples than required are repeated with a longer duration, so a pass or fail is
+    never decided on a handful of requests.
+"""
+defaultGrowthFactor = 2.0 # Load multiplier of the coarse phase
+defaultMinSamples = 2000 # Minimum number of measured operations per probe
+defaultMaxProbeSeconds = 120 # Longest duration a probe is extended to, to collect enough samples
+answeredRatioFloor = 0.95 # Fraction of the target rate that must be answered for an open loop probe to pass
+
+
+def evaluate_probe(target: float, results: dict, coherence: dict, secondsToRun: float, p95_slo_ms: float, max_anomaly_rate: float, open_loop: bool) -> dict:
+    """ Summarize a probe from its step results and coherence counts, and decide whether the load is sustainable. """
+    samples = results["serviceTime"].total_count
+    p95 = results["responseTime"].value_at_percentile(95) / 1000000
+    reads = coherence["OK"] + coherence["anomalies"]
+    anomaly_rate = coherence["anomalies"] / reads if reads > 0 else 0
+    answered_rate = samples / secondsToRun
+
+    reasons = []
+    if p95 > p95_slo_ms:
+        reasons.append("p(95) " + str(p95) + " ms over the SLO")
+    if anomaly_rate > max_anomaly_rate:
+        reasons.append("anomaly rate " + str(anomaly_rate * 100) + "% over the ceiling")
+    if open_loop and answered_rate < target * answeredRatioFloor:
+        reasons.append("answered " + str(answered_rate) + " req/sec. of " + str(target))
+
+    return {
+        "target": target,
+        "seconds": secondsToRun,
+        "samples": samples,
+        "p95": p95,
+        "anomalyRate": anomaly_rate,
+        "answeredRate": answered_rate,
+        "passed": len(reasons) == 0,
+        "reason": ", ".join(reasons),
+    }
+
+
+class SaturationSearch:
+    """ Coarse-to-fine search of the highest load that passes run_probe.
+        run_probe(target, secondsToRun) runs one probe and returns the dict built by evaluate_probe.
+    """
+
+    def __init__(self, run_probe, start: float, maximum: float, resolution: float, secondsToRun: float, integer: bool = False,
+                 growth_factor: float = defaultGrowthFactor, min_samples: int = defaultMinSamples, max_probe_seconds: float = defaultMaxProbeSeconds):
+        self.run_probe = run_probe
+        self.start = start
+        self.maximum = maximum
+        self.resolution = resolution
+        self.secondsToRun = secondsToRun
+        self.integer = integer
+        self.growth_factor = growth_factor
+        self.min_samples = min_samples
+        self.max_probe_seconds = max_probe_seconds
+        self.probes = []
+
+    def _round(self, target: float) -> float:
+        return int(round(target)) if self.integer else target
+
+    def probe(self, target: float) -> dict:
+        # Run a probe, extending it until it measured min_samples operations or reached max_probe_seconds
+        seconds = self.secondsToRun
+        while True:
+            result = self.run_probe(target, seconds)
+            if result["samples"] >= self.min_samples or seconds >= self.max_probe_seconds:
+                break
+            # Scale the duration to the number of samples still missing, with some margin
+            scale = self.min_samples / max(result["samples"], 1) * 1.2
+            seconds = min(self.max_probe_seconds, math.ceil(seconds * scale))
+        self.probes.append(result)
+        return result
+
+    def run(self) -> dict:
+        """ Run the search, and return the knee (highest passing load, None if even start fails) and every probe. """
+        passing = None
+        failing = None
+
+        # Coarse phase: grow the load until a probe fails or the maximum is reached
+        target = self._round(self.start)
+        while True:
+            if self.probe(target)["passed"]:
+                passing = target
+                if target >= self.maximum:
+                    break
+                target = self._round(min(self.maximum, max(target * self.growth_factor, target + self.resolution)))
+            else:
+                failing = target
+                break
+
+        # Fine phase: bisect between the last passing and the first failing load
+        while passing is not None and failing is not None and failing - passing > self.resolution:
+            target = self._round((passing + failing) / 2)
+            if target <= passing or target >= failing:
+                break
+            if self.probe(target)["passed"]:
+                passing = target
+            else:
+                failing = target
+
+        return {"knee": passing, "firstFailing": failing, "probes": sorted(self.probes, key=lambda probe: probe["target"])}
+
+
+def log_search_report(logger, report: dict, unit: str):
+    # Log every sampled point in load order, then the knee
+    logger.info("-------------SATURATION SEARCH REPORT-------------")
+    for probe in report["probes"]:
+        logger.info("Target: " + str(probe["target"]) + " " + unit + " - " + ("PASS" if probe["passed"] else "FAIL (" + probe["reason"] + ")") +
+                    ". p(95): " + str(probe["p95"]) + " ms, Anomaly rate: " + str(probe["anomalyRate"] * 100) + "%, Answered: " + str(probe["answeredRate"]) +
+                    " req/sec., Samples: " + str(probe["samples"]) + " in " + str(probe["seconds"]) + " seconds")
+    if report["knee"] is None:
+        logger.info("Knee: not found, the first probe already failed")
+    else:
+        logger.info("Knee: " + str(report["knee"]) + " " + unit + (" (first failing: " + str(report["firstFailing"]) + " " + unit + ")" if report["firstFailing"] is not None else " (maximum reached)"))
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import EventStream
+
+"""	Per-second time series of a test step, saved next to the step log as a compressed .npz file of columns.
+    The step summary only holds averages over the whole step, which hide throughput oscillations, pauses of the
+    services (garbage collection) and warm-up transients. The series is computed from the event stream of the step
+    once it ends: for every wall clock second from the first to the last completion, and for each operation type,
+    the completions, response time percentiles (from the intended start), errors and, for the reads, anomalies.
+    Completions are the operations that ended with status 200, errors the failed attempts of the operations (each
+    retried attempt is an event of its own, see EventStream.py), counted in the second the attempt ended.
+    Seconds without any completion are kept, with zero completions, so stalls show up in the series.
+
+    Columns, one value per second: "second" (time.time() of the start of the second), and for op in read / write:
+    "<op>_completions", "<op>_errors", "<op>_p50", "<op>_p95", "<op>_p99", "<op>_max" (response times in
+    nanoseconds, 0 for a second without completions), plus "read_anomalies".
+"""
+timeSeriesExtension = ".timeseries.npz"
+quantiles = [50, 95, 99]
+
+# Binary event records, as packed by EventStream.eventRecord
+eventDtype = np.dtype([("op", "<u1"), ("status", "<u2"), ("intendedStart", "<i8"), ("start", "<i8"), ("duration", "<i8"),
+                       ("price", "<f8"), ("discount", "<f8"), ("key", "<i4"), ("worker", "S16")])
+
+
+def time_series_path(log_file: str) -> str:
+    # Time series file of a step, next to its log file
+    return os.path.splitext(log_file)[0] + timeSeriesExtension
+
+
+def _load_binary_events(path: str) -> np.ndarray:
+    # Read the records straight into a structured array, with the times converted to time.time_ns() values
+    with open(path, 'rb') as file:
+        magic, version, wallClock, perfCounter = EventStream.headerRecord.unpack(file.read(EventStream.headerRecord.size))
+    if magic != EventStream.streamMagic or version != EventStream.streamVersion:
+        raise ValueError("Not an event stream: " + path)
+    # A stream cut short can end in a partial record, which is dropped
+    count = (os.path.getsize(path) - EventStream.headerRecord.size) // eventDtype.itemsize
+    events = np.fromfile(path, dtype=eventDtype, count=count, offset=EventStream.headerRecord.size)
+    events["intendedStart"] += wallClock - perfCounter
+    events["start"] += wallClock - perfCounter
+    return events
+
+
+def _load_ndjson_events(path: str) -> np.ndarray:
+    events = list(EventStream.read_events(path))
+    array = np.zeros(len(events), dtype=eventDtype)
+    for index, event in enumerate(events):
+        array[index] = (EventStream.operationNames.index(event["op"]), event["status"], event["intendedStart"], event["start"], event["duration"],
+                        event["price"], event["discount"], event["key"], event["worker"].encode()[:16])
+    return array
+
+
+def load_events(files: list) -> np.ndarray:
+    """ Load the events of several event files (the worker files of a step) in one structured array. """
+    arrays = [_load_ndjson_events(path) if path.endswith(EventStream.ndjsonExtension) else _load_binary_events(path) for path in files]
+    return np.concatenate(arrays) if arrays else np.zeros(0, dtype=eventDtype)
+
+
+def _second_percentiles(seconds: np.ndarray, values: np.ndarray, numSeconds: int) -> dict:
+    # Percentiles of the values of each second, from one sort of the values grouped by second
+    if len(values) == 0:
+        return {column: np.zeros(numSeconds, dtype=np.int64) for column in ["p" + str(quantile) for quantile in quantiles] + ["max"]}
+    order = np.lexsort((values, seconds))
+    sortedValues = values[order]
+    counts = np.bincount(seconds, minlength=numSeconds)
+    starts = np.cumsum(counts) - counts
+    hasValues = counts > 0
+    columns = {}
+    for quantile in quantiles:
+        # Nearest rank: the smallest value with at least quantile% of the values of the second at or below it
+        ranks = np.maximum(np.ceil(counts * quantile / 100).astype(np.int64), 1) - 1
+        columns["p" + str(quantile)] = np.where(hasValues, sortedValues[np.minimum(starts + ranks, len(sortedValues) - 1)], 0)
+    columns["max"] = np.where(hasValues, sortedValues[np.maximum(starts + counts - 1, 0)], 0)
+    return columns
+
+
+def step_time_series(events: np.ndarray) -> dict:
+    """ Per-second columns of the events of a step (see the module description). """
+    end = events["start"] + events["duration"]
+    if len(events) == 0:
+        firstSecond, numSeconds = 0, 0
+    else:
+        firstSecond = int(end.min() // 1000000000)
+        numSeconds = int(end.max() // 1000000000) - firstSecond + 1
+    # Operations are counted in the second they completed
+    seconds = (end // 1000000000 - firstSecond).astype(np.int64)
+    responseTime = end - events["intendedStart"]
+    series = {"second": np.arange(firstSecond, firstSecond + numSeconds, dtype=np.int64)}
+    completed = events["status"] == 200
+    for operation, name in enumerate(EventStream.operationNames):
+        selected = (events["op"] == operation) & completed
+        operationSeconds = seconds[selected]
+        series[name + "_completions"] = np.bincount(operationSeconds, minlength=numSeconds).astype(np.int64)
+        series[name + "_errors"] = np.bincount(seconds[(events["op"] == operation) & ~completed], minlength=numSeconds).astype(np.int64)
+        for column, values in _second_percentiles(operationSeconds, responseTime[selected], numSeconds).items():
+            series[name + "_" + column] = values.astype(np.int64)
+    # Same comparison as CoherenceCheck.is_coherent
+    reads = (events["op"] == EventStream.READ) & completed
+    anomalous = reads & (events["discount"] != events["price"] * 0.1)
+    series["read_anomalies"] = np.bincount(seconds[anomalous], minlength=numSeconds).astype(np.int64)
+    return series
+
+
+def save_time_series(path: str, series: dict):
+    np.savez_compressed(path, **series)
+
+
+def load_time_series(path: str) -> dict:
+    with np.load(path) as data:
+        return {column: data[column] for column in data.files}
+
+
+def save_step_time_series(log_file: str, events_path: str) -> str:
+    """ Compute the time series of a step from its event files and save it next to the step log. Return its path. """
+    path = time_series_path(log_file)
+    save_time_series(path, step_time_series(load_events(EventStream.step_event_files(events_path))))
+    return path
@@ -1,9 +1,9 @@
 from concurrent.futures import ThreadPoolExecutor
 import random
-import re
 import string
 import time
-import clientIDs
+import HttpClientPool
+import EventStream
 import threading
 import logging
 import os
@@ -18,6 +18,8 @@ from time import perf_counter_ns
 """
 numThreads = 30 # Number of threads to be used in the test
 secondsToRun = 30 # Number of seconds to run the test
+catalogItemId = 1 # Catalog item updated by the writes and read from the basket, the row of the events
+event_format = "binary" # Format of the per-operation event stream written next to the log: "binary" or "ndjson" (see EventStream.py)
 
 catalogServicePort = "5101"
 discountServicePort = "5140"
@@ -29,6 +31,7 @@ logging_path = os.path.join(current_directory, 'testing_scripts', 'logs')
 timestamp = datetime.datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
 log_file_name = f"UpdatePriceAndDiscount_{timestamp}.log"
 log_file_path = os.path.join(logging_path, log_file_name)
+events_path = EventStream.event_stream_path(log_file_path, event_format) # Per-operation events of the test, next to the log
 
 def ConfigureLoggingSettings():
     # Configure logging settings
@@ -50,7 +53,7 @@ def QueryCatalogItemById(id: int) -> dict:
     # Log clientID address
     logging.info("Sending clientID to address: " + address)
 
-    response = clientIDs.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Log response
     logging.info('Response from Catalog Service: ' + str(response.status_code) + ' ' + str(response.reason))
@@ -65,7 +68,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
 
     # Get the brand name that matches the brand ID
     address = 'http://localhost:' + catalogServicePort + '/catalog-api/api/v1/Catalog/CatalogBrands?clientID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = clientIDs.get(address)
+    response = HttpClientPool.session().get(address)
 
     brandName = ""
     for brand in response.json():
@@ -74,7 +77,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
 
     # Get the type name that matches the type ID
     address = 'http://localhost:' + catalogServicePort + '/catalog-api/api/v1/Catalog/CatalogTypes?clientID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = clientIDs.get(address)
+    response = HttpClientPool.session().get(address)
 
     typeName = ""
     for type in response.json():
@@ -84,7 +87,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
     itemName = catalogItem[0]["name"]
     # Get the discount item that matches the brand name and type name
     address = 'http://localhost:' + discountServicePort + '/discount-api/api/v1/Discount/discounts?itemNames=' + itemName  + '&itemBrands=' + brandName + '&itemTypes=' + typeName + '&clientID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = clientIDs.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Extract the first (and only) discount item from the response list of discounts
     discountItem = response.json()[0]
@@ -106,7 +109,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict):
 
     address = 'http://localhost:' + webaggregatorServicePort + '/api/v1/Basket/items'
 
-    response = clientIDs.post(address, json=body)
+    response = HttpClientPool.session().post(address, json=body)
 
     # Ensure that the response is 200
     if response.status_code != 200:
@@ -132,7 +135,7 @@ def readBasket():
     start = perf_counter_ns()
 
     # Send clientID
-    response = clientIDs.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Stop timer
     end = perf_counter_ns()
@@ -159,8 +162,8 @@ def readBasket():
     basketItemPrice = basketItems[0]["unitPrice"]
     basketItemDiscount = basketItems[0]["discount"]
 
-    #Log response
-    logging.info('Thread <' + str(identity) + '> clientID: <' + clientID + '> ' + 'Read Basket: Price {' + str(basketItemPrice) + '}, Discount: {' + str(basketItemDiscount) + '}, Timestamp: ' + timestamp)
+    # Record the operation and the price and discount it read in the event stream, checked for coherence after the test
+    events.emit(EventStream.READ, str(identity), catalogItemId, start, start, timeTaken, response.status_code, basketItemPrice, basketItemDiscount)
     return
 
 
@@ -186,18 +189,16 @@ def writeOperations(catalogItem: dict, discountItem: dict):
         # Get the price and discount already assigned to the thread
         price, discount = thread_price_discount[thread_identity]
 
-    logging.info('Executing write operations with thread: ' + str(thread_identity) + ' and price/discount: ' + str(price) + '/' + str(discount))
-
     # Update price on catalog item
-    updatePriceOnCatalog(catalogItem, price, clientID)
+    updatePriceOnCatalog(catalogItem, price, discount, clientID)
     
     # Update discount on discount item
-    updateDiscount(discountItem, discount, clientID)
+    updateDiscount(discountItem, price, discount, clientID)
     return
 
 
 # Update Price on Catalog Item with ID 1
-def updatePriceOnCatalog(catalogItem: dict, price: int, clientID: str):
+def updatePriceOnCatalog(catalogItem: dict, price: int, discount: int, clientID: str):
     # Get thread ID
     identity = threading.get_ident()
     
@@ -213,7 +214,7 @@ def updatePriceOnCatalog(catalogItem: dict, price: int, clientID: str):
     start = perf_counter_ns()
 
     # Send clientID
-    response = clientIDs.put(address, json=catalogItem[0])
+    response = HttpClientPool.session().put(address, json=catalogItem[0])
 
     # Stop timer
     end = perf_counter_ns()
@@ -232,12 +233,12 @@ def updatePriceOnCatalog(catalogItem: dict, price: int, clientID: str):
             successCount[identity] = 1
         else:
             successCount[identity] += 1
-    #Log response
-    logging.info("Thread <" + str(identity) + "> clientID: <" + clientID + "> " + "PriceUpdate: " + str(catalogItem[0]["price"]) + ". Time: <" + str(timeTaken) + "> ns. Response: " + str(response.status_code) + " => " + str(response.reason))
+    # Record the request and the price and discount pair it belongs to in the event stream
+    events.emit(EventStream.WRITE, str(identity), catalogItemId, start, start, timeTaken, response.status_code, price, discount)
 
 
 # Update Discount on Item with ID 1
-def updateDiscount(discountItem: dict, discount: int, clientID: str):
+def updateDiscount(discountItem: dict, price: int, discount: int, clientID: str):
     # Get thread ID
     identity = threading.get_ident()
     
@@ -253,7 +254,7 @@ def updateDiscount(discountItem: dict, discount: int, clientID: str):
     start = perf_counter_ns()
 
     # Send clientID
-    response = clientIDs.put(address, json=discountItem)
+    response = HttpClientPool.session().put(address, json=discountItem)
 
     # Stop timer
     end = perf_counter_ns()
@@ -272,8 +273,8 @@ def updateDiscount(discountItem: dict, discount: int, clientID: str):
             successCount[identity] = 1
         else:
             successCount[identity] += 1
-    #Log response
-    logging.info("Thread <" + str(identity) + "> clientID: <" + clientID + "> " + "DiscountUpdate: " + str(discountItem["discountValue"]) + ". Time: <" + str(timeTaken) + "> ns. Response: " + str(response.status_code) + " => " + str(response.reason))
+    # Record the request and the price and discount pair it belongs to in the event stream
+    events.emit(EventStream.WRITE, str(identity), catalogItemId, start, start, timeTaken, response.status_code, price, discount)
 
 
 
@@ -289,35 +290,14 @@ def assign_operations(catalogItem: dict, discountItem: dict):
             future = executor.submit(writeOperations, copy.deepcopy(catalogItem), copy.deepcopy(discountItem))
 
 
-def check_discount_from_log_file(file_path):
-    pattern = r'Read Basket: Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
-
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-
 # Create a thread pool with numThreads threads
 executor = ThreadPoolExecutor(max_workers=numThreads)  
 
 # Create a single dictionary with an entry for each thread. Each thread is assigned a list of time taken and success count
 timeTakenList = {}
 successCount = {}
+# Writer of the per-operation events, opened by main
+events = None
 read_write_ratio = 6 # Scale of 0 to 10, 0 being 100% read, 10 being 100% write
 
 # Create a list for chances of read/write operations
@@ -332,16 +312,18 @@ def main():
     # Configure logging settings
     ConfigureLoggingSettings()
 
-    # Define Global HTTP Client
-    http = clientIDs.Session()
 
     # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
-    catalogItem = QueryCatalogItemById(1)
+    catalogItem = QueryCatalogItemById(catalogItemId)
     discountItem = QueryDiscountItemById(catalogItem)
     
     # Add the catalog Item to the Basket to be used in tests
     AddCatalogItemToBasket(catalogItem, discountItem)
 
+    # Writer of the per-operation events, encoding and writing them on a background thread
+    global events
+    events = EventStream.EventWriter(events_path)
+
     # Create new Thread for assigning operations
     assign_operations_thread = threading.Thread(target=assign_operations, args=(catalogItem, discountItem))
     # Start thread
@@ -351,6 +333,8 @@ def main():
     assign_operations_thread.join()
     # Shutdown executor
     executor.shutdown(wait=True, cancel_futures=True)
+    # Write the events still buffered, every operation of the test finished
+    events.close()
     # Calculate total time taken
     totalTimeTaken = time.time() - startTime
 
@@ -367,15 +351,20 @@ def main():
     clientIDsPerSecond = totalclientIDs / totalTimeTaken
     logging.info("clientIDs per second: " + str(clientIDsPerSecond))
 
-    results, anomaly_line_presence = check_discount_from_log_file(log_file_path)
+    # Coherent reads and anomalies counted from the reads of the event stream, with a bounded sample of the anomalies
+    coherence = EventStream.check_discount_from_events([events_path])
+    results, anomaly_line_presence = coherence.counts(), coherence.anomaly_lines()
     print(f"OK: {results['OK']}")
     print(f"Anomalies: {results['anomalies']}")
     if results['anomalies'] > 0:
         for line in anomaly_line_presence:
-            print(line, end='')
+            print(line)
 
     # Output ratio of Anomalies to total in percentage
-    print(f"Anomalies ratio: {results['anomalies'] / (results['OK'] + results['anomalies']) * 100}%")
+    if results['OK'] + results['anomalies'] > 0:
+        print(f"Anomalies ratio: {results['anomalies'] / (results['OK'] + results['anomalies']) * 100}%")
+    else:
+        print("Anomalies ratio: no reads recorded")
 
 if __name__ == "__main__":
     # Call main function
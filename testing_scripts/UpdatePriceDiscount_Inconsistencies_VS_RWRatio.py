@@ -1,9 +1,11 @@
 from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import random
-import re
 import string
 import time
-import requests
+import HttpClientPool
+import ArrivalScheduler
+import EventStream
+import LatencyHistogram
 import threading
 import logging
 import os
@@ -19,7 +21,10 @@ from time import perf_counter_ns
 numThreads = 12 # Number of threads to be used in the test
 secondsToRun = 10 # Number of seconds to run the test
 throughput = 5 # Number of functionalities per second
+arrival_process = "constant" # Arrival process of the operations: "constant" or "poisson"
 read_write_ratio = [1, 2, 3, 4, 5, 6, 7, 8, 9] # Scale of 0 to 10, 0 being 100% read, 10 being 100% write
+catalogItemId = 1 # Catalog item updated by the writes and read from the basket, the row of the events
+event_format = "binary" # Format of the per-operation event stream written next to each test log: "binary" or "ndjson" (see EventStream.py)
 
 catalogServicePort = "5101"
 discountServicePort = "5140"
@@ -69,7 +74,7 @@ def QueryCatalogItemById(id: int) -> dict:
     # Log request address
     logging.info("Sending request to address: " + address)
 
-    response = requests.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Log response
     logging.info('Response from Catalog Service: ' + str(response.status_code) + ' ' + str(response.reason))
@@ -84,7 +89,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
 
     # Get the brand name that matches the brand ID
     address = 'http://localhost:' + catalogServicePort + '/catalog-api/api/v1/Catalog/CatalogBrands?interval_low=0&interval_high=0&functionality_ID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = requests.get(address)
+    response = HttpClientPool.session().get(address)
 
     brandName = ""
     for brand in response.json():
@@ -93,7 +98,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
 
     # Get the type name that matches the type ID
     address = 'http://localhost:' + catalogServicePort + '/catalog-api/api/v1/Catalog/CatalogTypes?interval_low=0&interval_high=0&functionality_ID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = requests.get(address)
+    response = HttpClientPool.session().get(address)
 
     typeName = ""
     for type in response.json():
@@ -103,7 +108,7 @@ def QueryDiscountItemById(catalogItem: dict) -> dict:
     itemName = catalogItem[0]["name"]
     # Get the discount item that matches the brand name and type name
     address = 'http://localhost:' + discountServicePort + '/discount-api/api/v1/Discount/discounts?itemNames=' + itemName  + '&itemBrands=' + brandName + '&itemTypes=' + typeName + '&functionality_ID=func' + str(identity) + '&timestamp=' + timestamp + '&tokens=0'
-    response = requests.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Extract the first (and only) discount item from the response list of discounts
     discountItem = response.json()[0]
@@ -125,7 +130,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict):
 
     address = 'http://localhost:' + webaggregatorServicePort + '/api/v1/Basket/items'
 
-    response = requests.post(address, json=body)
+    response = HttpClientPool.session().post(address, json=body)
 
     # Ensure that the response is 200
     if response.status_code != 200:
@@ -134,7 +139,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict):
     return
 
 
-def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def readBasket(timeTakenHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter):
     basketID = "e5d06a2d-fc81-4051-8f30-0a85836eac70"
 
     # Get the thread identity
@@ -151,18 +156,17 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger):
     start = perf_counter_ns()
 
     # Send request
-    response = requests.get(address)
+    response = HttpClientPool.session().get(address)
 
     # Stop timer
     end = perf_counter_ns()
     # Calculate time taken
     timeTaken = end - start
 
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
+    # Record time taken in the histogram of this thread
+    if identity not in timeTakenHistograms:
+        timeTakenHistograms[identity] = LatencyHistogram.LatencyHistogram()
+    timeTakenHistograms[identity].record(timeTaken)
 
     # Register success if response is 200
     if response.status_code == 200:
@@ -178,12 +182,12 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger):
     basketItemPrice = basketItems[0]["unitPrice"]
     basketItemDiscount = basketItems[0]["discount"]
 
-    #Log response
-    logger.info('Thread <' + str(identity) + '> FuncID: <' + funcID + '> ' + 'Read Basket: Price {' + str(basketItemPrice) + '}, Discount: {' + str(basketItemDiscount) + '}, Timestamp: ' + timestamp)
+    # Record the operation and the price and discount it read in the event stream, checked for coherence after the test
+    events.emit(EventStream.READ, str(identity), catalogItemId, start, start, timeTaken, response.status_code, basketItemPrice, basketItemDiscount)
     return
 
 
-def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def writeOperations(catalogItem: dict, discountItem: dict, timeTakenHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter):
     # Execute write operations: update price and discount
 
     # Generate a random 16 bit random string
@@ -205,18 +209,16 @@ def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict,
         # Get the price and discount already assigned to the thread
         price, discount = thread_price_discount[thread_identity]
 
-    logger.info('Executing write operations with thread: ' + str(thread_identity) + ' and price/discount: ' + str(price) + '/' + str(discount))
-
     # Update price on catalog item
-    updatePriceOnCatalog(catalogItem, price, funcID, timeTakenList, successCount, logger)
+    updatePriceOnCatalog(catalogItem, price, discount, funcID, timeTakenHistograms, successCount, logger, events)
     
     # Update discount on discount item
-    updateDiscount(discountItem, discount, funcID, timeTakenList, successCount, logger)
+    updateDiscount(discountItem, price, discount, funcID, timeTakenHistograms, successCount, logger, events)
     return
 
 
 # Update Price on Catalog Item with ID 1
-def updatePriceOnCatalog(catalogItem: dict, price: int, funcID: str, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def updatePriceOnCatalog(catalogItem: dict, price: int, discount: int, funcID: str, timeTakenHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter):
     # Get thread ID
     identity = threading.get_ident()
     
@@ -232,18 +234,17 @@ def updatePriceOnCatalog(catalogItem: dict, price: int, funcID: str, timeTakenLi
     start = perf_counter_ns()
 
     # Send request
-    response = requests.put(address, json=catalogItem[0])
+    response = HttpClientPool.session().put(address, json=catalogItem[0])
 
     # Stop timer
     end = perf_counter_ns()
     # Calculate time taken
     timeTaken = end - start
 
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
+    # Record time taken in the histogram of this thread
+    if identity not in timeTakenHistograms:
+        timeTakenHistograms[identity] = LatencyHistogram.LatencyHistogram()
+    timeTakenHistograms[identity].record(timeTaken)
 
     # Register success if response is 201
     if response.status_code == 201:
@@ -251,15 +252,14 @@ def updatePriceOnCatalog(catalogItem: dict, price: int, funcID: str, timeTakenLi
             successCount[identity] = 1
         else:
             successCount[identity] += 1
-    #Log response
-    logger.info("Thread <" + str(identity) + "> FuncID: <" + funcID + "> " + "PriceUpdate: " + str(catalogItem[0]["price"]) + ". Time: <" + str(timeTaken) + "> ns. Response: " + str(response.status_code) + " => " + str(response.reason))
+    # Record the request and the price and discount pair it belongs to in the event stream
+    events.emit(EventStream.WRITE, str(identity), catalogItemId, start, start, timeTaken, response.status_code, price, discount)
 
 
 # Update Discount on Item with ID 1
-def updateDiscount(discountItem: dict, discount: int, funcID: str, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def updateDiscount(discountItem: dict, price: int, discount: int, funcID: str, timeTakenHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter):
     # Get thread ID
     identity = threading.get_ident()
-    logger.info("Thread <" + str(identity) + "> FuncID: <" + funcID + "> " + "DiscountUpdate: " + str(discount) + ".")
     # Update the discount value on the discount item
     discountItem["discountValue"] = discount
 
@@ -272,18 +272,17 @@ def updateDiscount(discountItem: dict, discount: int, funcID: str, timeTakenList
     start = perf_counter_ns()
 
     # Send request
-    response = requests.put(address, json=discountItem)
+    response = HttpClientPool.session().put(address, json=discountItem)
 
     # Stop timer
     end = perf_counter_ns()
     # Calculate time taken
     timeTaken = end - start
 
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
+    # Record time taken in the histogram of this thread
+    if identity not in timeTakenHistograms:
+        timeTakenHistograms[identity] = LatencyHistogram.LatencyHistogram()
+    timeTakenHistograms[identity].record(timeTaken)
 
     # Register success if response is 201
     if response.status_code == 201:
@@ -291,57 +290,33 @@ def updateDiscount(discountItem: dict, discount: int, funcID: str, timeTakenList
             successCount[identity] = 1
         else:
             successCount[identity] += 1
-    #Log response
-    logger.info("Thread <" + str(identity) + "> FuncID: <" + funcID + "> " + "DiscountUpdate: " + str(discountItem["discountValue"]) + ". Time: <" + str(timeTaken) + "> ns. Response: " + str(response.status_code) + " => " + str(response.reason))
+    # Record the request and the price and discount pair it belongs to in the event stream
+    events.emit(EventStream.WRITE, str(identity), catalogItemId, start, start, timeTaken, response.status_code, price, discount)
 
 
 
-def assign_operations(executor: ThreadPoolExecutor, futuresThreads: list, catalogItem: dict, discountItem: dict, read_write_list: list, timeTakenList: dict, successCount: dict, secondsToRun: int, logger: logging.Logger):
-    request_interval = 1 / throughput
+def assign_operations(executor: ThreadPoolExecutor, futuresThreads: list, catalogItem: dict, discountItem: dict, read_write_list: list, timeTakenHistograms: dict, successCount: dict, secondsToRun: int, logger: logging.Logger, events: EventStream.EventWriter, scheduler: ArrivalScheduler.ArrivalScheduler):
     global readOperationsCount
     global writeOperationsCount
-    start_time = time.time()
-    while time.time() - start_time < secondsToRun:
+    # Operations are sent at the deadlines given by the scheduler, for secondsToRun seconds of schedule
+    end_time = scheduler.next_deadline + secondsToRun
+    while scheduler.next_deadline < end_time:
+        # Wait for the send deadline of the next operation. If the generator fell behind, send right away to catch up
+        scheduler.wait()
         # Assign read/write operations to thread based on read_write_ratio
         if random.choice(read_write_list) == 0:
             # Read operation
             readOperationsCount += 1
-            future = executor.submit(readBasket, timeTakenList, successCount, logger)
+            future = executor.submit(readBasket, timeTakenHistograms, successCount, logger, events)
             futuresThreads.append(future)
         else:
             # Write operation
             writeOperationsCount += 1
-            future = executor.submit(writeOperations, copy.deepcopy(catalogItem), copy.deepcopy(discountItem), timeTakenList, successCount, logger)
+            future = executor.submit(writeOperations, copy.deepcopy(catalogItem), copy.deepcopy(discountItem), timeTakenHistograms, successCount, logger, events)
             futuresThreads.append(future)
-
-        # Limit the throughput to throughtput request per second
-        time.sleep(request_interval)
     wait(futuresThreads, return_when=ALL_COMPLETED)
 
 
-def check_discount_from_log_file(file_path):
-    pattern = r'Read Basket: Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
-
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-
 # def generatePlots():
 
 
@@ -351,11 +326,9 @@ discounts = [prices[i] // 10 for i in range(numThreads)]
 thread_price_discount = {}
 
 def main():
-    # Define Global HTTP Client
-    http = requests.Session()
 
     # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
-    catalogItem = QueryCatalogItemById(1)
+    catalogItem = QueryCatalogItemById(catalogItemId)
     discountItem = QueryDiscountItemById(catalogItem)
     
     # Add the catalog Item to the Basket to be used in tests
@@ -391,14 +364,16 @@ def main():
         
         # Configure logging settings for each read/write ratio test
         logger, log_file = ConfigureLoggingSettings(ratio)
+        # Per-operation events of the test, written next to the test log
+        events_path = EventStream.event_stream_path(log_file, event_format)
         
         logger.info("Throughput:" + str(throughput) + " func/sec. Read/Write Ratio: " + str(((1.0 - (ratio/(len(read_write_ratio) + 1))) * 100.0)) + "% read operations")
                      
         # Create a list for chances of read/write operations
         read_write_list = [1 for _ in range(ratio)] + [0 for _ in range(10 - ratio)]
         
-        # Create a single dictionary with an entry for each thread. Each thread is assigned a list of time taken and success count
-        timeTakenList = {}
+        # Create a single dictionary with an entry for each thread. Each thread is assigned a latency histogram and a success count
+        timeTakenHistograms = {}
         successCount = {}
 
         global readOperationsCount
@@ -409,13 +384,24 @@ def main():
         # Create a pool of futures
         futuresThreads = []
 
+        # Snapshot the connection counters, to report the connections opened and reused during this test
+        connectionsBefore = HttpClientPool.connection_counters()
+
+        # Create the scheduler of the send deadlines for the target throughput
+        scheduler = ArrivalScheduler.ArrivalScheduler(throughput, arrival_process)
+
+        # Writer of the per-operation events, encoding and writing them on a background thread
+        events = EventStream.EventWriter(events_path)
+
         # Create new Thread for assigning operations
-        assign_operations_thread = threading.Thread(target=assign_operations, args=(executor, futuresThreads, catalogItem, discountItem, read_write_list, timeTakenList, successCount, secondsToRun, logger))
+        assign_operations_thread = threading.Thread(target=assign_operations, args=(executor, futuresThreads, catalogItem, discountItem, read_write_list, timeTakenHistograms, successCount, secondsToRun, logger, events, scheduler))
         # Start thread
         startTime = time.time()
         assign_operations_thread.start()
         # Wait for thread to finish
         assign_operations_thread.join()
+        # Write the events still buffered, every operation of the test finished
+        events.close()
         
 
         # Open RESULTS log tag
@@ -427,17 +413,24 @@ def main():
         # Log total time taken
         logger.info("Total time taken: " + str(totalTimeTaken) + " seconds")
 
+        # Merge the latency histograms of every thread
+        timeTakenHistogram = LatencyHistogram.merge_histograms(timeTakenHistograms.values())
+
         # Calculate average time taken
-        averageTimeTaken = sum([sum(timeTakenList[i]) for i in timeTakenList]) / sum([len(timeTakenList[i]) for i in timeTakenList])
+        averageTimeTaken = timeTakenHistogram.mean()
         averageTimeTakenList.append(averageTimeTaken)
         # Log average time taken
         logger.info("Average time taken: " + str(averageTimeTaken) + " ns" + " (" + str(averageTimeTaken / 1000000) + " milliseconds)")
 
+        # Log the latency percentiles, and save the histogram of the test for later merging across runs
+        LatencyHistogram.log_percentiles(logger, "Service time", timeTakenHistogram)
+        LatencyHistogram.save_histograms(os.path.splitext(log_file)[0] + ".hist", {"serviceTime": timeTakenHistogram})
+
         # Log the number of each type of request
         logger.info("Number of read operations: " + str(readOperationsCount) + ", Number of write operations: " + str(writeOperationsCount))
 
         # Calculate success rate and total number of operations
-        totalRequests = sum([len(timeTakenList[i]) for i in timeTakenList])
+        totalRequests = timeTakenHistogram.total_count
         successRate = sum([successCount[i] for i in successCount]) / totalRequests
         successRatioList.append(successRate)
         successCountList.append(successCount)
@@ -454,14 +447,22 @@ def main():
         # Log the average functionalities per seconds
         logger.info("Functionalities per second: " + str((readOperationsCount + writeOperationsCount) / totalTimeTaken))
 
-        results, anomaly_line_presence = check_discount_from_log_file(log_file)
+        # Log how many connections were opened and reused during the test
+        HttpClientPool.log_connection_counters(logger, HttpClientPool.subtract_counters(HttpClientPool.connection_counters(), connectionsBefore))
+
+        # Log how far behind schedule the operations were sent
+        ArrivalScheduler.log_schedule_lag(logger, scheduler.lags)
+
+        # Coherent reads and anomalies counted from the reads of the event stream, with a bounded sample of the anomalies
+        coherence = EventStream.check_discount_from_events([events_path])
+        results, anomaly_line_presence = coherence.counts(), coherence.anomaly_lines()
         resultsList.append(results)
         anomalyLinePresenceList.append(anomaly_line_presence)
         # Log the results
         logger.info("Results: " + str(results['OK']) + " Read operations, " + str(results['anomalies']) + " anomalies")
         if results['anomalies'] > 0:
             for line in anomaly_line_presence:
-                logger.info(line, end='')
+                logger.info(line)
         logger.info("Anomalies ratio: " + str(results['anomalies'] / totalRequests) + "% (" + str(results['anomalies']) + "/" + str(totalRequests) + ")")
         logger.info("=========================================")
 
@@ -1,14 +1,21 @@
 from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import random
-import re
 import string
 import time
-import requests
+import HttpClientPool
+import ArrivalScheduler
+import CoherenceCheck
+import EventStream
+import KeyDistributions
+import LatencyHistogram
+import LiveMetrics
+import LoadEngine
+import PayloadTemplates
+import TimeSeries
 import threading
 import logging
 import os
 import datetime
-import copy
 from time import perf_counter_ns
 import sys
 
@@ -24,6 +31,11 @@ throughput_step = 30 # Number of requests per second to increase throughput by
 throughput = 40 # requests per second
 max_throughput = 700
 contention_rows = 24 # Number of rows to be used in the test
+key_distribution = "uniform" # Rows picked by the operations: "uniform", "zipfian[:s]", "hotspot[:ops:rows]" or "sequential" (see KeyDistributions.py)
+arrival_process = "constant" # Arrival process of the operations: "constant" or "poisson"
+event_format = "binary" # Format of the per-operation event stream written next to each step log: "binary" or "ndjson" (see EventStream.py)
+numProcesses = 1 # Number of load generator processes. Above 1, the throughput is spread over processes running the asyncio load engine
+metrics_port = 0 # Port of the live /metrics endpoint (see LiveMetrics.py, e.g. 9464), the load generator processes use the next ports. 0 to disable
 # wrappers = True # True if the test is being run with wrappers, False if the test is being run without wrappers
 
 thesisFrontendPort = "5142"
@@ -83,7 +95,7 @@ def QueryCatalogItemById(ids: list[id]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Log response
         logging.info('Response from Catalog Service: ' + str(response.status_code) + ' ' + str(response.reason))
@@ -107,7 +119,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         brandName = ""
         for brand in response.json():
@@ -120,7 +132,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         typeName = ""
         for type in response.json():
@@ -134,7 +146,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Extract the first (and only) discount item from the response list of discounts
         discountItem = response.json()[0]
@@ -163,7 +175,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
 
     address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/additemtobasket'
 
-    response = requests.post(address, json=body)
+    response = HttpClientPool.session().post(address, json=body)
 
     # Ensure that the response is 200
     if response.status_code != 200:
@@ -172,23 +184,28 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
     return
 
 
-def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger, basketID: str, contention: str):
+def readBasket(timeTakenHistograms: dict, responseTimeHistograms: dict, successCount: dict, coherenceCounters: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int, contention: str, intendedStart: int):
     # Get the thread identity
     identity = threading.get_ident()
 
-    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basketID
+    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basket_IDs[key]
 
     # Measure time taken to send request with nano seconds precision
     start = perf_counter_ns()
 
     success = False
     while not success:
+        attemptStart = perf_counter_ns()
         try:
             # Send request
-            response = requests.get(address)
+            response = HttpClientPool.session().get(address)
             if(response.status_code == 200): 
                 success = True
+            else:
+                # Record the failed attempt, the operation is retried
+                events.emit(EventStream.READ, str(identity), key, intendedStart, attemptStart, perf_counter_ns() - attemptStart, response.status_code, 0, 0)
         except:
+            events.emit(EventStream.READ, str(identity), key, intendedStart, attemptStart, perf_counter_ns() - attemptStart, EventStream.NO_RESPONSE, 0, 0)
             # Sleep for 10ms
             logging.info("Error reading basket. Retrying in 10ms")
             time.sleep(0.01)
@@ -196,17 +213,17 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger,
 
     # Stop timer
     end = perf_counter_ns()
-    # Calculate time taken
+    # Calculate time taken, and the response time measured from the intended start of the operation
     timeTaken = end - start
+    responseTime = end - intendedStart
 
-    # Log the time taken in milliseconds
-    logger.info("Read Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
-
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
+    # Record time taken and response time in the histograms of this thread
+    if identity not in timeTakenHistograms:
+        timeTakenHistograms[identity] = LatencyHistogram.LatencyHistogram()
+        responseTimeHistograms[identity] = LatencyHistogram.LatencyHistogram()
+    timeTakenHistograms[identity].record(timeTaken)
+    responseTimeHistograms[identity].record(responseTime)
+    LiveMetrics.worker_metrics(identity).operation_completed(LiveMetrics.READ, responseTime)
 
     # Register success if response is 200
     if response.status_code == 200:
@@ -225,12 +242,18 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger,
     basketItemPrice = basketItems[0]["unitPrice"]
     basketItemDiscount = basketItems[0]["discount"]
 
-    #Log response
-    logger.log(logging.INFO, 'Thread <' + str(identity) + '> ' + 'Read Basket <' + basketID + '>: Price {' + str(basketItemPrice) + '}, Discount: {' + str(basketItemDiscount) + '}')
+    # Check the coherence of the price and discount read, in the counter of this thread
+    if identity not in coherenceCounters:
+        coherenceCounters[identity] = CoherenceCheck.CoherenceCounter()
+    coherent = coherenceCounters[identity].check(basketItemPrice, basketItemDiscount, identity, basket_IDs[key])
+    LiveMetrics.worker_metrics(identity).read_checked(coherent)
+
+    # Record the operation and the price and discount it read in the event stream
+    events.emit(EventStream.READ, str(identity), key, intendedStart, start, timeTaken, response.status_code, basketItemPrice, basketItemDiscount)
     return
 
 
-def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def writeOperations(template: PayloadTemplates.PayloadTemplate, timeTakenHistograms: dict, responseTimeHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int, intendedStart: int):
     # Execute write operations: update price and discount
 
     thread_identity = threading.get_ident()
@@ -257,25 +280,16 @@ def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict,
     # updateDiscount(discountItem, discount, timeTakenList, successCount, logger)
     
     # Update the price and discount on the catalog item and discount item
-    updatePriceAndDiscount(catalogItem, discountItem, price, discount, timeTakenList, successCount, logger)
+    updatePriceAndDiscount(template, price, discount, timeTakenHistograms, responseTimeHistograms, successCount, logger, events, key, intendedStart)
 
     return
 
 
-def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, discount: int, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def updatePriceAndDiscount(template: PayloadTemplates.PayloadTemplate, price: int, discount: int, timeTakenHistograms: dict, responseTimeHistograms: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int, intendedStart: int):
     # Contact the frontend service and update the price and discount of the item
 
-    # Update the price on the catalog item
-    catalogItem["price"] = price
-
-    # update the discount value on the discount item
-    discountItem["discountValue"] = discount
-
-    # Build the payload
-    payload = {
-        "CatalogItem": catalogItem,
-        "DiscountItem": discountItem, 
-    }
+    # Build the payload, filling the price and discount in the pre-encoded payload of the catalog row
+    payload = template.render(price=price, discount=discount)
 
     address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/updatepricediscount'
 
@@ -284,34 +298,42 @@ def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, di
 
     success = False
     while not success:
+        attemptStart = perf_counter_ns()
         try:
             # Send request
-            response = requests.put(address, json=payload)
+            response = HttpClientPool.session().put(address, data=payload, headers=PayloadTemplates.jsonHeaders)
             if(response.status_code == 200): 
                 success = True
+            else:
+                # Record the failed attempt, the operation is retried
+                events.emit(EventStream.WRITE, str(threading.get_ident()), key, intendedStart, attemptStart, perf_counter_ns() - attemptStart, response.status_code, price, discount)
         except:
-            # Sleep for 10ms
-            logging.info("Error updating price and discount Status_Code:"+ response.status_code +". Retrying in 10ms")
+            events.emit(EventStream.WRITE, str(threading.get_ident()), key, intendedStart, attemptStart, perf_counter_ns() - attemptStart, EventStream.NO_RESPONSE, price, discount)
+            # Sleep for 10ms, there may be no response to report the status of
+            logging.info("Error updating price and discount. Retrying in 10ms")
             time.sleep(0.01)
             continue
 
     # Stop timer
     end = perf_counter_ns()
 
-    # Calculate time taken
+    # Calculate time taken, and the response time measured from the intended start of the operation
     timeTaken = end - start
-
-    # Log the time taken in milliseconds
-    logger.info("Write Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
+    responseTime = end - intendedStart
 
     # Get thread ID
     identity = threading.get_ident()
 
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
+    # Record the operation and the price and discount it wrote in the event stream
+    events.emit(EventStream.WRITE, str(identity), key, intendedStart, start, timeTaken, response.status_code, price, discount)
+
+    # Record time taken and response time in the histograms of this thread
+    if identity not in timeTakenHistograms:
+        timeTakenHistograms[identity] = LatencyHistogram.LatencyHistogram()
+        responseTimeHistograms[identity] = LatencyHistogram.LatencyHistogram()
+    timeTakenHistograms[identity].record(timeTaken)
+    responseTimeHistograms[identity].record(responseTime)
+    LiveMetrics.worker_metrics(identity).operation_completed(LiveMetrics.WRITE, responseTime)
 
     # Register success if response is 201
     if response.status_code == 200:
@@ -324,69 +346,45 @@ def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, di
         return
 
 
-def assign_operations(executor: ThreadPoolExecutor, futuresThreads: list, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, timeTakenList: dict, successCount: dict, secondsToRun: int, logger: logging.Logger, throughput: int, basket_IDs_assigned: dict, contention: str):
-    request_interval = 1 / throughput
+def assign_operations(executor: ThreadPoolExecutor, futuresThreads: list, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, timeTakenHistograms: dict, responseTimeHistograms: dict, successCount: dict, coherenceCounters: dict, secondsToRun: int, logger: logging.Logger, events: EventStream.EventWriter, scheduler: ArrivalScheduler.ArrivalScheduler, basket_IDs_assigned: dict, contention: str):
     global readOperationsCount
     global writeOperationsCount
     total_active_time = 0
-    # nanossecs_to_run = secondsToRun * 1000000000
-    start_test_time = time.time()
-
-    while time.time() < start_test_time + secondsToRun:
-        # Get a random index from the list of catalog items and discount items
-        index = random.randint(0, len(catalogItems) - 1)
+    # Operations are sent at the deadlines given by the scheduler, for secondsToRun seconds of schedule
+    end_test_time = scheduler.next_deadline + secondsToRun
+    # Live metrics of the operations sent by this thread, the client threads record their completion in their own
+    metrics = LiveMetrics.worker_metrics("scheduler")
+
+    while scheduler.next_deadline < end_test_time:
+        # Wait for the send deadline of the next operation. If the generator fell behind, send right away to catch up
+        intendedStart = int(scheduler.wait() * 1000000000)
+        metrics.schedule_lag(scheduler.lags[-1])
+        metrics.operation_started()
+        # Pick the catalog row (and its basket) of the operation from the key distribution
+        index = keys.next_key()
         # Assign read/write operations to thread based on read_write_ratio
         random_choice = random.choice(read_write_list)
         if random_choice == 0:
             # Read operation
             # readOperationsCount += 1
-            future = executor.submit(readBasket, timeTakenList, successCount, logger, f"basket{index}", contention)
+            future = executor.submit(readBasket, timeTakenHistograms, responseTimeHistograms, successCount, coherenceCounters, logger, events, index, contention, intendedStart)
             
             futuresThreads.append(future)
-            # Limit the throughput to throughtput request per second
-            time.sleep(request_interval)
         else:
             # Write operation
             # writeOperationsCount += 1
-            future = executor.submit(writeOperations, copy.deepcopy(catalogItems[index]), copy.deepcopy(discountItems[index]), timeTakenList, successCount, logger)
+            future = executor.submit(writeOperations, templates[index], timeTakenHistograms, responseTimeHistograms, successCount, logger, events, index, intendedStart)
             futuresThreads.append(future)
-            # Limit the throughput to 2 * throughtput request per second: 1 for catalogpPriceUpdate and 1 for discountUpdate
-            time.sleep(request_interval)
-        # future = executor.submit(microDiscountTest)
-        # time.sleep(request_interval)
 
     for future in futuresThreads:
         future.cancel()
     wait(futuresThreads, return_when=ALL_COMPLETED)
 
 
-def check_discount_from_log_file(file_path):
-    pattern = r'Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
-
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-
 # Create predefined list of prices and discounts to be used in tests equal to the number of threads
 prices = [10000000 * (i+1) for i in range(numThreads)]
 discounts = [prices[i] // 10 for i in range(numThreads)]
-basket_IDs = ["basket" + str(i) for i in range(numThreads)]
+basket_IDs = ["basket" + str(i) for i in range(max(numThreads, contention_rows))]
 
 thread_price_discount = {}
 
@@ -396,8 +394,6 @@ def main():
     wrappers = sys.argv[2] # 0 for no wrappers, 1 for wrappers
     test_logging_path = configureRootLogger(contention, wrappers)
     # microDiscountTest()
-    # Define Global HTTP Client
-    http = requests.Session()
 
     # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
     if(contention == "0"):
@@ -416,6 +412,11 @@ def main():
     for index, (catalogItem, discountItem) in enumerate(zip(catalogItems, discountItems)):
         AddCatalogItemToBasket(catalogItem, discountItem, basket_IDs[index])
 
+    # Encode the update payload of each catalog row once, only the price and discount are filled in per request
+    templates = PayloadTemplates.update_price_discount_templates(catalogItems, discountItems)
+    # Sampler of the catalog row each operation touches
+    keys = KeyDistributions.KeySelector(len(templates), key_distribution)
+
     # Store the results of the tests for each read/write ratio
     resultsList = []
 
@@ -423,6 +424,13 @@ def main():
     anomalyLinePresenceList = []
     
     executor = ThreadPoolExecutor(max_workers=numThreads)  
+
+    # Serve the live metrics of the test while it runs
+    if metrics_port:
+        LiveMetrics.start_metrics_server(metrics_port)
+
+    # Start the load generator processes, kept for the whole test
+    engine = LoadEngine.ProcessPoolEngine(numProcesses, metrics_port=metrics_port) if numProcesses > 1 else None
     
     # while the throughput is less than 130
     global throughput
@@ -433,6 +441,9 @@ def main():
         # Configure logging settings for each read/write ratio test
         logger, log_file = ConfigureLoggingSettings(testNum, throughput, test_logging_path)
         logger.log(logging.INFO, "Logging")
+        LiveMetrics.set_step("Test " + str(testNum) + ": " + str(throughput) + " req/sec")
+        # Per-operation events of the test, written next to the step log
+        events_path = EventStream.event_stream_path(log_file, event_format)
 
         read_ratio = (10 - read_write_ratio) * 10
         write_ratio = 100 - read_ratio 
@@ -441,70 +452,128 @@ def main():
         # Create a list for chances of read/write operations
         read_write_list = [1 for _ in range(read_write_ratio)] + [0 for _ in range(10 - read_write_ratio)]
         
-        # Create a single dictionary with an entry for each thread. Each thread is assigned a list of time taken and success count
-        timeTakenList = {}
-        successCount = {}
-
-        # Create a dictionary of basket ID assigned to each thread
-        basket_IDs_assigned = {}
-
-        global readOperationsCount
-        global writeOperationsCount
-        readOperationsCount = 0
-        writeOperationsCount = 0
-
-        # Create a pool of futures
-        futuresThreads = []
-
-        # Create new Thread for assigning operations
-        assign_operations_thread = threading.Thread(target=assign_operations, args=(executor, futuresThreads, catalogItems, discountItems, read_write_list, timeTakenList, successCount, secondsToRun, logger, throughput, basket_IDs_assigned, contention))
-        # Start thread
-        assign_operations_thread.start()
-        # Wait for thread to finish
-        assign_operations_thread.join()
+        if engine is not None:
+            # Spread the target throughput over the load generator processes, merging their results at the end of the step.
+            # Each event loop writes its own increasing price sequence, as each thread does in the threaded path
+            stepResults = engine.run_arrival_rate(throughput, catalogItems, discountItems, read_write_list, secondsToRun, logger, arrival_process, key_distribution=key_distribution, events_path=events_path, write_prices=LoadEngine.PRICE_SEQUENCES)
+
+            # Open RESULTS log tag
+            logger.info("-------------TEST RESULTS-------------")
+            logger.info("Throughput: " + str(throughput) + " req/sec.")
+            logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+            logger.info("Key distribution: " + key_distribution + " over " + str(len(templates)) + " rows")
+
+            # Log the totals, throughput, success rate and latency percentiles of the test, with the functionalities per
+            # second counted from the successful operations, as in the threaded path
+            LoadEngine.log_step_summary(logger, stepResults, secondsToRun, functionalities_from_successes=True)
+            LoadEngine.save_step_histograms(stepResults, log_file)
+            # Save the per-second series of the test, from its event stream
+            TimeSeries.save_step_time_series(log_file, events_path)
+            coherence = stepResults["coherence"]
+        else:
+            # Create a single dictionary with an entry for each thread. Each thread is assigned latency histograms and a success count
+            timeTakenHistograms = {}
+            responseTimeHistograms = {}
+            successCount = {}
+            # Each thread counts the coherent reads and anomalies of the baskets it reads
+            coherenceCounters = {}
+
+            # Create a dictionary of basket ID assigned to each thread
+            basket_IDs_assigned = {}
+
+            global readOperationsCount
+            global writeOperationsCount
+            readOperationsCount = 0
+            writeOperationsCount = 0
+
+            # Create a pool of futures
+            futuresThreads = []
+
+            # Snapshot the connection counters, to report the connections opened and reused during this test
+            connectionsBefore = HttpClientPool.connection_counters()
+
+            # Create the scheduler of the send deadlines for the target throughput
+            scheduler = ArrivalScheduler.ArrivalScheduler(throughput, arrival_process)
+
+            # Writer of the per-operation events, encoding and writing them on a background thread
+            events = EventStream.EventWriter(events_path)
+
+            # Create new Thread for assigning operations
+            assign_operations_thread = threading.Thread(target=assign_operations, args=(executor, futuresThreads, templates, keys, read_write_list, timeTakenHistograms, responseTimeHistograms, successCount, coherenceCounters, secondsToRun, logger, events, scheduler, basket_IDs_assigned, contention))
+            # Start thread
+            assign_operations_thread.start()
+            # Wait for thread to finish
+            assign_operations_thread.join()
+            # Write the events still buffered, every operation of the test finished
+            events.close()
         
 
-        # Open RESULTS log tag
-        logger.info("-------------TEST RESULTS-------------")
-        logger.info("Throughput: " + str(throughput) + " req/sec.")
-        logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+            # Open RESULTS log tag
+            logger.info("-------------TEST RESULTS-------------")
+            logger.info("Throughput: " + str(throughput) + " req/sec.")
+            logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+            logger.info("Key distribution: " + key_distribution + " over " + str(len(templates)) + " rows")
 
-        # Calculate total time taken
-        total_active_time_taken = sum([sum(timeTakenList[i]) for i in timeTakenList])
+            # Merge the latency histograms of every thread
+            timeTakenHistogram = LatencyHistogram.merge_histograms(timeTakenHistograms.values())
+            responseTimeHistogram = LatencyHistogram.merge_histograms(responseTimeHistograms.values())
 
-        # Log total times
-        logger.info("Total test time: " + str(secondsToRun) + " seconds")
-        logger.info("Total active time taken: " + str(total_active_time_taken / 1000000000) + " seconds")
+            # Calculate total time taken
+            total_active_time_taken = timeTakenHistogram.total
 
-        # Calculate average time taken by each request
-        total_requests = sum([len(timeTakenList[i]) for i in timeTakenList])
-        averageTimeTaken = total_active_time_taken / total_requests
+            # Log total times
+            logger.info("Total test time: " + str(secondsToRun) + " seconds")
+            logger.info("Total active time taken: " + str(total_active_time_taken / 1000000000) + " seconds")
 
-        # Log average time taken by each request
-        logger.info("Average time/req: " + str(averageTimeTaken / 1000000) + " milliseconds")
+            # Calculate average time taken by each request
+            total_requests = timeTakenHistogram.total_count
+            averageTimeTaken = timeTakenHistogram.mean()
 
-        logger.info("Total number of requests: " + str(total_requests))
+            # Log average time taken by each request
+            logger.info("Average time/req: " + str(averageTimeTaken / 1000000) + " milliseconds")
+
+            # Log the average response time, measured from the intended start of each request (corrected for coordinated omission)
+            logger.info("Average response time/req (from intended start): " + str(responseTimeHistogram.mean() / 1000000) + " milliseconds")
+
+            # Log the latency percentiles, and save the histograms of the test for later merging across runs
+            LatencyHistogram.log_percentiles(logger, "Service time", timeTakenHistogram)
+            LatencyHistogram.log_percentiles(logger, "Response time", responseTimeHistogram)
+            LatencyHistogram.save_histograms(os.path.splitext(log_file)[0] + ".hist", {"serviceTime": timeTakenHistogram, "responseTime": responseTimeHistogram})
+            # Save the per-second series of the test, from its event stream
+            TimeSeries.save_step_time_series(log_file, events_path)
+
+            logger.info("Total number of requests: " + str(total_requests))
     
-        # Calculate the calculated throughput
-        answered_requests_throughput = total_requests / (secondsToRun)
+            # Calculate the calculated throughput
+            answered_requests_throughput = total_requests / (secondsToRun)
+
+            # Log the calculated throughput
+            logger.info("Answered Requests throughput: " + str(answered_requests_throughput) + " req/sec.")
+
+            # Log the number of each type of request
+            logger.info("Number of read operations: " + str(readOperationsCount) + ", Number of write operations: " + str(writeOperationsCount))
+
+            # Calculate success rate and total number of operations
+            total_success_count = sum([successCount[i] for i in successCount])
+            successRate = total_success_count / total_requests
 
-        # Log the calculated throughput
-        logger.info("Answered Requests throughput: " + str(answered_requests_throughput) + " req/sec.")
+            # Log success rate and total number of operations
+            logger.info("Success rate: " + str(successRate * 100) + "% - (" + str(sum([successCount[i] for i in successCount])) + "/" + str(total_requests) + ")")
 
-        # Log the number of each type of request
-        logger.info("Number of read operations: " + str(readOperationsCount) + ", Number of write operations: " + str(writeOperationsCount))
+            # Log the average functionalities per seconds
+            logger.info("Functionalities per second: " + str(total_success_count / (secondsToRun)))
 
-        # Calculate success rate and total number of operations
-        total_success_count = sum([successCount[i] for i in successCount])
-        successRate = total_success_count / total_requests
+            # Log how many connections were opened and reused during the test
+            HttpClientPool.log_connection_counters(logger, HttpClientPool.subtract_counters(HttpClientPool.connection_counters(), connectionsBefore))
 
-        # Log success rate and total number of operations
-        logger.info("Success rate: " + str(successRate * 100) + "% - (" + str(sum([successCount[i] for i in successCount])) + "/" + str(total_requests) + ")")
+            # Log how far behind schedule the operations were sent
+            ArrivalScheduler.log_schedule_lag(logger, scheduler.lags)
 
-        # Log the average functionalities per seconds
-        logger.info("Functionalities per second: " + str(total_success_count / (secondsToRun)))
+            # Merge the coherence counters of every thread
+            coherence = CoherenceCheck.merge_counters(coherenceCounters.values())
 
-        results, anomaly_line_presence = check_discount_from_log_file(log_file)
+        # Coherent reads and anomalies counted as the baskets were read, with a bounded sample of the anomalies
+        results, anomaly_line_presence = coherence.counts(), coherence.anomaly_lines()
         resultsList.append(results)
         anomalyLinePresenceList.append(anomaly_line_presence)
         # Log the results
@@ -519,6 +588,8 @@ def main():
 
     # Shutdown executor
     executor.shutdown(wait=True)
+    if engine is not None:
+        engine.close()
 
 
 if __name__ == "__main__":
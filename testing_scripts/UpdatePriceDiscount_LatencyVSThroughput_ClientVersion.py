@@ -1,10 +1,9 @@
 from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import math
 import random
-import re
 import string
 import time
-import requests
+import HttpClientPool
 import threading
 import logging
 import os
@@ -12,11 +11,18 @@ import datetime
 import copy
 from time import perf_counter_ns
 import sys
+import LoadEngine
+import LiveMetrics
+import EventStream
+import TimeSeries
 
 """	This script is used to test the Catalog.API service. 
     It will update the price on a catalog item with ID 1, while concurrently, Read the contents and Discount of the basket items.
     The script will log the response from the Catalog.API service and the Discount.API service.
     The script will also log the response from the Basket.API service.
+    The number of concurrent clients grows by 2% per test, from 1 to maxClients.
+
+    Usage: python UpdatePriceDiscount_LatencyVSThroughput_ClientVersion.py <contention 0|1> <wrappers 0|1> [maxClients]
 """
 numThreads = 32 # Number of threads to be used in the test
 secondsToRun = 20 # Number of seconds to run the test
@@ -25,6 +31,10 @@ throughput_step = 10 # Number of requests per second to increase throughput by
 throughput = 20 # requests per second
 max_throughput = 340
 contention_rows = 6 # Number of rows to be used in the test
+key_distribution = "uniform" # Rows picked by the operations: "uniform", "zipfian[:s]", "hotspot[:ops:rows]" or "sequential" (see KeyDistributions.py)
+maxClients = 5000 # Maximum number of concurrent clients simulated by the load engine, can be overridden by the third argument. Above 4096 clients per process (HttpClientPool.poolSizes per event loop) raise numProcesses
+numProcesses = 1 # Number of load generator processes the clients are spread over
+metrics_port = 0 # Port of the live /metrics endpoint (see LiveMetrics.py, e.g. 9464), the load generator processes use the next ports. 0 to disable
 # wrappers = True # True if the test is being run with wrappers, False if the test is being run without wrappers
 
 thesisFrontendPort = "5142"
@@ -33,11 +43,6 @@ discountServicePort = "5140"
 basketServicePort = "5103"
 webaggregatorServicePort = "5121"
 
-# Store the number of write operations
-writeOperationsCount = 0
-# Store the number of read operations
-readOperationsCount = 0
-
 def configureRootLogger(contention: str, wrappers: str) -> str:
     # Configure root logger
     current_directory = os.path.dirname(os.path.abspath(__file__))
@@ -58,11 +63,8 @@ def configureRootLogger(contention: str, wrappers: str) -> str:
 
 def ConfigureLoggingSettings(testNum: int, throughput: int, test_logging_path: str) -> str:
     # Configure logging settings
-    # The test number should be formated as a 3 digit number
-    if testNum < 10:
-        testNum = "00" + str(testNum)
-    elif testNum < 100:
-        testNum = "0" + str(testNum)
+    # The test number is zero padded to the digits of maxClients (at least 3), so the test logs sort in test order
+    testNum = str(testNum).zfill(max(3, len(str(maxClients))))
     log_file_name = f"Test{testNum}.log"
     logger_name = f"Test<{testNum}> Throughput-{throughput}"
     log_file_path = os.path.join(test_logging_path, log_file_name)
@@ -89,7 +91,7 @@ def QueryCatalogItemById(ids: list[id]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Log response
         logging.info('Response from Catalog Service: ' + str(response.status_code) + ' ' + str(response.reason))
@@ -113,7 +115,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         brandName = ""
         for brand in response.json():
@@ -126,7 +128,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         typeName = ""
         for type in response.json():
@@ -140,7 +142,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Extract the first (and only) discount item from the response list of discounts
         discountItem = response.json()[0]
@@ -169,7 +171,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
 
     address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/additemtobasket'
 
-    response = requests.post(address, json=body)
+    response = HttpClientPool.session().post(address, json=body)
 
     # Ensure that the response is 200
     if response.status_code != 200:
@@ -178,216 +180,10 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
     return
 
 
-def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger, basketID: str, contention: str):
-    # Get the thread identity
-    identity = threading.get_ident()
-
-    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basketID
-
-    # Measure time taken to send request with nano seconds precision
-    start = time.time_ns()
-    success = False
-    while not success:
-        try:
-            # Send request
-            response = requests.get(address)
-            if(response.status_code == 200): 
-                success = True
-        except:
-            # Sleep for 10ms
-            logger.log(logging.INFO, "Error reading basket. Retrying in 10ms")
-
-            time.sleep(0.01)
-            continue
-    
-    # Stop timer
-    end = time.time_ns()
-    # Calculate time taken in number of nano seconds
-    timeTaken = end - start
-
-    # Log the time taken in milliseconds
-    logger.info("Read Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
-
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
-
-    # Register success if response is 200
-    if response.status_code == 200:
-        if identity not in successCount:
-            successCount[identity] = 1
-        else:
-            successCount[identity] += 1
-    else:
-        logger.error("Error reading basket. Response from Basket.API: " + str(response.status_code))
-        return
-    
-    # Extract the basket items from the response
-    basketItems = response.json()["items"]
-
-    # Extract the basket item price and discount from the basket items
-    basketItemPrice = basketItems[0]["unitPrice"]
-    basketItemDiscount = basketItems[0]["discount"]
-
-    #Log response
-    logger.log(logging.INFO, 'Thread <' + str(identity) + '> ' + 'Read Basket <' + basketID + '>: Price {' + str(basketItemPrice) + '}, Discount: {' + str(basketItemDiscount) + '}')
-    return
-
-
-def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict, successCount: dict, logger: logging.Logger):
-    # Execute write operations: update price and discount
-
-    thread_identity = threading.get_ident()
-
-    # Check if the thread has already a pair price and discount already assigned in the dicionary of key/value: thread_id/(price, discount)
-    # if thread_identity not in thread_price_discount:
-    #         # Pick a random price and discount from the predefined list and remove it from the list of predefined prices and discounts
-    #         price, discount = prices.pop(), discounts.pop()
-    #         # Add the price and discount to the dictionary of key/value: thread_id/(price, discount)
-    #         thread_price_discount[thread_identity] = (price, discount)
-    # else:
-    #     # Update the price and discount in the dictionary of key/value: thread_id/(price, discount)
-    #     price, discount = thread_price_discount[thread_identity]
-    #     thread_price_discount[thread_identity] = (price + 10, discount + 1)
-    #     # Get the price and discount already assigned to the thread
-    #     price, discount = thread_price_discount[thread_identity]
-
-    # logger.info('Executing write operations with thread: ' + str(thread_identity) + ' and price/discount: ' + str(price) + '/' + str(discount))
-
-    # # Update price on catalog item
-    # updatePriceOnCatalog(catalogItem, price, timeTakenList, successCount, logger)
-    
-    # # Update discount on discount item
-    # updateDiscount(discountItem, discount, timeTakenList, successCount, logger)
-
-    # Get a random price between 1000 and 1000000, but divisible by 10
-    price = random.randint(100, 100000) * 10
-    discount = price // 10
-
-    # Update the price and discount on the catalog item and discount item
-    updatePriceAndDiscount(catalogItem, discountItem, price, discount, timeTakenList, successCount, logger)
-
-    return
-
-
-def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, discount: int, timeTakenList: dict, successCount: dict, logger: logging.Logger):
-    # Contact the frontend service and update the price and discount of the item
-
-    # Update the price on the catalog item
-    catalogItem["price"] = price
-
-    # update the discount value on the discount item
-    discountItem["discountValue"] = discount
-
-    # Build the payload
-    payload = {
-        "CatalogItem": catalogItem,
-        "DiscountItem": discountItem, 
-    }
-
-    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/updatepricediscount'
-
-    # Measure time taken to send request with nano seconds precision
-    start = time.time_ns()
-
-    success = False
-    while not success:
-        try:
-            # Send request
-            response = requests.put(address, json=payload)
-            if(response.status_code == 200): 
-                success = True
-        except:
-            # Sleep for 10ms
-            logger.log(logging.INFO, "Error updating price and discount Status_Code:"+ response.status_code +". Retrying in 10ms")
-            time.sleep(0.01)
-            continue
-    
-    # Stop timer
-    end = time.time_ns()
-
-    # Calculate time taken
-    timeTaken = end - start
-
-    success = False
-
-    # Log the time taken in milliseconds
-    logger.info("Write Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
-
-    # Get thread ID
-    identity = threading.get_ident()
-
-    # Add time taken to list
-    if identity not in timeTakenList:
-        timeTakenList[identity] = [timeTaken]
-    else:
-        timeTakenList[identity].append(timeTaken)
-
-    # Register success if response is 201
-    if response.status_code == 200:
-        if identity not in successCount:
-            successCount[identity] = 1
-        else:
-            successCount[identity] += 1
-    else:
-        logger.error("Error updating price on catalog item. Response from Catalog.API: " + str(response.status_code))
-        return
-
-
-def exec_functionality(testNum: int, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, timeTakenList: dict, successCount: dict, secondsToRun: int, logger: logging.Logger, throughput: int, basket_IDs_assigned: dict, contention: str):
-    # sleep_time = 0.50 * random.random() 
-    # sleep_time = 0.3 # Using sleep causes the threads to awake in block -> higher lat and lower throughput
-    
-    global readOperationsCount
-    global writeOperationsCount
-    start_test_time = time.time()
-
-    while time.time() < start_test_time + secondsToRun:
-        # Get a random index from the list of catalog items and discount items
-        index = random.randint(0, len(catalogItems) - 1)
-        # Assign read/write operations to thread based on read_write_ratio
-        random_choice = random.choice(read_write_list)
-        if random_choice == 0:
-            # Read operation
-            readOperationsCount += 1
-            readBasket(timeTakenList, successCount, logger, f"basket{index}", contention)
-            # time.sleep(sleep_time)
-        else:
-            # Write operation
-            writeOperationsCount += 1
-            writeOperations(copy.deepcopy(catalogItems[index]), copy.deepcopy(discountItems[index]), timeTakenList, successCount, logger)
-            # time.sleep(sleep_time)
-
-
-def check_discount_from_log_file(file_path):
-    pattern = r'Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
-
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-
 # Create predefined list of prices and discounts to be used in tests equal to the number of threads
 prices = [10000000 * (i+1) for i in range(numThreads)]
 discounts = [prices[i] // 10 for i in range(numThreads)]
-basket_IDs = ["basket" + str(i) for i in range(numThreads)]
+basket_IDs = ["basket" + str(i) for i in range(max(numThreads, contention_rows))]
 
 thread_price_discount = {}
 
@@ -395,10 +191,11 @@ thread_price_discount = {}
 def main():
     contention = sys.argv[1] # 0 for low contention, 1 high contention
     wrappers = sys.argv[2] # 0 for no wrappers, 1 for wrappers
+    global maxClients
+    if len(sys.argv) > 3:
+        maxClients = int(sys.argv[3]) # Maximum number of concurrent clients of the sweep
     test_logging_path = configureRootLogger(contention, wrappers)
     # microDiscountTest()
-    # Define Global HTTP Client
-    http = requests.Session()
 
     # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
     if(contention == "0"):
@@ -429,39 +226,27 @@ def main():
     # Create a list for chances of read/write operations
     read_write_list = [1 for _ in range(read_write_ratio)] + [0 for _ in range(10 - read_write_ratio)]
 
+    # Serve the live metrics of the test while it runs
+    if metrics_port:
+        LiveMetrics.start_metrics_server(metrics_port)
+
+    # Start the load generator processes, kept for the whole test
+    engine = LoadEngine.ProcessPoolEngine(numProcesses, metrics_port=metrics_port)
+
     global throughput
     testNum = 1
-    while testNum <= 300:
+    while testNum <= maxClients:
 
         # Configure logging settings for each read/write ratio test
         logger, log_file = ConfigureLoggingSettings(testNum, throughput, test_logging_path)
         logger.log(logging.INFO, "Logging")
+        LiveMetrics.set_step("Test " + str(testNum) + ": " + str(testNum) + " clients")
+        # Per-operation events of the test, written next to the step log
+        events_path = EventStream.event_stream_path(log_file)
 
-        # Create a single dictionary with an entry for each thread. Each thread is assigned a list of time taken and success count
-        timeTakenList = {}
-        successCount = {}
-
-        # Create a dictionary of basket ID assigned to each thread
-        basket_IDs_assigned = {}
-
-        global readOperationsCount
-        global writeOperationsCount
-        readOperationsCount = 0
-        writeOperationsCount = 0
-
-        clients = []
-        # Create 30 Clients
-        for _ in range(testNum):
-            client = threading.Thread(target=exec_functionality, args=(testNum, catalogItems, discountItems, read_write_list, timeTakenList, successCount, secondsToRun, logger, throughput, basket_IDs_assigned, contention))
-            clients.append(client)
-
-        # Start the threads
-        for client in clients:
-            client.start()
-
-        # Wait for all threads to finish
-        for client in clients:
-            client.join()
+        # Simulate testNum concurrent clients as coroutines on the asyncio load engine
+        stepResults = engine.run_virtual_users(testNum, catalogItems, discountItems, read_write_list, secondsToRun, logger, key_distribution=key_distribution, events_path=events_path)
+        readOperationsCount = stepResults["readOperationsCount"]
 
         # Open RESULTS log tag
         logger.info("-------------TEST RESULTS-------------")
@@ -469,43 +254,16 @@ def main():
         logger.info("Test with: " + str(testNum) + " concurrent Client. Sleeping for" + str(90) + "ms." )
 
         logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+        logger.info("Key distribution: " + key_distribution + " over " + str(len(catalogItems)) + " rows")
 
-        # Calculate total time taken
-        total_active_time_taken = sum([sum(timeTakenList[i]) for i in timeTakenList])
-
-        # Log total times
-        logger.info("Total test time: " + str(secondsToRun) + " seconds")
-        logger.info("Total active time taken: " + str(total_active_time_taken / 1000000000) + " seconds")
-
-        # Calculate average time taken by each request
-        total_requests = sum([len(timeTakenList[i]) for i in timeTakenList])
-        averageTimeTaken = total_active_time_taken / total_requests
-
-        # Log average time taken by each request
-        logger.info("Average time/req: " + str(averageTimeTaken / 1000000) + " milliseconds")
+        # Log the totals, throughput and success rate of the test
+        LoadEngine.log_step_summary(logger, stepResults, secondsToRun)
+        LoadEngine.save_step_histograms(stepResults, log_file)
+        # Save the per-second series of the test, from its event stream
+        TimeSeries.save_step_time_series(log_file, events_path)
 
-        logger.info("Total number of requests: " + str(total_requests))
-    
-        # Calculate the calculated throughput
-        answered_requests_throughput = total_requests / (secondsToRun)
-
-        # Log the calculated throughput
-        logger.info("Answered Requests throughput: " + str(answered_requests_throughput) + " req/sec.")
-
-        # Log the number of each type of request
-        logger.info("Number of read operations: " + str(readOperationsCount) + ", Number of write operations: " + str(writeOperationsCount))
-
-        # Calculate success rate and total number of operations
-        total_success_count = sum([successCount[i] for i in successCount])
-        successRate = total_success_count / total_requests
-
-        # Log success rate and total number of operations
-        logger.info("Success rate: " + str(successRate * 100) + "% - (" + str(sum([successCount[i] for i in successCount])) + "/" + str(total_requests) + ")")
-
-        # Log the average functionalities per seconds
-        logger.info("Functionalities per second: " + str((readOperationsCount + writeOperationsCount) / (secondsToRun)))
-
-        results, anomaly_line_presence = check_discount_from_log_file(log_file)
+        # Coherent reads and anomalies counted as the baskets were read, with a bounded sample of the anomalies
+        results, anomaly_line_presence = stepResults["coherence"].counts(), stepResults["coherence"].anomaly_lines()
         resultsList.append(results)
         anomalyLinePresenceList.append(anomaly_line_presence)
         # Log the results
@@ -519,6 +277,9 @@ def main():
         throughput += throughput_step
         testNum = math.floor(testNum * 1.02) + 1
 
+    # Stop the load generator processes
+    engine.close()
+
 
 
 
@@ -1,15 +1,16 @@
 from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import math
 import random
-import re
 import string
 import time
-import requests
+import HttpClientPool
 import threading
 import logging
 import os
 import datetime
-import copy
+import PayloadTemplates
+import KeyDistributions
+import EventStream
 from time import perf_counter_ns
 import sys
 
@@ -25,6 +26,8 @@ throughput_step = 10 # Number of requests per second to increase throughput by
 throughput = 20 # requests per second
 max_throughput = 340
 contention_rows = 6 # Number of rows to be used in the test
+key_distribution = "uniform" # Rows picked by the operations: "uniform", "zipfian[:s]", "hotspot[:ops:rows]" or "sequential" (see KeyDistributions.py)
+event_format = "binary" # Format of the per-operation event stream written next to each test log: "binary" or "ndjson" (see EventStream.py)
 # wrappers = True # True if the test is being run with wrappers, False if the test is being run without wrappers
 
 thesisFrontendPort = "5142"
@@ -89,7 +92,7 @@ def QueryCatalogItemById(ids: list[id]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Log response
         logging.info('Response from Catalog Service: ' + str(response.status_code) + ' ' + str(response.reason))
@@ -113,7 +116,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         brandName = ""
         for brand in response.json():
@@ -126,7 +129,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         typeName = ""
         for type in response.json():
@@ -140,7 +143,7 @@ def QueryDiscountItemById(catalogItems: list[dict]) -> dict:
         # Log request address
         logging.info("Sending request to address: " + address)
 
-        response = requests.get(address)
+        response = HttpClientPool.session().get(address)
 
         # Extract the first (and only) discount item from the response list of discounts
         discountItem = response.json()[0]
@@ -169,7 +172,7 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
 
     address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/additemtobasket'
 
-    response = requests.post(address, json=body)
+    response = HttpClientPool.session().post(address, json=body)
 
     # Ensure that the response is 200
     if response.status_code != 200:
@@ -178,19 +181,19 @@ def AddCatalogItemToBasket(catalogItem: dict, discountItem: dict, basketID: str)
     return
 
 
-def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger, basketID: str, contention: str):
+def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int, contention: str):
     # Get the thread identity
     identity = threading.get_ident()
 
-    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basketID
+    address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/readbasket?basketId=' + basket_IDs[key]
 
     # Measure time taken to send request with nano seconds precision
-    start = time.time_ns()
+    start = perf_counter_ns()
     success = False
     while not success:
         try:
             # Send request
-            response = requests.get(address)
+            response = HttpClientPool.session().get(address)
             if(response.status_code == 200): 
                 success = True
         except:
@@ -201,13 +204,10 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger,
             continue
     
     # Stop timer
-    end = time.time_ns()
+    end = perf_counter_ns()
     # Calculate time taken in number of nano seconds
     timeTaken = end - start
 
-    # Log the time taken in milliseconds
-    logger.info("Read Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
-
     # Add time taken to list
     if identity not in timeTakenList:
         timeTakenList[identity] = [timeTaken]
@@ -231,12 +231,12 @@ def readBasket(timeTakenList: dict, successCount: dict, logger: logging.Logger,
     basketItemPrice = basketItems[0]["unitPrice"]
     basketItemDiscount = basketItems[0]["discount"]
 
-    #Log response
-    logger.log(logging.INFO, 'Thread <' + str(identity) + '> ' + 'Read Basket <' + basketID + '>: Price {' + str(basketItemPrice) + '}, Discount: {' + str(basketItemDiscount) + '}')
+    # Record the operation and the price and discount it read in the event stream, checked for coherence after the test
+    events.emit(EventStream.READ, str(identity), key, start, start, timeTaken, response.status_code, basketItemPrice, basketItemDiscount)
     return
 
 
-def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def writeOperations(template: PayloadTemplates.PayloadTemplate, timeTakenList: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int):
     # Execute write operations: update price and discount
 
     thread_identity = threading.get_ident()
@@ -267,36 +267,27 @@ def writeOperations(catalogItem: dict, discountItem: dict, timeTakenList: dict,
     discount = price // 10
 
     # Update the price and discount on the catalog item and discount item
-    updatePriceAndDiscount(catalogItem, discountItem, price, discount, timeTakenList, successCount, logger)
+    updatePriceAndDiscount(template, price, discount, timeTakenList, successCount, logger, events, key)
 
     return
 
 
-def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, discount: int, timeTakenList: dict, successCount: dict, logger: logging.Logger):
+def updatePriceAndDiscount(template: PayloadTemplates.PayloadTemplate, price: int, discount: int, timeTakenList: dict, successCount: dict, logger: logging.Logger, events: EventStream.EventWriter, key: int):
     # Contact the frontend service and update the price and discount of the item
 
-    # Update the price on the catalog item
-    catalogItem["price"] = price
-
-    # update the discount value on the discount item
-    discountItem["discountValue"] = discount
-
-    # Build the payload
-    payload = {
-        "CatalogItem": catalogItem,
-        "DiscountItem": discountItem, 
-    }
+    # Build the payload, filling the price and discount in the pre-encoded payload of the catalog row
+    payload = template.render(price=price, discount=discount)
 
     address = 'http://localhost:' + thesisFrontendPort + '/api/v1/frontend/updatepricediscount'
 
     # Measure time taken to send request with nano seconds precision
-    start = time.time_ns()
+    start = perf_counter_ns()
 
     success = False
     while not success:
         try:
             # Send request
-            response = requests.put(address, json=payload)
+            response = HttpClientPool.session().put(address, data=payload, headers=PayloadTemplates.jsonHeaders)
             if(response.status_code == 200): 
                 success = True
         except:
@@ -306,19 +297,19 @@ def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, di
             continue
     
     # Stop timer
-    end = time.time_ns()
+    end = perf_counter_ns()
 
     # Calculate time taken
     timeTaken = end - start
 
     success = False
 
-    # Log the time taken in milliseconds
-    logger.info("Write Ops: Time taken: " + str(timeTaken / 1000000) + " milliseconds")
-
     # Get thread ID
     identity = threading.get_ident()
 
+    # Record the operation and the price and discount it wrote in the event stream
+    events.emit(EventStream.WRITE, str(identity), key, start, start, timeTaken, response.status_code, price, discount)
+
     # Add time taken to list
     if identity not in timeTakenList:
         timeTakenList[identity] = [timeTaken]
@@ -336,7 +327,7 @@ def updatePriceAndDiscount(catalogItem: dict, discountItem: dict, price: int, di
         return
 
 
-def exec_functionality(testNum: int, catalogItems: list[dict], discountItems: list[dict], read_write_list: list, timeTakenList: dict, successCount: dict, secondsToRun: int, logger: logging.Logger, throughput: int, basket_IDs_assigned: dict, contention: str):
+def exec_functionality(testNum: int, templates: list[PayloadTemplates.PayloadTemplate], keys: KeyDistributions.KeySelector, read_write_list: list, timeTakenList: dict, successCount: dict, secondsToRun: int, logger: logging.Logger, events: EventStream.EventWriter, throughput: int, basket_IDs_assigned: dict, contention: str):
     # sleep_time = 0.50 * random.random() 
     # sleep_time = 0.3 # Using sleep causes the threads to awake in block -> higher lat and lower throughput
     
@@ -345,49 +336,26 @@ def exec_functionality(testNum: int, catalogItems: list[dict], discountItems: li
     start_test_time = time.time()
 
     while time.time() < start_test_time + secondsToRun:
-        # Get a random index from the list of catalog items and discount items
-        index = random.randint(0, len(catalogItems) - 1)
+        # Pick the catalog row (and its basket) of the operation from the key distribution
+        index = keys.next_key()
         # Assign read/write operations to thread based on read_write_ratio
         random_choice = random.choice(read_write_list)
         if random_choice == 0:
             # Read operation
             readOperationsCount += 1
-            readBasket(timeTakenList, successCount, logger, f"basket{index}", contention)
+            readBasket(timeTakenList, successCount, logger, events, index, contention)
             # time.sleep(sleep_time)
         else:
             # Write operation
             writeOperationsCount += 1
-            writeOperations(copy.deepcopy(catalogItems[index]), copy.deepcopy(discountItems[index]), timeTakenList, successCount, logger)
+            writeOperations(templates[index], timeTakenList, successCount, logger, events, index)
             # time.sleep(sleep_time)
 
 
-def check_discount_from_log_file(file_path):
-    pattern = r'Price {([\d.]+)}, Discount: {([\d.]+)}'
-    results = {'OK': 0, 'anomalies': 0}
-    anomaly_line_presence = []
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            # Using regex, check if the line matches the pattern
-            match = re.search(pattern, line)
-
-            # If the line matches the pattern, check if the discount is 10% of the price
-            if match:
-                price = float(match.group(1))
-                discount = float(match.group(2))
-                if discount == price * 0.1:
-                    results['OK'] += 1
-                else:
-                    results['anomalies'] += 1
-                    anomaly_line_presence.append(line)
-
-    return results, anomaly_line_presence
-
-
 # Create predefined list of prices and discounts to be used in tests equal to the number of threads
 prices = [10000000 * (i+1) for i in range(numThreads)]
 discounts = [prices[i] // 10 for i in range(numThreads)]
-basket_IDs = ["basket" + str(i) for i in range(numThreads)]
+basket_IDs = ["basket" + str(i) for i in range(max(numThreads, contention_rows))]
 
 thread_price_discount = {}
 
@@ -397,8 +365,6 @@ def main():
     wrappers = sys.argv[2] # 0 for no wrappers, 1 for wrappers
     test_logging_path = configureRootLogger(contention, wrappers)
     # microDiscountTest()
-    # Define Global HTTP Client
-    http = requests.Session()
 
     # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
     if(contention == "0"):
@@ -417,6 +383,11 @@ def main():
     for index, (catalogItem, discountItem) in enumerate(zip(catalogItems, discountItems)):
         AddCatalogItemToBasket(catalogItem, discountItem, basket_IDs[index])
 
+    # Encode the update payload of each catalog row once, only the price and discount are filled in per request
+    templates = PayloadTemplates.update_price_discount_templates(catalogItems, discountItems)
+    # Sampler of the catalog row each operation touches, shared by the client threads
+    keys = KeyDistributions.KeySelector(len(templates), key_distribution)
+
     # Store the results of the tests for each read/write ratio
     resultsList = []
 
@@ -436,6 +407,8 @@ def main():
         # Configure logging settings for each read/write ratio test
         logger, log_file = ConfigureLoggingSettings(testNum, throughput, test_logging_path)
         logger.log(logging.INFO, "Logging")
+        # Per-operation events of the test, written next to the test log
+        events_path = EventStream.event_stream_path(log_file, event_format)
 
         # Create a single dictionary with an entry for each thread. Each thread is assigned a list of time taken and success count
         timeTakenList = {}
@@ -449,10 +422,16 @@ def main():
         readOperationsCount = 0
         writeOperationsCount = 0
 
+        # Snapshot the connection counters, to report the connections opened and reused during this test
+        connectionsBefore = HttpClientPool.connection_counters()
+
+        # Writer of the per-operation events, encoding and writing them on a background thread
+        events = EventStream.EventWriter(events_path)
+
         clients = []
         # Create 30 Clients
         for _ in range(testNum):
-            client = threading.Thread(target=exec_functionality, args=(testNum, catalogItems, discountItems, read_write_list, timeTakenList, successCount, secondsToRun, logger, throughput, basket_IDs_assigned, contention))
+            client = threading.Thread(target=exec_functionality, args=(testNum, templates, keys, read_write_list, timeTakenList, successCount, secondsToRun, logger, events, throughput, basket_IDs_assigned, contention))
             clients.append(client)
 
         # Start the threads
@@ -462,6 +441,8 @@ def main():
         # Wait for all threads to finish
         for client in clients:
             client.join()
+        # Write the events still buffered, every operation of the test finished
+        events.close()
 
         # Open RESULTS log tag
         logger.info("-------------TEST RESULTS-------------")
@@ -469,6 +450,7 @@ def main():
         logger.info("Test with: " + str(testNum) + " concurrent Client. Sleeping for" + str(90) + "ms." )
 
         logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+        logger.info("Key distribution: " + key_distribution + " over " + str(len(templates)) + " rows")
 
         # Calculate total time taken
         total_active_time_taken = sum([sum(timeTakenList[i]) for i in timeTakenList])
@@ -505,7 +487,12 @@ def main():
         # Log the average functionalities per seconds
         logger.info("Functionalities per second: " + str((readOperationsCount + writeOperationsCount) / (secondsToRun)))
 
-        results, anomaly_line_presence = check_discount_from_log_file(log_file)
+        # Log how many connections were opened and reused during the test
+        HttpClientPool.log_connection_counters(logger, HttpClientPool.subtract_counters(HttpClientPool.connection_counters(), connectionsBefore))
+
+        # Coherent reads and anomalies counted from the reads of the event stream, with a bounded sample of the anomalies
+        coherence = EventStream.check_discount_from_events([events_path])
+        results, anomaly_line_presence = coherence.counts(), coherence.anomaly_lines()
         resultsList.append(results)
         anomalyLinePresenceList.append(anomaly_line_presence)
         # Log the results
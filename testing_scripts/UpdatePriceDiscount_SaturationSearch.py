@@ -0,0 +1,167 @@
+import datetime
+import json
+import logging
+import os
+import sys
+import EventStream
+import KeyDistributions
+import LiveMetrics
+import LoadEngine
+import SaturationSearch
+import TimeSeries
+import UpdatePriceDiscount_Inconsistencies_VS_Throughput as ThroughputTest
+
+"""	This script searches the saturation point of the UpdatePriceDiscount / ReadBasket functionalities.
+    Instead of sweeping every load level, it finds the highest load that keeps the p(95) response time within the SLO
+    and the anomaly rate under the ceiling, probing with a coarse-to-fine search (see SaturationSearch.py).
+    The load is either a target throughput (open loop, "rate") or a number of concurrent clients (closed loop, "clients").
+    Usage: python UpdatePriceDiscount_SaturationSearch.py <contention 0|1> <wrappers 0|1> [rate|clients]
+"""
+secondsToRun = 20 # Base duration of each probe, extended when a probe has too few samples
+warmupSeconds = 5 # Seconds of load before each probe that are not measured, so probes measure the steady state
+read_write_ratio = 2 # Scale of 0 to 10, 0 being 100% read, 10 being 100% write
+contention_rows = 24 # Number of rows to be used in the low contention test
+key_distribution = KeyDistributions.UNIFORM # Rows picked by the operations, see KeyDistributions.py
+arrival_process = "constant" # Arrival process of the operations: "constant" or "poisson"
+numProcesses = 1 # Number of load generator processes
+metrics_port = 0 # Port of the live /metrics endpoint (see LiveMetrics.py, e.g. 9464), the load generator processes use the next ports. 0 to disable
+
+p95_slo_ms = 200 # p(95) response time objective, in milliseconds
+max_anomaly_rate = 0.05 # Highest tolerated ratio of anomalous reads
+minSamples = SaturationSearch.defaultMinSamples # Minimum number of measured operations per probe
+
+startThroughput = 40 # First probe of the "rate" search, in functionalities per second
+maxThroughput = 2000
+throughputResolution = 10 # The search stops when the knee is known within this many functionalities per second
+
+startClients = 1 # First probe of the "clients" search
+maxClients = 1600
+clientsResolution = 4
+
+
+def configureRootLogger(contention: str, wrappers: str, mode: str) -> str:
+    # Configure root logger
+    current_directory = os.path.dirname(os.path.abspath(__file__))
+    base_logging_path = os.path.join(current_directory, 'logs')
+    os.makedirs(base_logging_path, exist_ok=True)  # Create the log directory if it doesn't exist
+    timestamp = datetime.datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+
+    if wrappers == "1":
+        test_logging_path = os.path.join(base_logging_path, f"Wrap_UpdPriceDiscount_SatSearch_{mode}_{contention}_Cont_" + timestamp)
+    else:
+        test_logging_path = os.path.join(base_logging_path, f"NoWrap_UpdPriceDiscount_SatSearch_{mode}_{contention}_Cont_" + timestamp)
+
+    os.makedirs(test_logging_path, exist_ok=True)  # Create the test directory if it doesn't exist
+    log_file_name = f"{timestamp}.log" # root log file name
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s', filename=os.path.join(test_logging_path, log_file_name), filemode='w')
+    return test_logging_path
+
+
+def ConfigureLoggingSettings(probeNum: int, mode: str, target: float, test_logging_path: str) -> tuple:
+    # Configure logging settings
+    log_file_name = f"Probe<{probeNum}> {mode}-{target}.log"
+    logger_name = f"Probe<{probeNum}> {mode}-{target}"
+    log_file_path = os.path.join(test_logging_path, log_file_name)
+
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+
+    file_handler = logging.FileHandler(log_file_path)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger, log_file_path
+
+
+def main():
+    contention = sys.argv[1] # 0 for low contention, 1 high contention
+    wrappers = sys.argv[2] # 0 for no wrappers, 1 for wrappers
+    mode = sys.argv[3] if len(sys.argv) > 3 else "rate" # "rate" for open loop probes, "clients" for closed loop probes
+    test_logging_path = configureRootLogger(contention, wrappers, mode)
+
+    # Define Global Catalog Item to be used in tests, necessary to fetch Catalog Item Name, Brand ID and Type ID
+    if(contention == "0"):
+        # low contention
+        catalogItemIDs = [i for i in range(1, contention_rows + 1)]
+    else:
+        # high contention
+        catalogItemIDs = [1]
+
+    # Get the catalog items and the matching discount items, and add each pair to the basket
+    catalogItems = ThroughputTest.QueryCatalogItemById(catalogItemIDs)
+    discountItems = ThroughputTest.QueryDiscountItemById(catalogItems)
+    for index, (catalogItem, discountItem) in enumerate(zip(catalogItems, discountItems)):
+        ThroughputTest.AddCatalogItemToBasket(catalogItem, discountItem, "basket" + str(index))
+
+    read_ratio = (10 - read_write_ratio) * 10
+    write_ratio = 100 - read_ratio
+    read_write_list = [1 for _ in range(read_write_ratio)] + [0 for _ in range(10 - read_write_ratio)]
+
+    # Serve the live metrics of the search while it runs
+    if metrics_port:
+        LiveMetrics.start_metrics_server(metrics_port)
+
+    # Start the load generator processes, kept for the whole search
+    engine = LoadEngine.ProcessPoolEngine(numProcesses, metrics_port=metrics_port)
+
+    # Warm-up load is not measured, it has no event stream and logs to a logger that discards its records
+    warmupLogger = logging.getLogger("SaturationSearch.warmup")
+    warmupLogger.setLevel(logging.WARNING)
+    warmupLogger.propagate = False
+
+    def run_step(target, seconds: float, logger: logging.Logger, events_path: str = None) -> dict:
+        if mode == "clients":
+            return engine.run_virtual_users(target, catalogItems, discountItems, read_write_list, seconds, logger, key_distribution=key_distribution, events_path=events_path)
+        return engine.run_arrival_rate(target, catalogItems, discountItems, read_write_list, seconds, logger, arrival_process, key_distribution=key_distribution, events_path=events_path)
+
+    probeNum = 0
+
+    def run_probe(target, seconds: float) -> dict:
+        nonlocal probeNum
+        probeNum += 1
+        logger, log_file = ConfigureLoggingSettings(probeNum, mode, target, test_logging_path)
+        events_path = EventStream.event_stream_path(log_file)
+        LiveMetrics.set_step("Probe " + str(probeNum) + ": " + mode + " " + str(target))
+
+        # Bring the service to the steady state of this load before measuring it
+        if warmupSeconds > 0:
+            run_step(target, warmupSeconds, warmupLogger)
+        stepResults = run_step(target, seconds, logger, events_path)
+
+        # Open RESULTS log tag
+        logger.info("-------------TEST RESULTS-------------")
+        logger.info(("Clients: " if mode == "clients" else "Throughput: ") + str(target) + (" concurrent clients." if mode == "clients" else " req/sec."))
+        logger.info("Read: " + str(read_ratio) + "%, Write: " + str(write_ratio) + "%")
+        logger.info("Key distribution: " + key_distribution + " over " + str(len(catalogItems)) + " rows")
+        LoadEngine.log_step_summary(logger, stepResults, seconds)
+        LoadEngine.save_step_histograms(stepResults, log_file)
+        # Save the per-second series of the probe, from its event stream
+        TimeSeries.save_step_time_series(log_file, events_path)
+
+        # Coherence counted as the baskets were read
+        results = stepResults["coherence"].counts()
+        logger.info("Results: " + str(results['OK']) + " OK Reads, " + str(results['anomalies']) + " Anomalies")
+
+        probe = SaturationSearch.evaluate_probe(target, stepResults, results, seconds, p95_slo_ms, max_anomaly_rate, mode != "clients")
+        logger.info("Probe: " + ("PASS" if probe["passed"] else "FAIL (" + probe["reason"] + ")"))
+        logger.info("=========================================")
+        return probe
+
+    if mode == "clients":
+        search = SaturationSearch.SaturationSearch(run_probe, startClients, maxClients, clientsResolution, secondsToRun, integer=True, min_samples=minSamples)
+        unit = "clients"
+    else:
+        search = SaturationSearch.SaturationSearch(run_probe, startThroughput, maxThroughput, throughputResolution, secondsToRun, integer=True, min_samples=minSamples)
+        unit = "req/sec."
+    report = search.run()
+    engine.close()
+
+    # Log the sampled points and the knee, and keep them next to the probe logs for plotting
+    SaturationSearch.log_search_report(logging.getLogger(), report, unit)
+    with open(os.path.join(test_logging_path, "saturation_search.json"), 'w') as file:
+        json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    # Call main function
+    main()
@@ -1,9 +1,12 @@
 import http from "k6/http";
 import { sleep } from "k6";
-import { Counter } from "k6/metrics";
+import { Counter, Trend } from "k6/metrics";
 
 const baseUrl = 'http://localhost:5101/api/v1/Catalog/items';
 const writeOperationCounter = new Counter("Write_Operations");
+const updateOperationDuration = new Trend("Update_operation_duration", true);
+// Console log of every operation, only for the runs recorded with --console-output (k6 run -e LOG_OPERATIONS=true)
+const logOperations = __ENV.LOG_OPERATIONS === "true";
 
 
 export let options = {
@@ -58,8 +61,11 @@ export default function(body) {
     }
     const end = new Date().getTime();
     const duration = end - start;
-    // Log current date with milliseconds precision
-    console.log(`Date: ${new Date().getTime()} Update operation duration: ${duration}`);
+    // Record the operation duration (timestamped by k6), and log it with the current date in milliseconds precision
+    updateOperationDuration.add(duration);
+    if (logOperations) {
+        console.log(`Date: ${new Date().getTime()} Update operation duration: ${duration}`);
+    }
     writeOperationCounter.add(1);
     // sleep(1);
 }
\ No newline at end of file
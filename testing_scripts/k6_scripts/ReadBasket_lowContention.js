@@ -1,6 +1,6 @@
 import http from "k6/http";
 import { sleep } from "k6";
-import { Counter } from "k6/metrics";
+import { Counter, Trend } from "k6/metrics";
 import { check } from "k6";
 
 
@@ -8,6 +8,9 @@ const readBasketUrl = 'http://localhost:5142/api/v1/frontend/readbasket?basketId
 const addItemToBasketUrl = 'http://localhost:5142/api/v1/frontend/additemtobasket';
 
 const readOperationCounter = new Counter("Read_Operations");
+const readOperationDuration = new Trend("Read_operation_duration", true);
+// Console log of every operation, only for the runs recorded with --console-output (k6 run -e LOG_OPERATIONS=true)
+const logOperations = __ENV.LOG_OPERATIONS === "true";
 
 const numBaskets = 6;
 
@@ -66,8 +69,11 @@ export function readBasket() {
     }
     const end = new Date().getTime();
     const duration = end - start;
-    // Log current date with milliseconds precision
-    console.log(`Date: ${new Date().getTime()} Read operation duration: ${duration}`);
+    // Record the operation duration (timestamped by k6), and log it with the current date in milliseconds precision
+    readOperationDuration.add(duration);
+    if (logOperations) {
+        console.log(`Date: ${new Date().getTime()} Read operation duration: ${duration}`);
+    }
     readOperationCounter.add(1);
     sleep(1);
 }
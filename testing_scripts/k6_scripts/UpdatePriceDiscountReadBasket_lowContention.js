@@ -1,6 +1,6 @@
 import http from "k6/http";
 import { sleep } from "k6";
-import { Counter } from "k6/metrics";
+import { Counter, Trend, Rate } from "k6/metrics";
 import { check } from "k6";
 
 const baseUrl = 'http://localhost:5142/api/v1/frontend/updatepricediscount';
@@ -12,6 +12,11 @@ const addItemToBasketUrl = 'http://localhost:5142/api/v1/frontend/additemtobaske
 
 const readOperationCounter = new Counter("Read_Operations");
 const writeOperationCounter = new Counter("Write_Operations");
+const readOperationDuration = new Trend("Read_operation_duration", true);
+const updateOperationDuration = new Trend("Update_operation_duration", true);
+const priceCoherentRate = new Rate("price_coherent");
+// Console log of every operation, only for the runs recorded with --console-output (k6 run -e LOG_OPERATIONS=true)
+const logOperations = __ENV.LOG_OPERATIONS === "true";
 
 const numBaskets = 21;
 
@@ -598,11 +603,17 @@ export function readBasket() {
         const discount = basket.items[0].discount;
 
         if(price === (discount * 10)) {
-            console.log(`VU: ${__VU}, iteration: ${iterations}, price: ${price}, discount: ${discount}, price is coherent`)
+            priceCoherentRate.add(true);
+            if (logOperations) {
+                console.log(`VU: ${__VU}, iteration: ${iterations}, price: ${price}, discount: ${discount}, price is coherent`)
+            }
             success = true;
         } 
         else {
-            console.log(`VU: ${__VU}, iteration: ${iterations}, price: ${price}, discount: ${discount}, price is not coherent`)
+            priceCoherentRate.add(false);
+            if (logOperations) {
+                console.log(`VU: ${__VU}, iteration: ${iterations}, price: ${price}, discount: ${discount}, price is not coherent`)
+            }
             sleep(1);
         }
         check(res, {
@@ -615,8 +626,11 @@ export function readBasket() {
     check((basket), {
         "is price coherent": (basket) => basket.items[0].unitPrice === (basket.items[0].discount * 10),
     });
-    // Log current date with milliseconds precision
-    console.log(`Date: ${new Date().getTime()} Read operation duration: ${duration} VU: ${__VU}, Iterations taken: ${iterations}`);
+    // Record the operation duration (timestamped by k6), and log it with the current date in milliseconds precision
+    readOperationDuration.add(duration);
+    if (logOperations) {
+        console.log(`Date: ${new Date().getTime()} Read operation duration: ${duration} VU: ${__VU}, Iterations taken: ${iterations}`);
+    }
     // console.log(`VU: ${__VU}, Iterations taken: ${iterations}`);
     readOperationCounter.add(1);
     sleep(1);
@@ -646,9 +660,12 @@ export function updatePriceAndDiscount(body) {
     }
     const end = new Date().getTime();
     const duration = end - start;
-    // Log current date with milliseconds precision
-    console.log(`Date: ${new Date().getTime()} Update operation duration: ${duration}`);
-    console.log(`VU: ${__VU}, Iterations taken: ${iterations}`);
+    // Record the operation duration (timestamped by k6), and log it with the current date in milliseconds precision
+    updateOperationDuration.add(duration);
+    if (logOperations) {
+        console.log(`Date: ${new Date().getTime()} Update operation duration: ${duration}`);
+        console.log(`VU: ${__VU}, Iterations taken: ${iterations}`);
+    }
     writeOperationCounter.add(1);
     sleep(1);
 }
@@ -0,0 +1,120 @@
+import numpy as np
+
+"""	Bootstrap confidence intervals of the median, p(95) and abort rate of a test (one VU level of a system).
+    A test can have several repeats (<vus>_<i>.txt), so the resampling has two levels: the runs of the test are drawn
+    with replacement, to capture the variation between repeats, then the samples of the drawn runs are drawn with
+    replacement. Nothing is resampled element by element:
+        - The q-quantile of a resample of n values is its k-th smallest value (k = ceil(q * n), nearest rank), and the
+          k-th smallest of n uniform draws over the sorted values is the value at index ceil(n * B), with B following
+          a Beta(k, n - k + 1) distribution. Each replicate is one Beta draw and one search of the value of that rank
+          in the pooled latencies of its runs: the number of times each replicate drew each run is one matrix, and the
+          ranks of every replicate are searched together, counting the values at or below a candidate with one
+          searchsorted per run over its sorted latencies.
+        - The incoherent reads of a resample of the checked reads follow a binomial distribution.
+    The replicates of every statistic are kept, so derived statistics (such as the µTCC / BaseTCC penalty ratio) get
+    their own interval from the replicates of two tests (see ratio_interval).
+"""
+bootstrapResamples = 2000 # Replicates of each statistic
+confidenceLevel = 0.95
+bootstrapSeed = 0 # Fixed, so the figures are reproducible (combined with the runs of each test, see bootstrap_test)
+bootstrapPercentiles = {"med": 50, "p(95)": 95}
+
+
+def draw_runs(num_runs: int, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """ Return the runs drawn by each replicate, an array of shape (resamples, num_runs) sorted along each row. """
+    return np.sort(rng.integers(0, num_runs, size=(resamples, num_runs)), axis=1)
+
+
+def run_multiplicities(run_draws: np.ndarray, num_runs: int) -> np.ndarray:
+    """ Return how many times each replicate drew each run, an array of shape (resamples, num_runs). """
+    # One bincount over every replicate, the runs of replicate i counted in the bins i * num_runs to (i + 1) * num_runs
+    offsets = np.arange(len(run_draws), dtype=np.int64)[:, None] * num_runs
+    return np.bincount((run_draws + offsets).reshape(-1), minlength=len(run_draws) * num_runs).reshape(len(run_draws), num_runs)
+
+
+def ranked_values(sorted_runs: list, values: np.ndarray, weights: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """
+    Return the ranks[i, c]-th smallest value (from 1) of the runs weighted by weights[i] (each run counted that many
+    times), for every replicate i and column c. values are the sorted latencies of every run, sorted_runs the sorted
+    latencies of each run. Binary search over values for all the replicates at once: the values at or below a
+    candidate are counted with one searchsorted per run.
+    """
+    low = np.zeros(ranks.shape, dtype=np.int64)
+    high = np.full(ranks.shape, len(values) - 1, dtype=np.int64)
+    while np.any(low < high):
+        middle = (low + high) // 2
+        candidates = values[middle]
+        counts = np.zeros(ranks.shape, dtype=np.int64)
+        for run, latencies in enumerate(sorted_runs):
+            counts += weights[:, run, None] * np.searchsorted(latencies, candidates, side="right")
+        # Smallest value with at least rank values at or below it
+        enough = counts >= ranks
+        high = np.where(enough, middle, high)
+        low = np.where(enough, low, middle + 1)
+    return values[low]
+
+
+def bootstrap_percentiles(latency_arrays: list, percentiles: list, run_draws: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """ Return the replicates of each percentile (0-100) of the latencies, an array of shape (resamples, len(percentiles)). """
+    replicates = np.zeros((len(run_draws), len(percentiles)))
+    sizes = np.array([len(latencies) for latencies in latency_arrays], dtype=np.int64)
+    # Pooled sample size of each replicate, from the number of times it drew each run
+    weights = run_multiplicities(run_draws, len(latency_arrays))
+    n = weights @ sizes
+    drawn = n > 0
+    if not np.any(drawn):
+        return replicates
+    n = n[drawn]
+    # Rank of each percentile of each replicate, k-th smallest of n uniform draws over the pooled sorted latencies
+    ranks = np.zeros((len(n), len(percentiles)), dtype=np.int64)
+    for column, percentile in enumerate(percentiles):
+        k = np.maximum(np.ceil(percentile / 100 * n).astype(np.int64), 1)
+        ranks[:, column] = np.clip(np.ceil(rng.beta(k, n - k + 1) * n), 1, n)
+    sorted_runs = [np.sort(latencies) for latencies in latency_arrays]
+    replicates[drawn] = ranked_values(sorted_runs, np.sort(np.concatenate(latency_arrays)), weights[drawn], ranks)
+    return replicates
+
+
+def bootstrap_abort_rate(coherent: np.ndarray, incoherent: np.ndarray, run_draws: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """ Return the replicates of the abort rate (percentage of incoherent reads) of the runs. """
+    checked = (coherent + incoherent)[run_draws].sum(axis=1)
+    rates = np.divide(incoherent[run_draws].sum(axis=1), checked, out=np.zeros(len(checked)), where=checked > 0)
+    return np.divide(rng.binomial(checked, rates), checked, out=np.zeros(len(checked)), where=checked > 0) * 100
+
+
+def bootstrap_test(latency_arrays: list, coherent: list, incoherent: list, run_ids: list = (), resamples: int = bootstrapResamples) -> dict:
+    """
+    Return the replicates of the median, p(95) and abort rate of a test, from the steady state latencies and the
+    coherent and incoherent read counts of each of its runs. The random draws are seeded with bootstrapSeed and
+    run_ids (identifiers of the runs), so the replicates of a test are reproducible and independent of other tests.
+    """
+    rng = np.random.default_rng([bootstrapSeed] + [int(run_id) for run_id in run_ids])
+    run_draws = draw_runs(len(latency_arrays), resamples, rng)
+    columns = bootstrap_percentiles(latency_arrays, list(bootstrapPercentiles.values()), run_draws, rng)
+    replicates = {name: columns[:, column] for column, name in enumerate(bootstrapPercentiles)}
+    if sum(coherent) + sum(incoherent) > 0:
+        replicates["abort_rate"] = bootstrap_abort_rate(np.array(coherent, dtype=np.int64), np.array(incoherent, dtype=np.int64), run_draws, rng)
+    return replicates
+
+
+def confidence_interval(replicates: np.ndarray, level: float = confidenceLevel) -> tuple:
+    # Percentile interval of the replicates
+    low, high = np.percentile(replicates, [(1 - level) / 2 * 100, (1 + level) / 2 * 100])
+    return float(low), float(high)
+
+
+def confidence_intervals(replicates: dict, level: float = confidenceLevel) -> dict:
+    return {name: confidence_interval(values, level) for name, values in replicates.items()}
+
+
+def ratio_interval(numerator_replicates: np.ndarray, denominator_replicates: np.ndarray, level: float = confidenceLevel) -> tuple:
+    """
+    Return the confidence interval of the ratio of two statistics of independent tests (a penalty ratio), from
+    their replicates. A ratio of 1 outside the interval means the difference is not explained by the run to run noise.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = numerator_replicates / denominator_replicates
+    ratios = ratios[np.isfinite(ratios)]
+    if len(ratios) == 0:
+        return float("nan"), float("nan")
+    return confidence_interval(ratios, level)
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import numpy as np
+
+"""	Readers of the machine readable output of k6, instead of its console output.
+    The run logs used to be the console of k6: every operation of every VU printed a "Date: ... operation duration"
+    line, and the coherence of each read a "price is (not) coherent" line, which costs the VUs a console write per
+    request and ties the parsers to the wording of the k6 scripts and of the k6 end of test summary. The k6 scripts now
+    record the same measures as k6 metrics:
+        - <Operation>_operation_duration Trends (Read, Update), one point per operation, in ms
+        - the price_coherent Rate, one point per read of a basket (1 if its price and discount are coherent)
+    and the runs are written with --out json=<vus>_<i>.json.gz (one JSON object per line, gzip compressed by k6) and
+    --summary-export <vus>_<i>_summary.json (the end of test summary, as JSON).
+    The metric points file is streamed: only the lines of the metrics above (and of the iterations Counter) are found
+    by a regular expression over whole chunks of the file and decoded, the http_req_* points of every request are skipped
+    without being decoded. Their RFC 3339 times (local time with an offset, in ns) are converted to ms since the epoch
+    in one numpy pass, as the dates of the console logs. See run_parser.parse_json_file for the parsed run.
+"""
+operationMetricSuffix = "_operation_duration"
+coherenceMetric = "price_coherent"
+iterationsMetric = "iterations"
+coherenceCheck = "is price coherent" # Check of the k6 scripts, in the summary exports
+jsonOutputPattern = re.compile(r"\.(?:json|ndjson)(?:\.gz|\.zst)?$")
+summaryExportSuffix = "_summary.json"
+
+# Lines of the metric points parsed by run_parser.parse_json_file, matched over whole chunks of the file
+pointLinePattern = re.compile(rb'^.*"metric":"(?:\w+' + operationMetricSuffix.encode() + rb'|' + coherenceMetric.encode() + rb'|' + iterationsMetric.encode() + rb')".*$', re.MULTILINE)
+timeOffsetPattern = re.compile(r"([+-])(\d\d):(\d\d)$")
+
+
+def is_json_output(file_path: str) -> bool:
+    # Metric points file of k6 (--out json), possibly compressed, rather than a console log
+    return jsonOutputPattern.search(file_path) is not None and not file_path.endswith(summaryExportSuffix)
+
+
+def operation_name(metric: str) -> str:
+    """ Return the operation of an operation duration metric (Read for Read_operation_duration), or None for other metrics. """
+    if not metric.endswith(operationMetricSuffix):
+        return None
+    return metric[:-len(operationMetricSuffix)]
+
+
+def parse_points(chunk: bytes) -> list[tuple]:
+    """ Return the (metric, time, value) of the points of the operation, coherence and iterations metrics in a chunk of whole lines. """
+    points = []
+    for line in pointLinePattern.findall(chunk):
+        record = json.loads(line)
+        # The metric definitions ("type": "Metric") share the metric name of their points
+        if record.get("type") == "Point":
+            points.append((record["metric"], record["data"]["time"], record["data"]["value"]))
+    return points
+
+
+def timestamps_ms(times: list) -> np.ndarray:
+    """ Return the RFC 3339 times of k6 ("2024-03-01T10:11:12.123456789+01:00", or with a Z) as int64 ms since the epoch. """
+    local_times = []
+    offsets_minutes = []
+    for time in times:
+        offset = timeOffsetPattern.search(time)
+        if offset:
+            local_times.append(time[:offset.start()])
+            sign = -1 if offset.group(1) == "-" else 1
+            offsets_minutes.append(sign * (int(offset.group(2)) * 60 + int(offset.group(3))))
+        else:
+            local_times.append(time.rstrip("Z"))
+            offsets_minutes.append(0)
+    dates = np.array(local_times, dtype="datetime64[ns]").astype("datetime64[ms]").astype(np.int64)
+    return dates - np.array(offsets_minutes, dtype=np.int64) * 60000
+
+
+def _members(collection) -> list:
+    # k6 exports the checks and groups of a group as dictionaries by name (older versions as lists)
+    return list(collection.values()) if isinstance(collection, dict) else list(collection)
+
+
+def check_counts(group: dict, check_name: str) -> tuple:
+    # Passes and fails of a check over a group of the summary export and its nested groups
+    passes, fails = 0, 0
+    for check in _members(group.get("checks", {})):
+        if check.get("name") == check_name:
+            passes += check.get("passes", 0)
+            fails += check.get("fails", 0)
+    for subgroup in _members(group.get("groups", {})):
+        subgroup_passes, subgroup_fails = check_counts(subgroup, check_name)
+        passes += subgroup_passes
+        fails += subgroup_fails
+    return passes, fails
+
+
+def read_summary_export(file_path: str) -> dict:
+    """
+    Return the measures of a k6 summary export (--summary-export), over the whole run:
+        - Latency statistics of each operation (avg, min, med, max, p(90), p(95)), and of every request (http_req_duration)
+        - Coherent and incoherent reads (price_coherent Rate, or the "is price coherent" check for older scripts)
+        - Number of k6 iterations
+    """
+    with open(file_path, "r") as f:
+        export = json.load(f)
+    metrics = export.get("metrics", {})
+    summary = {"latency": {}, "http_req_duration": metrics.get("http_req_duration", {}), "coherent": 0, "incoherent": 0,
+               "iterations": int(metrics.get(iterationsMetric, {}).get("count", 0))}
+    for metric, values in metrics.items():
+        operation = operation_name(metric)
+        if operation is not None:
+            summary["latency"][operation] = values
+    if coherenceMetric in metrics:
+        summary["coherent"] = metrics[coherenceMetric].get("passes", 0)
+        summary["incoherent"] = metrics[coherenceMetric].get("fails", 0)
+    else:
+        summary["coherent"], summary["incoherent"] = check_counts(export.get("root_group", {}), coherenceCheck)
+    return summary
+
+
+def summary_exports(directory: str) -> list[tuple]:
+    """ Return the (VUs, path) of the summary exports (<vus>[_<i>]_summary.json) of a directory, sorted by VUs. """
+    exports = []
+    for file_name in os.listdir(directory):
+        vus = re.match(r"^(\d+)(?:_\d+)?" + re.escape(summaryExportSuffix) + "$", file_name)
+        if vus:
+            exports.append((int(vus.group(1)), os.path.join(directory, file_name)))
+    return sorted(exports)
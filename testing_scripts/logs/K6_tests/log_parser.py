@@ -4,6 +4,10 @@ import re
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+import bootstrap
+import k6_output
+import results_db
+import run_parser
 
 MIX_FUNCS = 1
 READ_BASKET_FUNC = 2
@@ -14,6 +18,9 @@ MIX_FUNCS_VERSIONS_HIGH = 6
 MIX_FUNCS_VERSIONS_LOW = 7
 MEMORY_TEST_LOW = 8
 
+TESTED_SYSTEMS = ["µTCC", "BaseTCC"]
+MEMORY_TEST_SERVICES = ["catalog", "basket", "discount", "coordinator"]
+
 def match_throughput(lines):
     # Match the 95th percentile
 
@@ -65,6 +72,23 @@ def match_anomalies_throughput(lines, log_file):
     return anomalies_values, throughput_values
 
 
+def match_summary_exports(directory):
+    # Same values as match_throughput and match_anomalies_throughput, from the k6 summary exports (<vus>_summary.json) of a directory
+
+    # Get the throughput values
+    throughput_values = []
+    latency_values = []
+    anomalies_values = []
+    for vus, export_path in k6_output.summary_exports(directory):
+        summary = k6_output.read_summary_export(export_path)
+        throughput_values.append(vus)
+        latency_values.append(float(summary["http_req_duration"].get("p(95)", 0)))
+        checked_reads = summary["coherent"] + summary["incoherent"]
+        anomalies_values.append(summary["incoherent"] / checked_reads * 100 if checked_reads > 0 else 0)
+
+    return latency_values, anomalies_values, throughput_values
+
+
 def clean_data(log_files):
 
 
@@ -78,19 +102,23 @@ def plot_anomalies_throughput(log_files):
     log_anomalies = []
     log_throughputs = []
     for log_file in log_files:
-        with open(log_file, "r") as f:
-            lines = f.readlines()
-            anomalies, throughputs = match_anomalies_throughput(lines, log_file)
-
-            cwd = os.getcwd() + "/testing_scripts/logs/K6_tests/parsed_logs"
-            log_file_name = os.path.basename(log_file) + "_anomalies"
-
-            # Store the throughput values in a file in a "parsed logs" folder
-            with open(os.path.join(cwd, log_file_name), "w") as output_file:
-                for index, value in enumerate(throughputs):
-                    output_file.write("Test "+ str(value) + ": anomalies ratio=" + str(anomalies[index]) + "\n")
-            log_anomalies.append(anomalies)
-            log_throughputs.append(throughputs)
+        if os.path.isdir(log_file):
+            # Directory of k6 summary exports
+            _, anomalies, throughputs = match_summary_exports(log_file)
+        else:
+            with open(log_file, "r") as f:
+                lines = f.readlines()
+                anomalies, throughputs = match_anomalies_throughput(lines, log_file)
+
+        cwd = os.getcwd() + "/testing_scripts/logs/K6_tests/parsed_logs"
+        log_file_name = os.path.basename(os.path.normpath(log_file)) + "_anomalies"
+
+        # Store the throughput values in a file in a "parsed logs" folder
+        with open(os.path.join(cwd, log_file_name), "w") as output_file:
+            for index, value in enumerate(throughputs):
+                output_file.write("Test "+ str(value) + ": anomalies ratio=" + str(anomalies[index]) + "\n")
+        log_anomalies.append(anomalies)
+        log_throughputs.append(throughputs)
     plot_name = "Anomalies Ratio vs Throughput"
     y_axis_label = "Taxa de Anomalias (%)"
     plot_data(log_anomalies, log_throughputs, plot_name, y_axis_label)
@@ -101,19 +129,23 @@ def plot_latency_throughput(log_files):
     log_latencies = []
     log_throughputs = []
     for log_file in log_files:
-        with open(log_file, "r") as f:
-            lines = f.readlines()
-            latencies, throughputs = match_throughput(lines)
-
-            cwd = os.getcwd() + "/testing_scripts/logs/K6_tests/parsed_logs"
-            log_file_name = os.path.basename(log_file)
-
-            # Store the throughput values in a file in a "parsed logs" folder
-            with open(os.path.join(cwd, log_file_name), "w") as output_file:
-                for index, value in enumerate(throughputs):
-                    output_file.write("Test "+ str(value) + ": p95=" + str(latencies[index]) + "\n")
-            log_latencies.append(latencies)
-            log_throughputs.append(throughputs)
+        if os.path.isdir(log_file):
+            # Directory of k6 summary exports
+            latencies, _, throughputs = match_summary_exports(log_file)
+        else:
+            with open(log_file, "r") as f:
+                lines = f.readlines()
+                latencies, throughputs = match_throughput(lines)
+
+        cwd = os.getcwd() + "/testing_scripts/logs/K6_tests/parsed_logs"
+        log_file_name = os.path.basename(os.path.normpath(log_file))
+
+        # Store the throughput values in a file in a "parsed logs" folder
+        with open(os.path.join(cwd, log_file_name), "w") as output_file:
+            for index, value in enumerate(throughputs):
+                output_file.write("Test "+ str(value) + ": p95=" + str(latencies[index]) + "\n")
+        log_latencies.append(latencies)
+        log_throughputs.append(throughputs)
     plot_name = "Latency (95th percentile) vs Throughput"
     y_axis_label = "Latência (Percentil 95)"
     plot_data(log_latencies, log_throughputs, plot_name, y_axis_label)
@@ -171,6 +203,21 @@ def plot_data(log_latencies, log_throughputs, plot_name, y_axis_label):
     # Save the plot as a png file
     plt.savefig(os.path.join(plots_folder, plot_name)+ ".pdf", format="pdf", bbox_inches="tight")
 
+def confidence_bounds(test_data, measure):
+    # Lower and upper bound of the bootstrap confidence interval of measure ("med", "p(95)" or "abort_rate") of a test
+    return test_data.get("ci", {}).get(measure, (np.nan, np.nan))
+
+
+def plot_error_bars(xy, color):
+    # Error bars of the bootstrap confidence intervals, for the tests that have one
+    with_ci = xy[xy['low'].notna()]
+    if len(with_ci) == 0:
+        return
+    # The point estimate (interpolated) can be just outside the interval of the nearest rank replicates
+    yerr = [np.maximum(with_ci['y'] - with_ci['low'], 0), np.maximum(with_ci['high'] - with_ci['y'], 0)]
+    plt.errorbar(with_ci['x'], with_ci['y'], yerr=yerr, fmt="none", ecolor=color, capsize=3, label="_nolegend_")
+
+
 def plot_READ_only_data(parsed_data, versions, measure):
     default_colors_dict_READ_only = {"BaseTCC_high_ReadBasket_only": "#FF7742", 
                                      "BaseTCC_low_ReadBasket_only": "#3D48AD", 
@@ -216,7 +263,9 @@ def plot_READ_only_data(parsed_data, versions, measure):
                 y_values.append(parsed_data[system_plus_cont][test]["latency"]["med"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], measure) for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         legend_labels.append(default_legend_labels_READ_only[system_plus_cont])
@@ -224,6 +273,7 @@ def plot_READ_only_data(parsed_data, versions, measure):
                     marker = default_markers_READ_only[system_plus_cont], 
                     color=default_colors_dict_READ_only[system_plus_cont],
                     linestyle=default_linestyle_READ_only[system_plus_cont])
+        plot_error_bars(xy, default_colors_dict_READ_only[system_plus_cont])
         
         # Set y min to 0
         plt.ylim(bottom=0, top=90)
@@ -286,7 +336,9 @@ def plot_UPDATE_only_data(parsed_data, versions, measure):
                 y_values.append(parsed_data[system_plus_cont][test]["latency"]["med"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], measure) for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         legend_labels.append(default_legend_labels_UPDATE_only[system_plus_cont])
@@ -294,6 +346,7 @@ def plot_UPDATE_only_data(parsed_data, versions, measure):
                     marker = default_markers_UPDATE_only[system_plus_cont], 
                     color=default_colors_dict_UPDATE_only[system_plus_cont],
                     linestyle=default_linestyle_UPDATE_only[system_plus_cont])
+        plot_error_bars(xy, default_colors_dict_UPDATE_only[system_plus_cont])
         
     plt.legend(legend_labels, loc="upper left")
     # Get the current path and create a folder named "plots" if it doesn't exist
@@ -510,7 +563,9 @@ def plot_version_MIX_data(parsed_data, measure, operation):
                 y_values.append(parsed_data[system_plus_cont][test]["latency"]["med"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], measure) for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         
@@ -520,12 +575,14 @@ def plot_version_MIX_data(parsed_data, measure, operation):
                     marker = default_markers_MIX_high[system_plus_cont],
                     color = default_colors_dict_high[system_plus_cont],
                     linestyle = default_linestyle_MIX_high[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict_high[system_plus_cont])
         elif operation == MIX_FUNCS_VERSIONS_LOW:
             legend_labels.append(default_legend_labels_low[system_plus_cont])
             plt.plot(xy['x'], xy['y'], 
                     marker = default_markers_MIX_low[system_plus_cont],
                     color = default_colors_dict_low[system_plus_cont],
                     linestyle = default_linestyle_MIX_low[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict_low[system_plus_cont])
 
     plt.legend(legend_labels, loc="upper left")
     # Get the current path and create a folder named "plots" if it doesn't exist
@@ -601,7 +658,9 @@ def plot_MIX_data(parsed_data, versions, measure):
                 y_values.append(parsed_data[system_plus_cont][test]["latency"]["avg"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], measure) for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         
@@ -610,6 +669,7 @@ def plot_MIX_data(parsed_data, versions, measure):
                 marker = default_markers_MIX[system_plus_cont],
                 color = default_colors_dict[system_plus_cont],
                 linestyle = default_linestyle_MIX[system_plus_cont])
+        plot_error_bars(xy, default_colors_dict[system_plus_cont])
     
     plt.legend(legend_labels, loc="upper left")
     # Get the current path and create a folder named "plots" if it doesn't exist
@@ -694,7 +754,9 @@ def plot_parsed_data(parsed_data, operation, versions, measure):
                 y_values.append(parsed_data[system_plus_cont][test]["latency"]["med"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], measure) for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         if operation == READ_BASKET_FUNC:
@@ -707,6 +769,7 @@ def plot_parsed_data(parsed_data, operation, versions, measure):
                      marker = default_markers_UPDATE_only[system_plus_cont], 
                      color=default_colors_dict_UPDATE_only[system_plus_cont],
                      linestyle=default_linestyle_UPDATE_only[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict_UPDATE_only[system_plus_cont])
         
         elif operation == VERSION_TESTING_LOW:
             legend_labels.append(default_legend_labels_VERSION_TESTING_low[system_plus_cont])
@@ -714,18 +777,21 @@ def plot_parsed_data(parsed_data, operation, versions, measure):
                      marker = default_markers_VERSION_TESTING_low[system_plus_cont], 
                      color=default_colors_VERSION_TESTING_low[system_plus_cont],
                      linestyle=default_linestyle_VERSION_TESTING_low[system_plus_cont])
+            plot_error_bars(xy, default_colors_VERSION_TESTING_low[system_plus_cont])
         elif operation == VERSION_TESTING_HIGH:
             legend_labels.append(default_legend_labels_VERSION_TESTING_high[system_plus_cont])
             plt.plot(xy['x'], xy['y'],
                      marker = default_markers_VERSION_TESTING_high[system_plus_cont], 
                      color=default_colors_VERSION_TESTING_high[system_plus_cont],
                      linestyle=default_linestyle_VERSION_TESTING_high[system_plus_cont])
+            plot_error_bars(xy, default_colors_VERSION_TESTING_high[system_plus_cont])
         elif operation == MIX_FUNCS:
             legend_labels.append(default_legend_labels[system_plus_cont])
             plt.plot(xy['x'], xy['y'], 
                     marker = default_markers_MIX[system_plus_cont],
                     color = default_colors_dict[system_plus_cont],
                     linestyle = default_linestyle_MIX[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict[system_plus_cont])
         else:
             line_color_format = default_colors_dict[system_plus_cont]
             legend_labels.append(default_legend_labels[system_plus_cont])
@@ -818,7 +884,9 @@ def plot_abort_rate_versions(parsed_data, operation, log_files_measure):
             y_values.append(parsed_data[system_plus_cont][test]["abort_rate"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], "abort_rate") for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         
@@ -828,12 +896,14 @@ def plot_abort_rate_versions(parsed_data, operation, log_files_measure):
                     marker = default_markers_MIX_high[system_plus_cont],
                     color = default_colors_dict_high[system_plus_cont],
                     linestyle = default_linestyle_MIX_high[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict_high[system_plus_cont])
         elif operation == MIX_FUNCS_VERSIONS_LOW:
             legend_labels.append(default_legend_labels_low[system_plus_cont])
             plt.plot(xy['x'], xy['y'], 
                     marker = default_markers_MIX_low[system_plus_cont],
                     color = default_colors_dict_low[system_plus_cont],
                     linestyle = default_linestyle_MIX_low[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict_low[system_plus_cont])
                                 
     plt.legend(legend_labels, loc="upper left")
     # Get the current path and create a folder named "plots" if it doesn't exist
@@ -895,7 +965,9 @@ def plot_abort_rate(parsed_data, operation, versions, log_files_measure):
             y_values.append(parsed_data[system_plus_cont][test]["abort_rate"])
             x_values.append(int(test))
 
-        xy = pd.DataFrame({'x': x_values, 'y': y_values})
+        # Bounds of the bootstrap confidence interval of each test, NaN for the tests without one
+        bounds = [confidence_bounds(parsed_data[system_plus_cont][test], "abort_rate") for test in parsed_data[system_plus_cont]]
+        xy = pd.DataFrame({'x': x_values, 'y': y_values, 'low': [bound[0] for bound in bounds], 'high': [bound[1] for bound in bounds]})
         xy.sort_values('x', inplace=True)
         # Plot the 95th percentile latency by request vs throughput for each test
         if operation == MIX_FUNCS:
@@ -904,6 +976,7 @@ def plot_abort_rate(parsed_data, operation, versions, log_files_measure):
                     marker = default_markers_MIX[system_plus_cont],
                     color = default_colors_dict[system_plus_cont],
                     linestyle = default_linestyle_MIX[system_plus_cont])
+            plot_error_bars(xy, default_colors_dict[system_plus_cont])
         else:
             raise Exception("Operation not supported")
         
@@ -1025,6 +1098,15 @@ def calculate_version_penalty(parsed_data, operation):
         print("Penalty ratio for high contention: VUs:" + test_key + " = " + str(high_cont_penalty_ratio))
 
 
+def penalty_interval(microTCC_test, baseTCC_test, measure):
+    # Bootstrap confidence interval of the µTCC / BaseTCC ratio of measure, to tell a penalty from the run to run noise
+    if "bootstrap" not in microTCC_test or "bootstrap" not in baseTCC_test:
+        return "No confidence interval (collected without bootstrap)"
+    low, high = bootstrap.ratio_interval(microTCC_test["bootstrap"][measure], baseTCC_test["bootstrap"][measure])
+    significant = "significant" if low > 1 or high < 1 else "not significant"
+    return "Penalty ratio " + str(int(bootstrap.confidenceLevel * 100)) + "% confidence interval: [" + str(low) + ", " + str(high) + "] (" + significant + ")"
+
+
 def calculate_penalty(parsed_data, operation, measure):
     low_cont_penalty_ratio = 0
     high_cont_penalty_ratio = 0
@@ -1057,23 +1139,27 @@ def calculate_penalty(parsed_data, operation, measure):
             microTCC_result = microTCC_low_cont[test_key]["latency"]["p(95)"]
             low_cont_penalty_ratio = microTCC_result / baseTCC_result
             print("BaseTCC: " + str(baseTCC_result) + "ms || microTCC " + str(microTCC_result) + "ms. Penalty ratio for low contention: VUs:" + test_key + " = " + str(low_cont_penalty_ratio))
+            print("\t" + penalty_interval(microTCC_low_cont[test_key], baseTCC_low_cont[test_key], "p(95)"))
 
         for test_key in baseTCC_high_cont_sorted_keys:
             baseTCC_result = baseTCC_high_cont[test_key]["latency"]["p(95)"]
             microTCC_result = microTCC_high_cont[test_key]["latency"]["p(95)"]
             high_cont_penalty_ratio = microTCC_result / baseTCC_result
             print("BaseTCC: " + str(baseTCC_result) + "ms || microTCC " + str(microTCC_result) + "ms. Penalty ratio for high contention: VUs:" + test_key + " = " + str(high_cont_penalty_ratio))
+            print("\t" + penalty_interval(microTCC_high_cont[test_key], baseTCC_high_cont[test_key], "p(95)"))
     elif measure == "med":
         for test_key in baseTCC_low_cont_sorted_keys:
             baseTCC_result = baseTCC_low_cont[test_key]["latency"]["med"]
             microTCC_result = microTCC_low_cont[test_key]["latency"]["med"]
             low_cont_penalty_ratio = microTCC_result / baseTCC_result
             print("BaseTCC: " + str(baseTCC_result) + "ms || microTCC " + str(microTCC_result) + "ms. Penalty ratio for low contention: VUs:" + test_key + " = " + str(low_cont_penalty_ratio))
+            print("\t" + penalty_interval(microTCC_low_cont[test_key], baseTCC_low_cont[test_key], "med"))
         for test_key in baseTCC_high_cont_sorted_keys:
             baseTCC_result = baseTCC_high_cont[test_key]["latency"]["med"]
             microTCC_result = microTCC_high_cont[test_key]["latency"]["med"]
             high_cont_penalty_ratio = microTCC_result / baseTCC_result
             print("BaseTCC: " + str(baseTCC_result) + "ms || microTCC " + str(microTCC_result) + "ms. Penalty ratio for high contention: VUs:" + test_key + " = " + str(high_cont_penalty_ratio))
+            print("\t" + penalty_interval(microTCC_high_cont[test_key], baseTCC_high_cont[test_key], "med"))
     # average_baseTCC_low_latency = 0
     # average_baseTCC_high_latency = 0
     # average_microTCC_low_latency = 0
@@ -1132,68 +1218,7 @@ def parse_data(log_file: list[str]) -> dict:
             - 90th percentile
             - 95th percentile
     """
-    
-    aborted_transaction = 0
-    successfull_transaction = 0
-
-    parsed_data = {}
-    parsed_data["latency"] = {}
-    parsed_data["latency"]["min"] = 0
-    parsed_data["latency"]["max"] = 0
-    parsed_data["latency"]["avg"] = 0
-    parsed_data["latency"]["med"] = 0
-    parsed_data["latency"]["p(90)"] = 0
-    parsed_data["latency"]["p(95)"] = 0
-    parsed_data["abort_rate"] = 0
-
-    date_latency_ms_pairs = []
-    # Start parsing the data, line by line
-    for line in log_file:
-        date_and_latency = re.findall(r'Date: ([\d]+) \w+ operation duration: ([\d]+)', line)
-        if date_and_latency:
-            date_ms = int(date_and_latency[0][0])
-            operation_duration = int(date_and_latency[0][1])
-
-            date_latency_ms_pair = (date_ms, operation_duration)
-            date_latency_ms_pairs.append(date_latency_ms_pair)
-        elif(re.findall(r'price is not coherent', line)):
-            aborted_transaction+=1
-        elif(re.findall(r'price is coherent', line)):
-            successfull_transaction+=1
-    
-    # Sort the list of tuples by the first element of the tuple (date)
-    date_latency_ms_pairs.sort(key=lambda tup: tup[0])
-
-    # Identify the pairs from the initial 10 seconds (warmup period)
-    initial_date_ms = date_latency_ms_pairs[0][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(date_latency_ms_pairs):
-        if pair[0] - initial_date_ms < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the initial pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[frontier_index_to_remove_up_to + 1:]
-        
-    # Identify the pairs from the final 10 seconds (teardown period)
-    final_date_ms = date_latency_ms_pairs[-1][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(reversed(date_latency_ms_pairs)):
-        if final_date_ms - pair[0] < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the final pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[:-frontier_index_to_remove_up_to - 1]
-
-    # Calculate the latency values
-    parsed_data["latency"]["min"] = min(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["max"] = max(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["avg"] = sum([pair[1] for pair in date_latency_ms_pairs]) / len(date_latency_ms_pairs)
-    parsed_data["latency"]["med"] = np.median([pair[1] for pair in date_latency_ms_pairs])
-    parsed_data["latency"]["p(90)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 90)
-    parsed_data["latency"]["p(95)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 95)
-    parsed_data["abort_rate"] = aborted_transaction / (aborted_transaction + successfull_transaction) * 100
-     
-    return parsed_data
+    return run_parser.summarize(run_parser.parse_lines(log_file))
 
 
 def CollectDatafiles(operation: int, versions: int, events: bool):
@@ -1217,28 +1242,10 @@ def CollectMemoryTestLow():
     current_path = os.getcwd()
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    data_paths = [os.path.join(test_logs_path, "µTCC", "low_UpdatePriceDiscountReadBasket_withoutEvents", "25_versions_memory_test"),
-                  os.path.join(test_logs_path, "BaseTCC", "low_UpdatePriceDiscountReadBasket_withoutEvents", "25_versions_memory_test")]
-    systems = ["µTCC", "BaseTCC"]
-    key_names = ["catalog", "basket", "discount", "coordinator"]
-    results_dict = {}
-    
-    for index, path in enumerate(data_paths):
-        # For each file in different systems
-        log_files = os.listdir(path)
-        log_files_data = {}
-        for key_name in key_names:
-            log_files_data[key_name] = {}
-        for log_file in log_files:
-            # For each file in the system
-            if "memory" not in log_file:
-                continue
-            vus = log_file.split("_")[0] # Get the number of VUs from the log file name
-            service_name = log_file.split(".")[0].split("_")[-1]
-            log_files_data[service_name][vus] = parse_MemoryData_logs(log_file, path)
-        dic_key = "µTCC" if "µTCC" in path else "BaseTCC"
-        results_dict[dic_key] = log_files_data
-    return results_dict
+    results_database = open_results_database(test_logs_path)
+    # Average memory usage of each service, keyed by system, service and number of VUs
+    return results_db.collect(results_database, test_logs_path, ["{system}", "{service}"], system=TESTED_SYSTEMS, contention="low",
+                              functionality="UpdatePriceDiscountReadBasket", events=0, versions=25, service=MEMORY_TEST_SERVICES)
 
 
 def parse_MemoryData_logs(log_file, path):
@@ -1246,11 +1253,8 @@ def parse_MemoryData_logs(log_file, path):
     if not os.path.isfile(log_file_path):
         print("The file " + log_file_path + " does not exist/ is not a file.")
         return
-    # open the file and parse the data
-    with open(log_file_path, "r") as f:
-        file_lines = f.readlines() # Get all the lines of the file
-        parsed_data = parse_data_MemoryData(file_lines)
-    return parsed_data
+    # Average of the file, read in a stream (compressed or not) unless it is in the parse cache
+    return {"average": run_parser.parse_memory_file_cached(log_file_path)}
 
 
 def parse_data_MemoryData(log_file: list[str]) -> dict:
@@ -1265,48 +1269,28 @@ def parse_data_MemoryData(log_file: list[str]) -> dict:
             - 90th percentile
             - 95th percentile
     """
-    
-    aborted_transaction = 0
-    successfull_transaction = 0
-
-    parsed_data = {}
-    parsed_data["average"] = {}
-
-    data_usages = []
-    # Start parsing the data, line by line
-    for line in log_file:
-        data_usage_str = line.split("M")[0]
-        try:
-            data_usages.append(float(data_usage_str))
-        except:
-            data_usage_str = line.split("G")[0]
-            data_usages.append(float(data_usage_str) * 1000)
-    
-    # Calculate the average data usage
-    parsed_data["average"] = sum(data_usages) / len(data_usages)
+    return {"average": run_parser.parse_memory_lines(log_file)}
 
-    return parsed_data
+
+def open_results_database(test_logs_path):
+    # Index the new and changed runs in the results database (see results_db.py), the runs are parsed when first queried
+    results_database = results_db.open_results_db(os.path.join(test_logs_path, results_db.databaseFileName))
+    results_db.scan(results_database, test_logs_path)
+    return results_database
 
 
 def CollectVersionMixDatafilesHigh():
     current_path = os.getcwd()
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    data_paths = [os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", "5_versions"),
-                  os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", "10_versions"),
-                  os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", "25_versions"),
-                  os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", "40_versions")]
-    key_names = [("µTCC_high", "5_versions"), ("µTCC_high", "10_versions"), ("µTCC_high", "25_versions"), ("µTCC_high", "40_versions")]
-    results_dict = {}
-    for index, path in enumerate(data_paths):
-        print("Test: " + key_names[index][0] + "_" + key_names[index][1])
-        log_files = os.listdir(path)
-        log_files_data = {}
-        for log_file in log_files:
-            vus = log_file.split(".")[0] # Get the number of VUs from the log file name
+    results_database = open_results_database(test_logs_path)
+    # Summaries of the runs of each number of versions, keyed by the number of VUs (repeats of a test merged)
+    results_dict = results_db.collect(results_database, test_logs_path, ["{system}_{contention}_{versions}_versions_{functionality}"], confidence_intervals=True,
+                                      system="µTCC", contention="high", functionality="UpdatePriceDiscountReadBasket", events=0)
+    for test in results_dict:
+        print("Test: " + test)
+        for vus in results_dict[test]:
             print("\tVUs: " + vus)
-            log_files_data[vus] = parse_MixData_logs(log_file, path)
-        results_dict[key_names[index][0] + "_" + key_names[index][1] + "_UpdatePriceDiscountReadBasket"] = log_files_data
     return results_dict
 
 
@@ -1314,127 +1298,71 @@ def CollectMixDatafiles(versions: int):
     current_path = os.getcwd()
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    data_paths = [os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "µTCC", "low_UpdatePriceDiscountReadBasket_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "high_UpdatePriceDiscountReadBasket_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "low_UpdatePriceDiscountReadBasket_withoutEvents", str(versions)+"_versions")]
-    key_names = [("µTCC", "high"), ("µTCC", "low"), ("BaseTCC", "high"), ("BaseTCC", "low")]
-    results_dict = {}
-    for index, path in enumerate(data_paths):
-        print("Test: " + key_names[index][0] + "_" + key_names[index][1])
-        log_files = os.listdir(path)
-        log_files_data = {}
-        for log_file in log_files:
-            vus = log_file.split(".")[0] # Get the number of VUs from the log file name
+    results_database = open_results_database(test_logs_path)
+    # Summaries of the runs of each system and contention, keyed by the number of VUs (repeats of a test merged)
+    results_dict = results_db.collect(results_database, test_logs_path, ["{system}_{contention}_{functionality}"], confidence_intervals=True,
+                                      system=TESTED_SYSTEMS, functionality="UpdatePriceDiscountReadBasket", events=0, versions=versions)
+    for test in results_dict:
+        print("Test: " + test)
+        for vus in results_dict[test]:
             print("\tVUs: " + vus)
-            log_files_data[vus] = parse_MixData_logs(log_file, path)
-        results_dict[key_names[index][0] + "_" + key_names[index][1] + "_UpdatePriceDiscountReadBasket"] = log_files_data
     return results_dict
 
 def CollectReadBasketDatafiles(versions: int):
     current_path = os.getcwd()
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    data_paths = [os.path.join(test_logs_path, "µTCC", "high_ReadBasket_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "µTCC", "low_ReadBasket_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "high_ReadBasket_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "low_ReadBasket_only_withoutEvents", str(versions)+"_versions")]
-    key_names = [("µTCC", "high"), ("µTCC", "low"), ("BaseTCC", "high"), ("BaseTCC", "low")]
-    results_dict = {}
-    for index, path in enumerate(data_paths):
-        log_files = os.listdir(path)
-        log_files_data = {}
-        for log_file in log_files:
-            vus = log_file.split(".")[0] # Get the number of VUs from the log file name
-            log_files_data[vus] = parse_ReadBasket_logs(log_file, path)
-        results_dict[key_names[index][0] + "_" + key_names[index][1] + "_ReadBasket_only"] = log_files_data
-    return results_dict
+    results_database = open_results_database(test_logs_path)
+    # Summaries of the runs of each system and contention, keyed by the number of VUs (repeats of a test merged)
+    return results_db.collect(results_database, test_logs_path, ["{system}_{contention}_{functionality}"], confidence_intervals=True,
+                              system=TESTED_SYSTEMS, functionality="ReadBasket_only", events=0, versions=versions)
 
 
 def CollectUpdatePriceDiscountNoEvents(versions: int):
     current_path = os.getcwd()
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    data_paths = [os.path.join(test_logs_path, "µTCC", "high_UpdatePriceDiscount_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "µTCC", "low_UpdatePriceDiscount_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "high_UpdatePriceDiscount_only_withoutEvents", str(versions)+"_versions"),
-                  os.path.join(test_logs_path, "BaseTCC", "low_UpdatePriceDiscount_only_withoutEvents", str(versions)+"_versions")]
-    key_names = [("µTCC", "high"), ("µTCC", "low"), ("BaseTCC", "high"), ("BaseTCC", "low")]
-    results_dict = {}
-    for index, path in enumerate(data_paths):
-        log_files = os.listdir(path)
-        log_files_data = {}
-        for log_file in log_files:
-            vus = log_file.split(".")[0] # Get the number of VUs from the log file name
-            log_files_data[vus] = parse_UpdatePriceDiscount_logs(log_file, path)
-        results_dict[key_names[index][0] + "_" + key_names[index][1] + "_UpdatePriceDiscount_only"] = log_files_data
-    return results_dict
+    results_database = open_results_database(test_logs_path)
+    # Summaries of the runs of each system and contention, keyed by the number of VUs (repeats of a test merged)
+    return results_db.collect(results_database, test_logs_path, ["{system}_{contention}_{functionality}"], confidence_intervals=True,
+                              system=TESTED_SYSTEMS, functionality="UpdatePriceDiscount_only", events=0, versions=versions)
 
 
 def CollectTestDatafiles(operation: int, versions: int):
     """ Search the log directory and return a dictionary of parsed log files. 
         Each key in the dictionary contains the parsed data from that system + system type. 
     """
-    results_dict = {}
-
     current_path = os.getcwd()
     print("Current path: " + current_path)
     test_logs_path = os.path.join(current_path, "testing_scripts", "logs", "K6_tests", "Thesis_results")
     print("Test logs path: " + test_logs_path)
-    
-    
-    tested_systems = os.listdir(test_logs_path)
-    for system in tested_systems:
-        if system != "BaseTCC" and system != "µTCC":
-            continue
-        system_path = os.path.join(test_logs_path, system)
-        system_contention = os.listdir(system_path)
-        for contention in system_contention:
-            if (operation == MIX_FUNCS and contention != "high_UpdatePriceDiscountReadBasket" and contention != "low_UpdatePriceDiscountReadBasket"):
-                continue
-            elif (operation == READ_BASKET_FUNC and contention != "high_ReadBasket_only" and contention != "low_ReadBasket_only"):
-                continue
-            elif (operation == UPDATE_DISCOUNT_PRICE_FUNC 
-                  and contention != "high_UpdatePriceDiscount_only_withoutEvents"
-                  and contention != "high_UpdatePriceDiscount_only_withEvents" 
-                  and contention != "low_UpdatePriceDiscount_only"):
-                continue
-            elif (operation == VERSION_TESTING_LOW and contention != "low_UpdatePriceDiscountReadBasket"):
-                continue
-            elif (operation == VERSION_TESTING_HIGH and contention != "high_UpdatePriceDiscountReadBasket"):
-                continue
-            
-            type_path = os.path.join(system_path, contention)
-            if(operation != VERSION_TESTING_LOW and operation != VERSION_TESTING_HIGH):
-                type_path = os.path.join(type_path, str(versions)+"_versions")
-
-
-            if(operation == VERSION_TESTING_LOW or operation == VERSION_TESTING_HIGH):
-                version_directories = os.listdir(type_path)
-                for versions_test in version_directories:
-                    log_files_data = {}
-                    version_directory_path = os.path.join(type_path, versions_test)
-                    log_files = os.listdir(version_directory_path)
-                    for log_file in log_files:
-                        parse_individual_log(log_file, version_directory_path, log_files_data)
-                    results_dict[system + "_" + contention + "_" + versions_test] = log_files_data
-            else:
-                log_files_data = {}
-                log_files = os.listdir(type_path)
-                for log_file in log_files:
-                    parse_individual_log(log_file, type_path, log_files_data)
-                results_dict[system + "_" + contention] = log_files_data
-    return results_dict
+    results_database = open_results_database(test_logs_path)
+
+    # Runs of the test directories without the with/withoutEvents suffix, keyed by system and test directory
+    keys = ["{system}_{run_directory}"]
+    if operation == MIX_FUNCS:
+        filters = {"functionality": "UpdatePriceDiscountReadBasket", "events": None, "versions": versions}
+    elif operation == READ_BASKET_FUNC:
+        filters = {"functionality": "ReadBasket_only", "events": None, "versions": versions}
+    elif operation == UPDATE_DISCOUNT_PRICE_FUNC:
+        # The high contention runs are split in with and without events
+        filters = {"functionality": "UpdatePriceDiscount_only", "versions": versions}
+    elif operation == VERSION_TESTING_LOW or operation == VERSION_TESTING_HIGH:
+        # Every number of versions
+        keys = ["{system}_{run_directory}_{versions_directory}"]
+        filters = {"contention": "low" if operation == VERSION_TESTING_LOW else "high", "functionality": "UpdatePriceDiscountReadBasket", "events": None}
+    else:
+        return {}
+    return results_db.collect(results_database, test_logs_path, keys, confidence_intervals=True, system=TESTED_SYSTEMS, **filters)
 
 def parse_MixData_logs(log_file, path):
     log_file_path = os.path.join(path, log_file)
     if not os.path.isfile(log_file_path):
         print("The file " + log_file_path + " does not exist/ is not a file.")
         return
-    # open the file and parse the data
-    with open(log_file_path, "r") as f:
-        file_lines = f.readlines() # Get all the lines of the file
-        parsed_data = parse_data_MixData(file_lines)
+    # Scan the file in chunks, compressed or not, unless it is in the parse cache, and summarize the run
+    parsed_data = run_parser.summarize(run_parser.parse_file_cached(log_file_path))
+    print("\t\tAborted transactions percentage: " + str(parsed_data["abort_rate"]))
     return parsed_data
 
 
@@ -1443,10 +1371,8 @@ def parse_ReadBasket_logs(log_file, path):
     if not os.path.isfile(log_file_path):
         print("The file " + log_file_path + " does not exist/ is not a file.")
         return
-    # open the file and parse the data
-    with open(log_file_path, "r") as f:
-        file_lines = f.readlines() # Get all the lines of the file
-        parsed_data = parse_data_ReadBasket(file_lines)
+    # Scan the file in chunks, compressed or not, unless it is in the parse cache, and summarize the run
+    parsed_data = run_parser.summarize(run_parser.parse_file_cached(log_file_path), abort_rate=False)
     return parsed_data
 
 
@@ -1456,10 +1382,8 @@ def parse_UpdatePriceDiscount_logs(log_file, path):
     if not os.path.isfile(log_file_path):
         print("The file " + log_file_path + " does not exist/ is not a file.")
         return
-    # open the file and parse the data
-    with open(log_file_path, "r") as f:
-        file_lines = f.readlines() # Get all the lines of the file
-        parsed_data = parse_data_updatePriceDiscount(file_lines)
+    # Scan the file in chunks, compressed or not, unless it is in the parse cache, and summarize the run
+    parsed_data = run_parser.summarize(run_parser.parse_file_cached(log_file_path), abort_rate=False)
     return parsed_data
 
 
@@ -1475,66 +1399,7 @@ def parse_data_MixData(log_file: list[str]) -> dict:
             - 90th percentile
             - 95th percentile
     """
-    
-    aborted_transaction = 0
-    successfull_transaction = 0
-
-    parsed_data = {}
-    parsed_data["latency"] = {}
-    parsed_data["latency"]["min"] = 0
-    parsed_data["latency"]["max"] = 0
-    parsed_data["latency"]["avg"] = 0
-    parsed_data["latency"]["med"] = 0
-    parsed_data["latency"]["p(90)"] = 0
-    parsed_data["latency"]["p(95)"] = 0
-    parsed_data["abort_rate"] = 0
-
-    date_latency_ms_pairs = []
-    # Start parsing the data, line by line
-    for line in log_file:
-        date_and_latency = re.findall(r'Date: ([\d]+) \w+ operation duration: ([\d]+)', line)
-        if date_and_latency:
-            date_ms = int(date_and_latency[0][0])
-            operation_duration = int(date_and_latency[0][1])
-
-            date_latency_ms_pair = (date_ms, operation_duration)
-            date_latency_ms_pairs.append(date_latency_ms_pair)
-        elif(re.findall(r'price is not coherent', line)):
-            aborted_transaction+=1
-        elif(re.findall(r'price is coherent', line)):
-            successfull_transaction+=1
-    
-    # Sort the list of tuples by the first element of the tuple (date)
-    date_latency_ms_pairs.sort(key=lambda tup: tup[0])
-
-    # Identify the pairs from the initial 10 seconds (warmup period)
-    initial_date_ms = date_latency_ms_pairs[0][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(date_latency_ms_pairs):
-        if pair[0] - initial_date_ms < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the initial pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[frontier_index_to_remove_up_to + 1:]
-        
-    # Identify the pairs from the final 10 seconds (teardown period)
-    final_date_ms = date_latency_ms_pairs[-1][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(reversed(date_latency_ms_pairs)):
-        if final_date_ms - pair[0] < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the final pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[:-frontier_index_to_remove_up_to - 1]
-
-    # Calculate the latency values
-    parsed_data["latency"]["min"] = min(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["max"] = max(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["avg"] = sum([pair[1] for pair in date_latency_ms_pairs]) / len(date_latency_ms_pairs)
-    parsed_data["latency"]["med"] = np.median([pair[1] for pair in date_latency_ms_pairs])
-    parsed_data["latency"]["p(90)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 90)
-    parsed_data["latency"]["p(95)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 95)
-    parsed_data["abort_rate"] = aborted_transaction / (aborted_transaction + successfull_transaction) * 100
+    parsed_data = run_parser.summarize(run_parser.parse_lines(log_file))
     print("\t\tAborted transactions percentage: " + str(parsed_data["abort_rate"]))
 
     return parsed_data
@@ -1552,58 +1417,8 @@ def parse_data_ReadBasket(log_file: list[str]) -> dict:
             - 90th percentile
             - 95th percentile
     """
+    return run_parser.summarize(run_parser.parse_lines(log_file), abort_rate=False)
 
-    parsed_data = {}
-    parsed_data["latency"] = {}
-    parsed_data["latency"]["min"] = 0
-    parsed_data["latency"]["max"] = 0
-    parsed_data["latency"]["avg"] = 0
-    parsed_data["latency"]["med"] = 0
-    parsed_data["latency"]["p(90)"] = 0
-    parsed_data["latency"]["p(95)"] = 0
-
-    date_latency_ms_pairs = []
-    # Start parsing the data, line by line
-    for line in log_file:
-        date_and_latency = re.findall(r'Date: ([\d]+) \w+ operation duration: ([\d]+)', line)
-        if date_and_latency:
-            date_ms = int(date_and_latency[0][0])
-            operation_duration = int(date_and_latency[0][1])
-            date_latency_ms_pair = (date_ms, operation_duration)
-            date_latency_ms_pairs.append(date_latency_ms_pair)
-    
-    # Sort the list of tuples by the first element of the tuple (date)
-    date_latency_ms_pairs.sort(key=lambda tup: tup[0])
-
-    # Identify the pairs from the initial 10 seconds (warmup period)
-    initial_date_ms = date_latency_ms_pairs[0][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(date_latency_ms_pairs):
-        if pair[0] - initial_date_ms < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the initial pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[frontier_index_to_remove_up_to + 1:]
-        
-    # Identify the pairs from the final 10 seconds (teardown period)
-    final_date_ms = date_latency_ms_pairs[-1][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(reversed(date_latency_ms_pairs)):
-        if final_date_ms - pair[0] < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the final pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[:-frontier_index_to_remove_up_to - 1]
-
-    # Calculate the latency values
-    parsed_data["latency"]["min"] = min(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["max"] = max(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["avg"] = sum([pair[1] for pair in date_latency_ms_pairs]) / len(date_latency_ms_pairs)
-    parsed_data["latency"]["med"] = np.median([pair[1] for pair in date_latency_ms_pairs])
-    parsed_data["latency"]["p(90)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 90)
-    parsed_data["latency"]["p(95)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 95)
-
-    return parsed_data
 
 def parse_data_updatePriceDiscount(log_file: list[str]) -> dict:
     """
@@ -1617,58 +1432,7 @@ def parse_data_updatePriceDiscount(log_file: list[str]) -> dict:
             - 90th percentile
             - 95th percentile
     """
-
-    parsed_data = {}
-    parsed_data["latency"] = {}
-    parsed_data["latency"]["min"] = 0
-    parsed_data["latency"]["max"] = 0
-    parsed_data["latency"]["avg"] = 0
-    parsed_data["latency"]["med"] = 0
-    parsed_data["latency"]["p(90)"] = 0
-    parsed_data["latency"]["p(95)"] = 0
-
-    date_latency_ms_pairs = []
-    # Start parsing the data, line by line
-    for line in log_file:
-        date_and_latency = re.findall(r'Date: ([\d]+) \w+ operation duration: ([\d]+)', line)
-        if date_and_latency:
-            date_ms = int(date_and_latency[0][0])
-            operation_duration = int(date_and_latency[0][1])
-            date_latency_ms_pair = (date_ms, operation_duration)
-            date_latency_ms_pairs.append(date_latency_ms_pair)
-    
-    # Sort the list of tuples by the first element of the tuple (date)
-    date_latency_ms_pairs.sort(key=lambda tup: tup[0])
-
-    # Identify the pairs from the initial 10 seconds (warmup period)
-    initial_date_ms = date_latency_ms_pairs[0][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(date_latency_ms_pairs):
-        if pair[0] - initial_date_ms < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the initial pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[frontier_index_to_remove_up_to + 1:]
-        
-    # Identify the pairs from the final 10 seconds (teardown period)
-    final_date_ms = date_latency_ms_pairs[-1][0]
-    frontier_index_to_remove_up_to = 0
-    for index, pair in enumerate(reversed(date_latency_ms_pairs)):
-        if final_date_ms - pair[0] < 5000:
-            frontier_index_to_remove_up_to = index
-    
-    # Remove the final pairs from the list
-    date_latency_ms_pairs = date_latency_ms_pairs[:-frontier_index_to_remove_up_to - 1]
-
-    # Calculate the latency values
-    parsed_data["latency"]["min"] = min(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["max"] = max(date_latency_ms_pairs, key=lambda tup: tup[1])[1]
-    parsed_data["latency"]["avg"] = sum([pair[1] for pair in date_latency_ms_pairs]) / len(date_latency_ms_pairs)
-    parsed_data["latency"]["med"] = np.median([pair[1] for pair in date_latency_ms_pairs])
-    parsed_data["latency"]["p(90)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 90)
-    parsed_data["latency"]["p(95)"] = np.percentile([pair[1] for pair in date_latency_ms_pairs], 95)
-
-    return parsed_data
+    return run_parser.summarize(run_parser.parse_lines(log_file), abort_rate=False)
 
 
 def parse_individual_log(log_file, type_path, log_files_data):
@@ -1677,11 +1441,8 @@ def parse_individual_log(log_file, type_path, log_files_data):
     if not os.path.isfile(log_file_path):
         print("The file " + log_file_path + " does not exist/ is not a file.")
         return
-    # open the file and parse the data
-    with open(log_file_path, "r") as f:
-        file_lines = f.readlines() # Get all the lines of the file
-        parsed_data = parse_data(file_lines)
-        log_files_data[vus] = parsed_data
+    # Scan the file in chunks, compressed or not, unless it is in the parse cache, and summarize the run
+    log_files_data[vus] = run_parser.summarize(run_parser.parse_file_cached(log_file_path))
 
 
 def main():
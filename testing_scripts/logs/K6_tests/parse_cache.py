@@ -0,0 +1,56 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+"""	Persistent cache of parsed logs, so the figures can be generated again without reading the raw logs.
+    Each entry is an .npz file of arrays, named after the hash of its key: the real path of the log, its size and
+    modification time, the kind of parsing (a log can be parsed in several ways) and the version of that parser. A log
+    that changed, or a parser whose version was bumped, gets a new key, so stale entries are never read; they are left
+    in the cache directory (remove it, or call clear_cache, to reclaim the space).
+    Entries are written to a temporary file and renamed, so parallel parsers of the same log never read a partial entry.
+"""
+cacheDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".parse_cache") # Shared by all the result trees
+
+
+def cache_key(log_file_path: str, kind: str, version: int) -> str:
+    stat = os.stat(log_file_path)
+    key = "\0".join([os.path.realpath(log_file_path), str(stat.st_size), str(stat.st_mtime_ns), kind, str(version)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def entry_path(log_file_path: str, kind: str, version: int) -> str:
+    return os.path.join(cacheDirectory, kind + "_" + cache_key(log_file_path, kind, version) + ".npz")
+
+
+def load(log_file_path: str, kind: str, version: int) -> dict:
+    """ Return the cached arrays of a log, or None when the log was not parsed since it last changed. """
+    path = entry_path(log_file_path, kind, version)
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        # Missing or unreadable entry (an interrupted write), parse the log again
+        return None
+
+
+def store(log_file_path: str, kind: str, version: int, arrays: dict):
+    """ Save the parsed arrays of a log in the cache. """
+    path = entry_path(log_file_path, kind, version)
+    os.makedirs(cacheDirectory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=cacheDirectory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def clear_cache():
+    # Remove every entry of the cache
+    if not os.path.isdir(cacheDirectory):
+        return
+    for file_name in os.listdir(cacheDirectory):
+        os.remove(os.path.join(cacheDirectory, file_name))
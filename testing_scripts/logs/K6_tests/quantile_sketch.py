@@ -0,0 +1,131 @@
+import struct
+import zlib
+import numpy as np
+
+"""	Mergeable quantile sketch of the latencies of a k6 run, following the DDSketch bucket layout.
+    The exact summary of a run cannot be combined with the summaries of other runs: averaging the p95 of the repeats
+    of a test is not the p95 of the repeats. Each summarized run also keeps a sketch of its steady state latencies:
+    a positive value v is counted in the bucket ceil(log_gamma(v)), with gamma = (1 + relativeAccuracy) /
+    (1 - relativeAccuracy), so any quantile is returned with a relative error of at most relativeAccuracy, and zero
+    latencies (below the millisecond resolution of the logs) have their own counter.
+    Sketches with the same accuracy merge by adding their bucket counts, so the percentiles over any set of runs
+    (repeats, VU levels, systems) come from the sketches alone, without loading the samples of the runs again.
+"""
+relativeAccuracy = 0.01 # Relative error bound of the quantiles
+
+_header = struct.Struct('<4sdqqdddq')
+_magic = b'DDSK'
+
+
+class QuantileSketch:
+
+    def __init__(self, relative_accuracy: float = relativeAccuracy):
+        if relative_accuracy <= 0 or relative_accuracy >= 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        # Dense counts of the buckets offset, offset + 1, ...
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.total_count = 0
+        self.total = 0.0 # Exact sum of the added values
+        self.min = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, relative_accuracy: float = relativeAccuracy) -> "QuantileSketch":
+        """ Sketch of an array of non negative values, built in a few vectorized passes. """
+        sketch = cls(relative_accuracy)
+        sketch.add_values(values)
+        return sketch
+
+    def add_values(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        if values.min() < 0:
+            raise ValueError("QuantileSketch only counts non negative values")
+        positive = values[values > 0]
+        other = QuantileSketch(self.relative_accuracy)
+        other.zero_count = len(values) - len(positive)
+        if len(positive) > 0:
+            indices = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+            other.offset = int(indices.min())
+            other.counts = np.bincount(indices - other.offset)
+        other.total_count = len(values)
+        other.total = float(values.sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "QuantileSketch"):
+        """ Add the counts of other to this sketch, which must have the same relative accuracy. """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with a different relative accuracy")
+        if other.total_count == 0:
+            return
+        if len(self.counts) == 0:
+            self.offset, self.counts = other.offset, other.counts.copy()
+        elif len(other.counts) > 0:
+            offset = min(self.offset, other.offset)
+            end = max(self.offset + len(self.counts), other.offset + len(other.counts))
+            counts = np.zeros(end - offset, dtype=np.int64)
+            counts[self.offset - offset:self.offset - offset + len(self.counts)] += self.counts
+            counts[other.offset - offset:other.offset - offset + len(other.counts)] += other.counts
+            self.offset, self.counts = offset, counts
+        if self.total_count == 0 or other.min < self.min:
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        self.total_count += other.total_count
+        self.total += other.total
+
+    def mean(self) -> float:
+        return self.total / self.total_count if self.total_count > 0 else 0
+
+    def values_at_percentiles(self, percentiles: list) -> list:
+        """ Return the value at each percentile (0-100), as the lower value of the rank percentile / 100 * (count - 1). """
+        if self.total_count == 0:
+            return [0] * len(percentiles)
+        ranks = np.floor(np.asarray(percentiles, dtype=float) / 100 * (self.total_count - 1))
+        # Position of the bucket holding each rank, after the zero values
+        cumulative = np.cumsum(self.counts)
+        positions = np.searchsorted(cumulative, ranks - self.zero_count, side="right")
+        positions = np.minimum(positions, max(len(self.counts) - 1, 0))
+        # Middle of the bucket, in relative terms: 2 * gamma^i / (gamma + 1)
+        values = 2 * np.power(self.gamma, self.offset + positions) / (self.gamma + 1)
+        values = np.where(ranks < self.zero_count, 0.0, np.clip(values, self.min, self.max))
+        return values.tolist()
+
+    def value_at_percentile(self, percentile: float) -> float:
+        return self.values_at_percentiles([percentile])[0]
+
+    def to_bytes(self) -> bytes:
+        """ Compact serialized form: a fixed header followed by the zlib compressed bucket counts. """
+        header = _header.pack(_magic, self.relative_accuracy, self.offset, self.zero_count, self.total, self.min, self.max, self.total_count)
+        return header + zlib.compress(self.counts.astype('<i8').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        magic, relative_accuracy, offset, zero_count, total, minimum, maximum, total_count = _header.unpack_from(data)
+        if magic != _magic:
+            raise ValueError("Not a serialized QuantileSketch")
+        sketch = cls(relative_accuracy)
+        sketch.offset = offset
+        sketch.counts = np.frombuffer(zlib.decompress(data[_header.size:]), dtype='<i8').astype(np.int64)
+        sketch.zero_count = zero_count
+        sketch.total = total
+        sketch.min = minimum
+        sketch.max = maximum
+        sketch.total_count = total_count
+        return sketch
+
+
+def merge_sketches(sketches) -> QuantileSketch:
+    # Merge sketches (of several runs) into a new sketch
+    merged = QuantileSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
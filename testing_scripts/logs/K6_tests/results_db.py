@@ -0,0 +1,440 @@
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+import numpy as np
+import bootstrap
+import quantile_sketch
+import run_parser
+import steady_state
+
+"""	SQLite results database and index of the k6 runs in Thesis_results.
+    The runs are only addressable through the directory convention
+        Thesis_results/<system>/<contention>_<functionality>[_<with|without>Events]/<N>_versions/<vus>[_<i>].<txt|json>[.gz|.zst]
+    (and <N>_versions_memory_test/<vus>[_<i>]_memory_<service>.txt for the memory usage logs of the services), and the
+    Collect* functions of log_parser.py used to hard-code, walk and parse those directories on every invocation.
+    scan() indexes every run in an SQLite file with its metadata from the path (system, contention, functionality,
+    events, versions, VUs, repetition, service), only stat'ing the files: a run is indexed again when its file changed
+    (size or modification time). Runs are only parsed when a query needs them: collect() and ensure_summaries() parse
+    the matching runs that have no summary yet (in parallel, see run_parser.parse_files) and store their summary
+    (steady state window, latency statistics and abort rate, as parse_data computes them, or the average memory usage)
+    and their steady state samples, once, as compressed arrays (the operation of each sample as a code in the
+    operations table). A summary is computed again when its file or the parser (run_parser.parserVersion) changed.
+    Any combination of the run columns can be queried (see query_runs), so a new experiment dimension is a new filter
+    value rather than a new Collect function. The summary of each run keeps a quantile sketch of its latencies, so the
+    percentiles over several runs (repeats of a test, see merged_percentiles) and their bootstrap confidence intervals
+    (from the stored steady state samples, see bootstrap_rows) are computed from the database alone.
+
+    Usage: python results_db.py ingest [<Thesis_results path>] [<database path>]
+"""
+databaseFileName = "results.sqlite"
+
+runDirectoryPattern = re.compile(r"^(high|low)_(.+?)(?:_(with|without)Events)?$")
+versionsDirectoryPattern = re.compile(r"^(\d+)_versions(?:_memory_test)?$")
+# Console logs (.txt) or k6 metric points (.json, see k6_output.py), compressed runs are read as they are
+runFilePattern = re.compile(r"^(\d+)(?:_(\d+))?(?:_memory_([a-z]+))?\.(?:txt|json|ndjson)(?:\.gz|\.zst)?$")
+schemaVersion = 6 # Databases of an older schema are rebuilt, re-indexing every run
+runColumns = ["system", "contention", "functionality", "events", "versions", "vus", "repetition", "service", "directory", "name"] # Query filters
+# Order of the query results: "µTCC" sorts after "BaseTCC", so its runs come first as in the figures
+runOrder = " ORDER BY runs.system DESC, runs.contention, runs.functionality, runs.events, runs.versions, runs.vus, runs.repetition, runs.service"
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    system TEXT NOT NULL,
+    contention TEXT NOT NULL,
+    functionality TEXT NOT NULL,
+    events INTEGER,
+    versions INTEGER,
+    vus INTEGER NOT NULL,
+    repetition INTEGER,
+    service TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_test ON runs (system, contention, functionality, events, versions, vus, service);
+CREATE INDEX IF NOT EXISTS runs_by_directory ON runs (directory);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    parser_version INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    steady_samples INTEGER NOT NULL,
+    steady_start_ms INTEGER,
+    steady_end_ms INTEGER,
+    min REAL,
+    max REAL,
+    avg REAL,
+    med REAL,
+    p90 REAL,
+    p95 REAL,
+    coherent INTEGER NOT NULL,
+    incoherent INTEGER NOT NULL,
+    abort_rate REAL,
+    iterations INTEGER NOT NULL,
+    read_samples INTEGER NOT NULL,
+    update_samples INTEGER NOT NULL,
+    sketch BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS steady_samples (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    latencies BLOB NOT NULL,
+    operations BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory_summaries (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    parser_version INTEGER NOT NULL,
+    average REAL NOT NULL
+);
+"""
+
+
+def default_results_path() -> str:
+    # Thesis_results folder, as the Collect* functions of log_parser.py find it
+    return os.path.join(os.getcwd(), "testing_scripts", "logs", "K6_tests", "Thesis_results")
+
+
+def open_results_db(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA journal_mode = WAL")
+    if connection.execute("PRAGMA user_version").fetchone()[0] != schemaVersion:
+        connection.executescript("DROP TABLE IF EXISTS memory_summaries; DROP TABLE IF EXISTS steady_samples; DROP TABLE IF EXISTS operations; "
+                                 "DROP TABLE IF EXISTS summaries; DROP TABLE IF EXISTS samples; DROP TABLE IF EXISTS runs;")
+        connection.execute("PRAGMA user_version = " + str(schemaVersion))
+    connection.executescript(schema)
+    return connection
+
+
+def run_metadata(results_path: str, file_path: str) -> dict:
+    """
+    Return the metadata of a run from its path relative to results_path, or None when the path does not follow the
+    Thesis_results convention (notes, temporary logs).
+    """
+    parts = os.path.relpath(file_path, results_path).split(os.sep)
+    if len(parts) not in (3, 4):
+        return None
+    system, run_directory = parts[0], parts[1]
+    run_match = runDirectoryPattern.match(run_directory)
+    file_match = runFilePattern.match(parts[-1])
+    if not run_match or not file_match:
+        return None
+    versions = None
+    if len(parts) == 4:
+        versions_match = versionsDirectoryPattern.match(parts[2])
+        if not versions_match:
+            return None
+        versions = int(versions_match.group(1))
+    events = None if run_match.group(3) is None else int(run_match.group(3) == "with")
+    return {
+        "directory": os.path.dirname(os.path.relpath(file_path, results_path)),
+        "name": parts[-1].split(".")[0],
+        "system": system,
+        "contention": run_match.group(1),
+        "functionality": run_match.group(2),
+        "events": events,
+        "versions": versions,
+        "vus": int(file_match.group(1)),
+        "repetition": None if file_match.group(2) is None else int(file_match.group(2)),
+        "service": file_match.group(3), # Only set for the memory usage logs
+    }
+
+
+def summarize_run(run: dict, first: int, last: int) -> dict:
+    # Same statistics as parse_data in log_parser.py, over the steady state of the run (samples first to last)
+    latencies = run["latencies"][first:last]
+    samples = len(run["dates"])
+    checked_reads = run["coherent"] + run["incoherent"]
+    # Samples of each side of the read/update split, whatever the operation is called in the logs
+    read_samples = sum(count for operation, count in run["operations"].items() if "read" in operation.lower())
+    summary = {"samples": samples, "steady_samples": len(latencies), "steady_start_ms": None, "steady_end_ms": None,
+               "min": None, "max": None, "avg": None, "med": None, "p90": None, "p95": None,
+               "coherent": run["coherent"], "incoherent": run["incoherent"],
+               "abort_rate": run["incoherent"] / checked_reads * 100 if checked_reads > 0 else None,
+               "iterations": run["iterations"], "read_samples": read_samples, "update_samples": samples - read_samples,
+               "sketch": quantile_sketch.QuantileSketch.from_values(latencies).to_bytes()}
+    if len(latencies) > 0:
+        statistics = run_parser.latency_statistics(latencies)
+        summary.update({"steady_start_ms": int(run["dates"][first]), "steady_end_ms": int(run["dates"][last - 1]),
+                        "min": float(statistics["min"]), "max": float(statistics["max"]), "avg": float(statistics["avg"]),
+                        "med": float(statistics["med"]), "p90": float(statistics["p(90)"]), "p95": float(statistics["p(95)"])})
+    return summary
+
+
+def scan(connection: sqlite3.Connection, results_path: str) -> int:
+    """
+    Index the new and changed runs under results_path, without parsing them, and drop the runs whose file was removed.
+    Return the number of runs indexed.
+    """
+    known = {row["path"]: (row["size"], row["mtime"]) for row in connection.execute("SELECT path, size, mtime FROM runs")}
+    seen = set()
+    changed = []
+    for directory, directories, files in os.walk(results_path):
+        # Sorted walk, so the runs are always indexed in the same order
+        directories.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(directory, file_name)
+            metadata = run_metadata(results_path, file_path)
+            if metadata is None:
+                continue
+            relative_path = os.path.relpath(file_path, results_path)
+            seen.add(relative_path)
+            stat = os.stat(file_path)
+            if known.get(relative_path) == (stat.st_size, stat.st_mtime):
+                continue
+            changed.append((relative_path, metadata, stat))
+    removed = [(path,) for path in known if path not in seen]
+    with connection:
+        # Replacing a run deletes its former summary and steady state samples
+        connection.executemany("DELETE FROM runs WHERE path = ?", [(relative_path,) for relative_path, _, _ in changed] + removed)
+        connection.executemany(
+            "INSERT INTO runs (path, directory, name, system, contention, functionality, events, versions, vus, repetition, service, size, mtime, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(relative_path, metadata["directory"], metadata["name"], metadata["system"], metadata["contention"], metadata["functionality"], metadata["events"],
+              metadata["versions"], metadata["vus"], metadata["repetition"], metadata["service"], stat.st_size, stat.st_mtime, time.time())
+             for relative_path, metadata, stat in changed])
+    return len(changed)
+
+
+def operation_ids(connection: sqlite3.Connection, names: list) -> np.ndarray:
+    # Codes of the operations table for the operation names of a run, adding the new names
+    connection.executemany("INSERT OR IGNORE INTO operations (name) VALUES (?)", [(name,) for name in names])
+    ids = dict(connection.execute("SELECT name, id FROM operations").fetchall())
+    return np.array([ids[name] for name in names], dtype=np.uint8)
+
+
+def store_summary(connection: sqlite3.Connection, run_id: int, run: dict):
+    # Replace the summary and steady state samples of an indexed run with those of its parsed log
+    first, last = steady_state.steady_state_slice(run["dates"], run["latencies"])
+    summary = summarize_run(run, first, last)
+    summary["parser_version"] = run_parser.parserVersion
+    with connection:
+        connection.execute("DELETE FROM summaries WHERE run_id = ?", (run_id,))
+        # Operation codes of the run mapped to those of the operations table, one byte per sample
+        operations = operation_ids(connection, run["operation_names"])[run["operation_codes"][first:last]]
+        connection.execute("INSERT OR REPLACE INTO steady_samples (run_id, latencies, operations) VALUES (?, ?, ?)",
+                           (run_id, zlib.compress(run["latencies"][first:last].astype(np.int64).tobytes()), zlib.compress(operations.tobytes())))
+        columns = list(summary.keys())
+        connection.execute("INSERT INTO summaries (run_id, " + ", ".join(columns) + ") VALUES (?" + ", ?" * len(columns) + ")",
+                           [run_id] + [summary[column] for column in columns])
+
+
+def store_memory_summary(connection: sqlite3.Connection, run_id: int, average: float):
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO memory_summaries (run_id, parser_version, average) VALUES (?, ?, ?)",
+                           (run_id, run_parser.memoryParserVersion, average))
+
+
+def filter_conditions(filters: dict) -> tuple:
+    """
+    Return the SQL condition and its values selecting the runs that match filters: keyword arguments on runColumns,
+    each one a value (None matches a missing value) or a list of accepted values.
+    """
+    conditions = []
+    values = []
+    for column, value in filters.items():
+        if column not in runColumns:
+            raise ValueError("Unknown run column: " + column)
+        if isinstance(value, (list, tuple, set)):
+            conditions.append("runs." + column + " IN (" + ", ".join("?" * len(value)) + ")")
+            values += list(value)
+        else:
+            conditions.append("runs." + column + " IS ?")
+            values.append(value)
+    return " AND ".join(conditions) if conditions else "1", values
+
+
+def query_runs(connection: sqlite3.Connection, **filters) -> list[sqlite3.Row]:
+    """ Return the indexed runs matching filters (see filter_conditions), whether they were parsed or not. """
+    condition, values = filter_conditions(filters)
+    return connection.execute("SELECT * FROM runs WHERE " + condition + runOrder, values).fetchall()
+
+
+def ensure_summaries(connection: sqlite3.Connection, results_path: str, processes: int = None, **filters) -> int:
+    """
+    Parse the runs matching filters that have no summary of the current parser version, and store their summaries.
+    The k6 runs are parsed in parallel (processes defaults to the number of CPUs). Return the number of runs parsed.
+    """
+    condition, values = filter_conditions(filters)
+    runs = connection.execute(
+        "SELECT runs.id, runs.path FROM runs LEFT JOIN summaries ON summaries.run_id = runs.id AND summaries.parser_version = ? "
+        "WHERE runs.service IS NULL AND summaries.run_id IS NULL AND " + condition + runOrder, [run_parser.parserVersion] + values).fetchall()
+    memory_runs = connection.execute(
+        "SELECT runs.id, runs.path FROM runs LEFT JOIN memory_summaries ON memory_summaries.run_id = runs.id AND memory_summaries.parser_version = ? "
+        "WHERE runs.service IS NOT NULL AND memory_summaries.run_id IS NULL AND " + condition + runOrder, [run_parser.memoryParserVersion] + values).fetchall()
+    parsed = run_parser.parse_files([os.path.join(results_path, row["path"]) for row in runs], processes=processes)
+    for row, run in zip(runs, parsed):
+        store_summary(connection, row["id"], run)
+    for row in memory_runs:
+        store_memory_summary(connection, row["id"], run_parser.parse_memory_file_cached(os.path.join(results_path, row["path"])))
+    return len(runs) + len(memory_runs)
+
+
+def ingest(connection: sqlite3.Connection, results_path: str, processes: int = None) -> int:
+    """
+    Index the runs under results_path and summarize every run that needs it, so later queries (including the
+    confidence intervals of collect) never parse a log.
+    Return the number of runs parsed.
+    """
+    scan(connection, results_path)
+    return ensure_summaries(connection, results_path, processes)
+
+
+def query_summaries(connection: sqlite3.Connection, **filters) -> list[sqlite3.Row]:
+    """
+    Return the k6 runs matching filters (see filter_conditions) with their summary, for the runs that were summarized
+    (see ensure_summaries).
+    """
+    condition, values = filter_conditions(filters)
+    return connection.execute("SELECT runs.*, summaries.* FROM runs JOIN summaries ON summaries.run_id = runs.id "
+                              "WHERE summaries.parser_version = ? AND " + condition + runOrder, [run_parser.parserVersion] + values).fetchall()
+
+
+def query_memory_summaries(connection: sqlite3.Connection, **filters) -> list[sqlite3.Row]:
+    # Same as query_summaries, for the memory usage logs
+    condition, values = filter_conditions(filters)
+    return connection.execute("SELECT runs.*, memory_summaries.* FROM runs JOIN memory_summaries ON memory_summaries.run_id = runs.id "
+                              "WHERE memory_summaries.parser_version = ? AND " + condition + runOrder, [run_parser.memoryParserVersion] + values).fetchall()
+
+
+def steady_samples(connection: sqlite3.Connection, run_id: int) -> tuple:
+    """
+    Return the steady state latencies of a summarized run (int64 array, in the order of the log) and the operation of
+    each one (array of operation names).
+    """
+    row = connection.execute("SELECT latencies, operations FROM steady_samples WHERE run_id = ?", (run_id,)).fetchone()
+    latencies = np.frombuffer(zlib.decompress(row["latencies"]), dtype=np.int64)
+    names = np.full(256, "", dtype=object)
+    for code, name in connection.execute("SELECT id, name FROM operations"):
+        names[code] = name
+    return latencies, names[np.frombuffer(zlib.decompress(row["operations"]), dtype=np.uint8)]
+
+
+def parsed_data_from_summary(row: sqlite3.Row) -> dict:
+    # Summary in the form returned by parse_data in log_parser.py
+    parsed_data = {"latency": {"min": row["min"], "max": row["max"], "avg": row["avg"], "med": row["med"], "p(90)": row["p90"], "p(95)": row["p95"]}}
+    if row["abort_rate"] is not None:
+        parsed_data["abort_rate"] = row["abort_rate"]
+    parsed_data["iterations"] = row["iterations"]
+    parsed_data["sketch"] = quantile_sketch.QuantileSketch.from_bytes(row["sketch"])
+    return parsed_data
+
+
+def merged_sketch(rows: list[sqlite3.Row]) -> quantile_sketch.QuantileSketch:
+    # Merge the quantile sketches of the summaries of several runs
+    return quantile_sketch.merge_sketches(quantile_sketch.QuantileSketch.from_bytes(row["sketch"]) for row in rows)
+
+
+def merged_percentiles(connection: sqlite3.Connection, percentiles: list, **filters) -> list:
+    """
+    Return the latency percentiles (0-100) over the steady state samples of every summarized run matching filters (as
+    for query_summaries), merged from the sketches of the runs, within the relative accuracy of quantile_sketch.py.
+    """
+    return merged_sketch(query_summaries(connection, **filters)).values_at_percentiles(percentiles)
+
+
+def merged_parsed_data(rows: list[sqlite3.Row]) -> dict:
+    """
+    Summary of several runs (the repeats of a test) in the form returned by parse_data in log_parser.py. The minimum,
+    maximum, average and abort rate are exact, the percentiles come from the merged sketches, and the iterations are
+    the average of the runs.
+    """
+    if len(rows) == 1:
+        return parsed_data_from_summary(rows[0])
+    sketch = merged_sketch(rows)
+    median, p90, p95 = sketch.values_at_percentiles(run_parser.statisticsPercentiles)
+    measured = [row for row in rows if row["steady_samples"] > 0]
+    parsed_data = {"latency": {"min": min((row["min"] for row in measured), default=None), "max": max((row["max"] for row in measured), default=None),
+                               "avg": sketch.mean() if measured else None, "med": median, "p(90)": p90, "p(95)": p95}}
+    coherent = sum(row["coherent"] for row in rows)
+    incoherent = sum(row["incoherent"] for row in rows)
+    if coherent + incoherent > 0:
+        parsed_data["abort_rate"] = incoherent / (coherent + incoherent) * 100
+    parsed_data["iterations"] = sum(row["iterations"] for row in rows) / len(rows)
+    parsed_data["sketch"] = sketch
+    return parsed_data
+
+
+def run_fields(row: sqlite3.Row) -> dict:
+    # Columns of a run, plus the names of its directories, for the key formats of collect
+    fields = {key: row[key] for key in row.keys()}
+    directories = row["directory"].split(os.sep)
+    fields["run_directory"] = directories[1]
+    fields["versions_directory"] = directories[2] if len(directories) > 2 else ""
+    return fields
+
+
+def collect(connection: sqlite3.Connection, results_path: str, keys: list, processes: int = None, confidence_intervals: bool = False, **filters) -> dict:
+    """
+    Return the summaries of the runs matching filters, parsing the ones that were not summarized yet, in nested
+    dictionaries: one level per format string of keys (formatted with the columns of each run, run_directory and
+    versions_directory), then the number of VUs. The repeats of a test are merged (see merged_parsed_data).
+    With confidence_intervals, each test also gets the bootstrap replicates ("bootstrap") and confidence intervals
+    ("ci") of its median, p(95) and abort rate (see bootstrap.py), from the stored steady state samples of its runs.
+    The memory usage logs are only selected with a service filter, their summary is the average memory usage.
+    """
+    filters.setdefault("service", None)
+    ensure_summaries(connection, results_path, processes, **filters)
+    memory = filters["service"] is not None
+    rows = query_memory_summaries(connection, **filters) if memory else query_summaries(connection, **filters)
+    groups = {}
+    for row in rows:
+        fields = run_fields(row)
+        group = groups
+        for key in keys:
+            group = group.setdefault(key.format(**fields), {})
+        group.setdefault(str(row["vus"]), []).append(row)
+    return _merge_groups(groups, len(keys), memory, connection if confidence_intervals and not memory else None)
+
+
+def _merge_groups(groups: dict, depth: int, memory: bool, bootstrap_connection: sqlite3.Connection) -> dict:
+    if depth > 0:
+        return {key: _merge_groups(group, depth - 1, memory, bootstrap_connection) for key, group in groups.items()}
+    if memory:
+        return {vus: {"average": sum(row["average"] for row in rows) / len(rows)} for vus, rows in groups.items()}
+    merged = {vus: merged_parsed_data(rows) for vus, rows in groups.items()}
+    if bootstrap_connection is not None:
+        for vus, rows in groups.items():
+            merged[vus]["bootstrap"] = bootstrap_rows(bootstrap_connection, rows)
+            merged[vus]["ci"] = bootstrap.confidence_intervals(merged[vus]["bootstrap"])
+    return merged
+
+
+def steady_latencies(connection: sqlite3.Connection, run_id: int) -> np.ndarray:
+    # Steady state latencies of a summarized run, as stored by store_summary
+    row = connection.execute("SELECT latencies FROM steady_samples WHERE run_id = ?", (run_id,)).fetchone()
+    return np.frombuffer(zlib.decompress(row["latencies"]), dtype=np.int64)
+
+
+def bootstrap_rows(connection: sqlite3.Connection, rows: list[sqlite3.Row]) -> dict:
+    """ Bootstrap replicates of the median, p(95) and abort rate of a test, over its runs (the repeats of the test). """
+    return bootstrap.bootstrap_test([steady_latencies(connection, row["run_id"]) for row in rows], [row["coherent"] for row in rows],
+                                    [row["incoherent"] for row in rows], [row["run_id"] for row in rows])
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "ingest":
+        print("Usage: python results_db.py ingest [<Thesis_results path>] [<database path>]")
+        return
+    results_path = sys.argv[2] if len(sys.argv) > 2 else default_results_path()
+    database_path = sys.argv[3] if len(sys.argv) > 3 else os.path.join(results_path, databaseFileName)
+    connection = open_results_db(database_path)
+    start = time.perf_counter()
+    parsed = ingest(connection, results_path)
+    runs = connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+    print("Parsed " + str(parsed) + " runs in " + str(time.perf_counter() - start) + " s, " + str(runs) + " runs in " + database_path)
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+import gzip
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import k6_output
+import parse_cache
+import quantile_sketch
+import steady_state
+
+"""	Single-pass parser of the k6 run logs, shared by log_parser.py and results_db.py.
+    The log_parser used to have four near copies of the same parser, each running up to three uncompiled re.findall
+    calls on every line. parse_lines reads a log once: each line is first checked with a substring test ("operation
+    duration", "coherent", "iterations"), and only the lines that pass are matched against the precompiled pattern of
+    that kind of line. One pass fills every metric of the run: the (date, latency, operation) samples, the coherent and
+    incoherent reads, the k6 iteration count and the number of samples of each operation type.
+    parse_file does not go through Python lines at all: it reads the log as bytes in chunks of chunkSize (cut at the
+    last new line), and runs the same patterns over each whole chunk. Every line counts as one kind only, in the order of
+    parse_lines: a line with "operation duration" gives its first sample, otherwise a line with "coherent" is a coherent
+    or incoherent read, otherwise a line with "iterations" is the iteration count. The lines the k6 scripts log never
+    have two of these markers, which one search per chunk checks; a chunk that has such a line gets each match assigned
+    to its line (a binary search of its position over the new lines of the chunk). The samples of each chunk are converted to arrays
+    (int64 dates and latencies, uint8 operation codes) before the next chunk is read, so a log of any size is parsed
+    with the memory of one chunk plus 17 bytes per sample. Logs compressed with gzip (.gz) or zstandard (.zst, needs the zstandard package) are decompressed as they
+    are read, so archived runs are parsed without being decompressed on disk.
+    A parsed run is compact: its samples are numpy arrays sorted by date, so it is cheap to send back from the worker
+    processes of parse_files, which parses many logs in parallel, one file per task. parse_files keeps the parsed runs
+    in the parse cache (see parse_cache.py), so a log is only read again when it changes or when parserVersion is bumped.
+    The runs recorded as k6 metric points (--out json, see k6_output.py) are parsed by parse_json_file into the same
+    arrays and counters, so the rest of the pipeline does not depend on how a run was recorded.
+"""
+samplePattern = re.compile(r'Date: ([\d]+) (\w+) operation duration: ([\d]+)')
+iterationsPattern = re.compile(r'iterations\.*:\s*([\d]+)')
+
+# Byte patterns of parse_file, matched over whole chunks of the log
+sampleBytesPattern = re.compile(rb'Date: ([\d]+) (\w+) operation duration: ([\d]+)')
+iterationsBytesPattern = re.compile(rb'iterations\.*:\s*([\d]+)')
+durationMarker = b"operation duration"
+coherenceMarker = b"coherent"
+incoherentMarker = b"price is not coherent"
+coherentMarker = b"price is coherent"
+durationMarkerPattern = re.compile(re.escape(durationMarker))
+coherenceMarkerPattern = re.compile(re.escape(coherenceMarker))
+incoherentMarkerPattern = re.compile(re.escape(incoherentMarker))
+coherentMarkerPattern = re.compile(re.escape(coherentMarker))
+# A line with two sample or coherence markers, which the chunk counts could count twice
+conflictPattern = re.compile(rb'(?:operation duration|coherent)[^\n]*(?:operation duration|coherent)')
+chunkSize = 16 * 1024 * 1024 # Bytes of the log scanned at once by parse_file
+parserVersion = 1 # Bump when a change of the parser changes the parsed runs, to invalidate the cached ones
+cacheKind = "run"
+counters = ["coherent", "incoherent", "iterations"]
+statisticsPercentiles = [50, 90, 95] # Median, p(90) and p(95) of the summaries
+memoryParserVersion = 1 # Bump when parse_memory_lines changes, to invalidate the cached memory usage logs
+
+
+def new_run() -> dict:
+    return {
+        "dates": np.zeros(0, dtype=np.int64), # Date of each sample in ms, sorted
+        "latencies": np.zeros(0, dtype=np.int64), # Latency of each sample in ms
+        "operation_codes": np.zeros(0, dtype=np.uint8), # Operation of each sample, as an index in operation_names
+        "operation_names": [],
+        "coherent": 0,
+        "incoherent": 0,
+        "iterations": 0,
+        "operations": {}, # Number of samples of each operation type
+    }
+
+
+def _set_samples(run: dict, matches: list):
+    # Convert the (date, operation, latency) text matches of a log to arrays, sorted by date
+    if not matches:
+        return
+    found = np.array(matches)
+    _set_sample_arrays(run, found[:, 0].astype(np.int64), found[:, 1], found[:, 2].astype(np.int64))
+
+
+def _set_sample_arrays(run: dict, dates: np.ndarray, operations: np.ndarray, latencies: np.ndarray):
+    # Set the samples of a run from the date, operation and latency of each sample, sorting them by date
+    names, codes = np.unique(operations, return_inverse=True)
+    _set_coded_samples(run, dates, latencies, codes, list(names))
+
+
+def _set_coded_samples(run: dict, dates: np.ndarray, latencies: np.ndarray, codes: np.ndarray, names: list):
+    # Set the samples of a run from the date, latency and operation code (index in names) of each sample, sorting the
+    # samples by date and the operation names alphabetically
+    names_order = sorted(range(len(names)), key=lambda code: names[code])
+    sorted_codes = np.zeros(len(names), dtype=np.uint8)
+    sorted_codes[names_order] = np.arange(len(names))
+    codes = sorted_codes[codes]
+    order = np.argsort(dates, kind="stable")
+    run["dates"] = dates[order]
+    run["latencies"] = latencies[order]
+    run["operation_codes"] = codes[order]
+    run["operation_names"] = [names[code].decode() if isinstance(names[code], bytes) else str(names[code]) for code in names_order]
+    run["operations"] = dict(zip(run["operation_names"], np.bincount(codes, minlength=len(names)).tolist()))
+
+
+def _match_lines(pattern: re.Pattern, chunk: bytes, line_ends: np.ndarray) -> np.ndarray:
+    # Index of the line of every match of pattern in a chunk, line_ends being the positions of its new lines
+    return np.searchsorted(line_ends, np.array([match.start() for match in pattern.finditer(chunk)], dtype=np.int64))
+
+
+def _chunk_iterations(chunk: bytes) -> int:
+    # Iteration count of the last iterations line of a chunk that is neither a sample nor a coherence line, from the
+    # first match of that line, or None. The iterations lines are few (the end of test summary), so they are checked one by one
+    iterations = None
+    line_start = -1
+    for match in iterationsBytesPattern.finditer(chunk):
+        start = chunk.rfind(b"\n", 0, match.start()) + 1
+        if start == line_start:
+            continue
+        line_start = start
+        end = chunk.find(b"\n", start)
+        line = chunk[start:end if end >= 0 else len(chunk)]
+        if durationMarker not in line and coherenceMarker not in line:
+            iterations = int(match.group(1))
+    return iterations
+
+
+def _scan_chunk(chunk: bytes, names: dict) -> tuple:
+    """
+    Return the samples (dates, latencies and operation codes in names, or None), coherent and incoherent reads and
+    iteration count (or None) of a chunk of whole lines, each line counted as one kind only, as parse_lines does.
+    """
+    if conflictPattern.search(chunk) is None:
+        # No line has two sample or coherence markers (as every line the k6 scripts log): each match is its own line
+        matches = sampleBytesPattern.findall(chunk)
+        coherent = chunk.count(coherentMarker)
+        incoherent = chunk.count(incoherentMarker)
+    else:
+        # Assign every match to its line, with a binary search of its position over the new lines of the chunk
+        line_ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+        duration_lines = _match_lines(durationMarkerPattern, chunk, line_ends)
+        found = list(sampleBytesPattern.finditer(chunk))
+        # Only the first sample of a line counts
+        _, first = np.unique(_match_lines(sampleBytesPattern, chunk, line_ends), return_index=True)
+        matches = [found[index].groups() for index in first]
+        # Reads checked on the lines without samples, a line with both markers is an incoherent read
+        coherence_lines = np.setdiff1d(_match_lines(coherenceMarkerPattern, chunk, line_ends), duration_lines)
+        incoherent_lines = np.intersect1d(_match_lines(incoherentMarkerPattern, chunk, line_ends), coherence_lines)
+        coherent_lines = np.setdiff1d(np.intersect1d(_match_lines(coherentMarkerPattern, chunk, line_ends), coherence_lines), incoherent_lines)
+        coherent = len(coherent_lines)
+        incoherent = len(incoherent_lines)
+    samples = _chunk_samples(matches, names) if matches else None
+    return samples, coherent, incoherent, _chunk_iterations(chunk)
+
+
+def _chunk_samples(matches: list, names: dict) -> tuple:
+    # Convert the (date, operation, latency) byte matches of a chunk to arrays: dates, latencies and operation codes,
+    # the index of each operation in names (the operations seen in the previous chunks, extended with the new ones)
+    found = np.array(matches)
+    chunk_names, chunk_codes = np.unique(found[:, 1], return_inverse=True)
+    codes = np.array([names.setdefault(name, len(names)) for name in chunk_names], dtype=np.uint8)
+    return found[:, 0].astype(np.int64), found[:, 2].astype(np.int64), codes[chunk_codes]
+
+
+def parse_lines(lines) -> dict:
+    """ Parse the lines of a run log (any iterable of lines, such as an open file) in a single pass. """
+    run = new_run()
+    matches = []
+    for line in lines:
+        if "operation duration" in line:
+            sample = samplePattern.search(line)
+            if sample:
+                matches.append(sample.groups())
+        elif "coherent" in line:
+            if "price is not coherent" in line:
+                run["incoherent"] += 1
+            elif "price is coherent" in line:
+                run["coherent"] += 1
+        elif "iterations" in line:
+            iterations = iterationsPattern.search(line)
+            if iterations:
+                run["iterations"] = int(iterations.group(1))
+    _set_samples(run, matches)
+    return run
+
+
+def open_log_binary(log_file_path: str):
+    """ Open a run log for reading bytes, decompressing .gz and .zst logs as they are read. """
+    if log_file_path.endswith(".gz"):
+        return gzip.open(log_file_path, "rb")
+    if log_file_path.endswith(".zst"):
+        # Only needed for zstandard compressed logs
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(log_file_path, "rb"), closefd=True)
+    return open(log_file_path, "rb")
+
+
+def open_log(log_file_path: str):
+    """ Open a run log for reading lines, decompressing .gz and .zst logs as they are read. """
+    return io.TextIOWrapper(open_log_binary(log_file_path), encoding="utf-8", errors="replace")
+
+
+def read_chunks(stream, chunk_size: int = chunkSize):
+    # Yield the content of a binary stream in chunks ending at a new line, so no line is split between two chunks
+    remainder = b""
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            # A line longer than the chunk, keep reading
+            remainder = data
+            continue
+        remainder = data[cut:]
+        yield data[:cut]
+    if remainder:
+        yield remainder
+
+
+def parse_file(log_file_path: str) -> dict:
+    """ Parse a run log file (plain, .gz or .zst) in chunks, with the same results as parse_lines. """
+    if k6_output.is_json_output(log_file_path):
+        return parse_json_file(log_file_path)
+    run = new_run()
+    names = {}
+    samples = []
+    with open_log_binary(log_file_path) as stream:
+        for chunk in read_chunks(stream):
+            chunk_samples, coherent, incoherent, iterations = _scan_chunk(chunk, names)
+            if chunk_samples is not None:
+                samples.append(chunk_samples)
+            run["coherent"] += coherent
+            run["incoherent"] += incoherent
+            if iterations is not None:
+                run["iterations"] = iterations
+    if samples:
+        dates, latencies, codes = (np.concatenate(arrays) for arrays in zip(*samples))
+        _set_coded_samples(run, dates, latencies, codes, list(names))
+    return run
+
+
+def parse_json_file(json_file_path: str) -> dict:
+    """
+    Parse the metric points of a run recorded with k6 --out json (plain, .gz or .zst) in chunks: the points of the
+    operation duration Trends are the samples, the price_coherent points the coherent and incoherent reads, and the
+    iterations points the k6 iterations.
+    """
+    run = new_run()
+    times = []
+    operations = []
+    latencies = []
+    with open_log_binary(json_file_path) as stream:
+        for chunk in read_chunks(stream):
+            for metric, time, value in k6_output.parse_points(chunk):
+                if metric == k6_output.iterationsMetric:
+                    run["iterations"] += int(value)
+                elif metric == k6_output.coherenceMetric:
+                    run["coherent" if value else "incoherent"] += 1
+                else:
+                    times.append(time)
+                    operations.append(k6_output.operation_name(metric))
+                    latencies.append(value)
+    if times:
+        # Durations measured in whole ms by the k6 scripts, as in the console logs
+        _set_sample_arrays(run, k6_output.timestamps_ms(times), np.array(operations), np.rint(latencies).astype(np.int64))
+    return run
+
+
+def run_to_arrays(run: dict) -> dict:
+    # Arrays of a parsed run, as saved in the parse cache
+    arrays = {"dates": run["dates"], "latencies": run["latencies"], "operation_codes": run["operation_codes"],
+              "operation_names": np.array(run["operation_names"], dtype=str),
+              "operation_counts": np.array([run["operations"][name] for name in run["operation_names"]], dtype=np.int64)}
+    for counter in counters:
+        arrays[counter] = np.array(run[counter], dtype=np.int64)
+    return arrays
+
+
+def run_from_arrays(arrays: dict) -> dict:
+    run = new_run()
+    run["dates"] = arrays["dates"]
+    run["latencies"] = arrays["latencies"]
+    run["operation_codes"] = arrays["operation_codes"]
+    run["operation_names"] = arrays["operation_names"].tolist()
+    run["operations"] = dict(zip(run["operation_names"], arrays["operation_counts"].tolist()))
+    for counter in counters:
+        run[counter] = int(arrays[counter])
+    return run
+
+
+def load_cached_run(log_file_path: str) -> dict:
+    """ Return the cached parsed run of a log file, or None when it has to be parsed. """
+    arrays = parse_cache.load(log_file_path, cacheKind, parserVersion)
+    return None if arrays is None else run_from_arrays(arrays)
+
+
+def parse_file_cached(log_file_path: str) -> dict:
+    """ Same as parse_file, reading and filling the parse cache. """
+    run = load_cached_run(log_file_path)
+    if run is None:
+        run = parse_file(log_file_path)
+        parse_cache.store(log_file_path, cacheKind, parserVersion, run_to_arrays(run))
+    return run
+
+
+def parse_files(log_file_paths: list, processes: int = None):
+    """
+    Parse run log files in parallel, one file per task, and yield the parsed runs in the order of log_file_paths.
+    The runs found in the parse cache are not parsed again, the others are parsed over processes (defaults to the
+    number of CPUs) and cached; a single file is parsed in the calling process.
+    """
+    runs = [load_cached_run(path) for path in log_file_paths]
+    missing = [path for path, run in zip(log_file_paths, runs) if run is None]
+    if len(missing) < 2:
+        parsed = (parse_file_cached(path) for path in missing)
+    else:
+        parsed = map_parallel(parse_file_cached, missing, processes=processes)
+    for run in runs:
+        yield run if run is not None else next(parsed)
+
+
+def map_parallel(function, *iterables, processes: int = None):
+    """ Call function on the items of iterables over a process pool, one item per task, and yield the results in order. """
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        yield from executor.map(function, *iterables, chunksize=1)
+
+
+def parse_memory_lines(lines) -> float:
+    """ Return the average memory usage in MB of a memory usage log (docker stats lines, such as "120.5MiB / 1GiB"). """
+    data_usages = []
+    for line in lines:
+        data_usage_str = line.split("M")[0]
+        try:
+            data_usages.append(float(data_usage_str))
+        except ValueError:
+            # Usage in GB
+            data_usage_str = line.split("G")[0]
+            data_usages.append(float(data_usage_str) * 1000)
+    return sum(data_usages) / len(data_usages)
+
+
+def parse_memory_file_cached(log_file_path: str) -> float:
+    """ Average memory usage of a memory usage log (plain, .gz or .zst), reading and filling the parse cache. """
+    cached = parse_cache.load(log_file_path, "memory", memoryParserVersion)
+    if cached is not None:
+        return float(cached["average"])
+    with open_log(log_file_path) as f:
+        average = parse_memory_lines(f)
+    parse_cache.store(log_file_path, "memory", memoryParserVersion, {"average": np.array(average)})
+    return average
+
+
+def latency_statistics(latencies: np.ndarray) -> dict:
+    """
+    Return the minimum, maximum, average, median, 90th and 95th percentile of a non empty int64 array of latencies.
+    The three percentiles come from a single np.percentile call, which partitions the array once.
+    """
+    median, p90, p95 = np.percentile(latencies, statisticsPercentiles)
+    return {"min": int(latencies.min()), "max": int(latencies.max()), "avg": int(latencies.sum()) / len(latencies),
+            "med": median, "p(90)": p90, "p(95)": p95}
+
+
+def summarize(run: dict, abort_rate: bool = True) -> dict:
+    """
+    Return the parsed data of a run, over its steady state:
+        - Latency (minimum, maximum, average, median, 90th and 95th percentile)
+        - Abort rate (percentage of incoherent reads), if abort_rate
+        - Number of samples of each operation type, and k6 iterations
+        - Mergeable quantile sketch of the latencies, to combine the percentiles of several runs (see quantile_sketch.py)
+    """
+    parsed_data = {}
+    parsed_data["latency"] = {"min": 0, "max": 0, "avg": 0, "med": 0, "p(90)": 0, "p(95)": 0}
+
+    # Keep the samples of the steady state of the run, dropping its warmup and teardown periods
+    first, last = steady_state.steady_state_slice(run["dates"], run["latencies"])
+    latencies = run["latencies"][first:last]
+    if len(latencies) > 0:
+        parsed_data["latency"] = latency_statistics(latencies)
+    parsed_data["sketch"] = quantile_sketch.QuantileSketch.from_values(latencies)
+    if abort_rate:
+        checked_reads = run["coherent"] + run["incoherent"]
+        parsed_data["abort_rate"] = run["incoherent"] / checked_reads * 100 if checked_reads > 0 else 0
+    parsed_data["operations"] = dict(run["operations"])
+    parsed_data["iterations"] = run["iterations"]
+    return parsed_data
@@ -0,0 +1,74 @@
+import numpy as np
+
+"""	Steady-state detection for the k6 runs parsed by log_parser.py.
+    The parsers used to drop a fixed 5000 ms at both ends of each run, which is too little for the runs with many VUs
+    (their warm-up lasts much longer) and wastes samples of the runs with few VUs. The measurement window of each run is
+    now chosen from its own data: the operations are grouped in per-second batches (throughput and mean latency of each
+    second), and the warm-up and teardown of each series are truncated with the Marginal Standard Error Rule (MSER),
+    which cuts the prefix that minimizes the standard error of the mean of what remains. The window is the
+    intersection of the windows found on the throughput and latency series.
+"""
+batchMs = 1000 # Batch size of the per-second series, in milliseconds
+minSteadySeconds = 5 # Runs shorter than this (in batches) are not truncated
+
+
+def mser_truncation(series: np.ndarray) -> int:
+    """
+    Return the number of leading batches of series to drop, with the MSER rule: the d in [0, n/2] that minimizes
+    the variance of series[d:] divided by its length (the squared standard error of its mean).
+    """
+    n = len(series)
+    if n < 2:
+        return 0
+    # Sums and sums of squares of every suffix, so each candidate truncation costs O(1)
+    suffix_sum = np.cumsum(series[::-1])[::-1]
+    suffix_squares = np.cumsum((series * series)[::-1])[::-1]
+    candidates = np.arange(n // 2 + 1)
+    remaining = n - candidates
+    sums = suffix_sum[candidates]
+    squared_errors = suffix_squares[candidates] - sums * sums / remaining
+    return int(np.argmin(squared_errors / (remaining * remaining)))
+
+
+def per_second_series(dates_ms: np.ndarray, latencies_ms: np.ndarray) -> tuple:
+    """ Return the throughput (operations) and mean latency of each second of the run, from its first operation. """
+    seconds = (dates_ms - dates_ms[0]) // batchMs
+    counts = np.bincount(seconds)
+    latency_sums = np.bincount(seconds, weights=latencies_ms)
+    # A second without operations has no latency, it takes the median latency of the seconds that have some
+    mean_latencies = np.divide(latency_sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+    mean_latencies[counts == 0] = np.median(mean_latencies[counts > 0])
+    return counts.astype(float), mean_latencies
+
+
+def steady_state_window(dates_ms: np.ndarray, latencies_ms: np.ndarray) -> tuple:
+    """
+    Return the (start, end) dates in ms of the steady state of a run, end excluded.
+    dates_ms must be sorted. Each end of the window is cut on the series (throughput or latency) that needs the
+    longest truncation.
+    """
+    throughput, latency = per_second_series(dates_ms, latencies_ms)
+    num_seconds = len(throughput)
+    if num_seconds < minSteadySeconds:
+        return dates_ms[0], dates_ms[-1] + 1
+    # Warm-up: truncation of the series, teardown: truncation of the reversed series
+    warmup = max(mser_truncation(throughput), mser_truncation(latency))
+    teardown = max(mser_truncation(throughput[::-1]), mser_truncation(latency[::-1]))
+    if num_seconds - warmup - teardown < minSteadySeconds:
+        return dates_ms[0], dates_ms[-1] + 1
+    start_ms = dates_ms[0] + warmup * batchMs
+    end_ms = dates_ms[0] + (num_seconds - teardown) * batchMs
+    return start_ms, end_ms
+
+
+def steady_state_slice(dates_ms: np.ndarray, latencies_ms: np.ndarray) -> tuple:
+    """
+    Return the (first, last) indices of the samples of the steady state of a run, last excluded.
+    dates_ms must be sorted. The window bounds are found with a single binary search over the dates.
+    """
+    if len(dates_ms) == 0:
+        return 0, 0
+    window = steady_state_window(dates_ms, latencies_ms)
+    first, last = np.searchsorted(dates_ms, window, side="left")
+    return int(first), int(last)
+